@@ -0,0 +1,219 @@
+"""In-process caches used in front of slow upstreams.
+
+``TTLCache`` is a plain synchronous LRU with per-entry expiry for values that
+are cheap to recompute but hot (decoded tokens, resolved users).
+
+``SWRCache`` is an async, LRU-bounded cache with per-key TTLs,
+stale-while-revalidate refreshes and single-flight loading: however many
+requests miss on the same key at once, only one load runs and they all await
+its result. The load runs in its own task, so it carries on for the others
+if the request that started it is cancelled.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class TTLCache:
+    _MISSING = object()
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._entries.get(key, self._MISSING)
+        if item is not self._MISSING:
+            value, expires_at = item
+            if self.clock() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (value, self.clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+def start_load(coro: Awaitable[Any]) -> asyncio.Task:
+    """Run a single-flight load as a task of its own."""
+    task = asyncio.ensure_future(coro)
+    # Retrieve the outcome so a failure nobody awaited any more is not
+    # logged as "exception was never retrieved"
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    return task
+
+
+class CacheEntry:
+    __slots__ = ("value", "fresh_until", "stale_until", "version")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float, version: int):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.version = version
+
+
+class SWRCache:
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        stale_ttl: float = 3600.0,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Hashable, Tuple[asyncio.Task, int]] = {}
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self._version = 0
+        # Bumped by invalidate() and clear(); loads started before a bump
+        # are returned to their callers but not stored
+        self._generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.discarded = 0
+
+    async def get_or_load(self, key: Hashable, loader: Loader, ttl: Optional[float] = None) -> Any:
+        """Return the cached value for ``key``, calling ``loader`` when needed.
+
+        Fresh entries are returned directly. Stale entries (past ``ttl`` but
+        within ``stale_ttl``) are returned immediately while one background
+        refresh runs. Missing or fully expired entries are loaded once no
+        matter how many callers are waiting.
+        """
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._schedule_refresh(key, loader, ttl)
+                return entry.value
+
+        self.misses += 1
+        return await self._load(key, loader, ttl)
+
+    def get_entry(self, key: Hashable) -> Optional[CacheEntry]:
+        return self._entries.get(key)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._generation += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "discarded": self.discarded,
+        }
+
+    async def _load(self, key: Hashable, loader: Loader, ttl: Optional[float]) -> Any:
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[1] == self._generation:
+            self.coalesced += 1
+            task = inflight[0]
+        else:
+            # A load started before an invalidation is not joined
+            task = start_load(self._run_load(key, loader, ttl, self._generation))
+            self._inflight[key] = (task, self._generation)
+        # Cancelling one caller must not cancel the load the others await
+        return await asyncio.shield(task)
+
+    async def _run_load(self, key: Hashable, loader: Loader, ttl: Optional[float], generation: int) -> Any:
+        try:
+            value = await loader()
+        except BaseException:
+            self.load_errors += 1
+            raise
+        else:
+            if generation == self._generation:
+                self._store(key, value, ttl)
+            else:
+                self.discarded += 1
+            return value
+        finally:
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight[1] == generation:
+                del self._inflight[key]
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float]):
+        now = self.clock()
+        ttl = self.ttl if ttl is None else ttl
+        self._version += 1
+        self.loads += 1
+        self._entries[key] = CacheEntry(value, now + ttl, now + ttl + self.stale_ttl, self._version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _schedule_refresh(self, key: Hashable, loader: Loader, ttl: Optional[float]):
+        if key in self._refreshing or key in self._inflight:
+            return
+
+        async def refresh():
+            try:
+                await self._load(key, loader, ttl)
+            except Exception:
+                logger.warning("Background refresh of %r failed; serving stale value", key, exc_info=True)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
@@ -0,0 +1,273 @@
+"""Background worker that materializes TMDB catalog pages into MongoDB.
+
+Every ``interval`` seconds the warmer fetches the first ``pages`` pages of
+each list in ``CATALOG_LISTS``, merges them per title and upserts the result
+into the ``catalog`` collection keyed by ``(content_type, tmdb_id)``. Each
+document stores the built model payload, its rank in every list it appears
+in and a content hash; titles whose hash is unchanged and whose popularity
+moved by less than ``POPULARITY_TOLERANCE`` are not rewritten.
+
+With a ``leases`` collection, the warmers of all workers share one refresh
+schedule. A worker takes the lease with ``find_one_and_update`` once the
+current one has expired and then fetches from TMDB; the others check every
+``poll_interval`` seconds and reload their in-memory indexes from the
+``catalog`` collection when the lease holder reports a finished run.
+"""
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from rate_governor import Priority
+from tmdb_client import TMDBClient, TMDBError
+
+logger = logging.getLogger(__name__)
+
+TMDB_PAGE_SIZE = 20
+
+CATALOG_LISTS: Dict[Tuple[str, str], str] = {
+    ("movie", "popular"): "/movie/popular",
+    ("movie", "top_rated"): "/movie/top_rated",
+    ("movie", "trending"): "/trending/movie/week",
+    ("tv", "popular"): "/tv/popular",
+    ("tv", "top_rated"): "/tv/top_rated",
+    ("tv", "trending"): "/trending/tv/week",
+}
+
+
+# Relative popularity change that is worth a rewrite. TMDB popularity drifts
+# on every fetch, so hashing it would rewrite the whole catalog each run.
+POPULARITY_TOLERANCE = 0.05
+
+
+def content_hash(data: Dict[str, Any], ranks: Dict[str, int]) -> str:
+    encoded = json.dumps({"data": data, "ranks": ranks}, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def popularity_changed(stored: Optional[float], fetched: Optional[float]) -> bool:
+    if stored is None or fetched is None:
+        return stored != fetched
+    return abs(fetched - stored) > POPULARITY_TOLERANCE * max(abs(stored), 1.0)
+
+
+class CatalogWarmer:
+    def __init__(
+        self,
+        collection,
+        tmdb: TMDBClient,
+        build_content: Callable[[str, Dict[str, Any]], Any],
+        pages: int = 5,
+        interval: float = 3600.0,
+        concurrency: int = 4,
+        on_update: Optional[Callable[[str, List[Dict[str, Any]], bool], Any]] = None,
+        leases=None,
+        lease_name: str = "catalog_warmer",
+        poll_interval: float = 60.0,
+    ):
+        """``on_update(content_type, entries, changed)`` is called with every
+        title after a run, and with ``changed=False`` after a reload from the
+        ``catalog`` collection. Without ``leases`` every worker fetches.
+        """
+        self.collection = collection
+        self.tmdb = tmdb
+        self.build_content = build_content
+        self.pages = pages
+        self.interval = interval
+        self.on_update = on_update
+        self.leases = leases
+        self.lease_name = lease_name
+        self.poll_interval = poll_interval
+        self.owner = uuid.uuid4().hex
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._loaded_run: Optional[str] = None
+        self.last_run: Dict[str, Any] = {}
+        self.reloads = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Catalog warm-up failed")
+            await asyncio.sleep(self.interval if self.leases is None else self.poll_interval)
+
+    async def tick(self) -> Optional[Dict[str, Any]]:
+        """Fetch from TMDB if this worker holds the lease, else reload from
+        the ``catalog`` collection if another worker has finished a run since.
+        """
+        if self.leases is None:
+            return await self.run_once()
+        lease = await self._acquire_lease()
+        if lease is None:
+            lease = await self.leases.find_one({"_id": self.lease_name}, {"_id": 0, "run_id": 1})
+            run_id = (lease or {}).get("run_id")
+            if run_id is not None and run_id != self._loaded_run:
+                await self.reload()
+                self._loaded_run = run_id
+            return None
+        stats = await self.run_once()
+        self._loaded_run = uuid.uuid4().hex
+        await self.leases.update_one(
+            {"_id": self.lease_name, "owner": self.owner},
+            {"$set": {"run_id": self._loaded_run, "finished_at": datetime.utcnow()}},
+        )
+        return stats
+
+    async def _acquire_lease(self) -> Optional[Dict[str, Any]]:
+        """Take the lease if it is due; it stays taken until the next run is."""
+        now = datetime.utcnow()
+        try:
+            return await self.leases.find_one_and_update(
+                {"_id": self.lease_name, "expires_at": {"$lte": now}},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.interval)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Another worker holds an unexpired lease, so the upsert collided
+            return None
+
+    async def reload(self):
+        """Hand every stored title to ``on_update`` without fetching."""
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        async for doc in self.collection.find({}, {"_id": 0, "content_type": 1, "tmdb_id": 1, "data": 1, "popularity": 1}):
+            by_type.setdefault(doc.pop("content_type"), []).append(doc)
+        self.reloads += 1
+        if self.on_update:
+            for content_type, entries in by_type.items():
+                result = self.on_update(content_type, entries, False)
+                if inspect.isawaitable(result):
+                    await result
+
+    async def run_once(self) -> Dict[str, Any]:
+        started = datetime.utcnow()
+        stats = {"started_at": started, "fetched": 0, "written": 0, "unchanged": 0, "unranked": 0, "failed_lists": []}
+
+        jobs = [
+            (content_type, list_name, path, page)
+            for (content_type, list_name), path in CATALOG_LISTS.items()
+            for page in range(1, self.pages + 1)
+        ]
+        pages = await asyncio.gather(*(self._fetch_page(*job) for job in jobs))
+
+        by_type: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        failed_types = set()
+        for (content_type, list_name, _, page), items in zip(jobs, pages):
+            if items is None:
+                failed_types.add(content_type)
+                stats["failed_lists"].append(f"{content_type}/{list_name}/{page}")
+                continue
+            titles = by_type.setdefault(content_type, {})
+            for position, item in enumerate(items):
+                stats["fetched"] += 1
+                entry = titles.get(item["id"])
+                if entry is None:
+                    entry = titles[item["id"]] = {
+                        "data": self.build_content(content_type, item).dict(),
+                        "popularity": item.get("popularity"),
+                        "ranks": {},
+                    }
+                entry["ranks"][list_name] = (page - 1) * TMDB_PAGE_SIZE + position
+
+        for content_type, titles in by_type.items():
+            if content_type in failed_types:
+                # A partial snapshot would drop titles from lists; keep the
+                # previous one until a full fetch succeeds.
+                logger.warning("Skipping catalog write for %s: some pages failed", content_type)
+                continue
+            written, unchanged, unranked = await self._write(content_type, titles, started)
+            stats["written"] += written
+            stats["unchanged"] += unchanged
+            stats["unranked"] += unranked
+            if self.on_update:
+                entries = [{"tmdb_id": tmdb_id, **entry} for tmdb_id, entry in titles.items()]
+                result = self.on_update(content_type, entries, written + unranked > 0)
+                if inspect.isawaitable(result):
+                    await result
+
+        stats["duration_seconds"] = (datetime.utcnow() - started).total_seconds()
+        self.last_run = stats
+        logger.info(
+            "Catalog warm-up: %d fetched, %d written, %d unchanged in %.1fs",
+            stats["fetched"], stats["written"], stats["unchanged"], stats["duration_seconds"],
+        )
+        return stats
+
+    async def _fetch_page(self, content_type: str, list_name: str, path: str, page: int) -> Optional[List[Dict[str, Any]]]:
+        async with self._semaphore:
+            try:
+                data = await self.tmdb.get(path, priority=Priority.PREFETCH, page=page)
+            except TMDBError as e:
+                logger.warning("Catalog fetch %s page %d failed: %s", path, page, e)
+                return None
+        return data.get("results", [])
+
+    async def _write(
+        self, content_type: str, titles: Dict[int, Dict[str, Any]], now: datetime
+    ) -> Tuple[int, int, int]:
+        """Returns how many titles were written, unchanged and unranked."""
+        ids = list(titles)
+        existing = {
+            doc["tmdb_id"]: doc
+            async for doc in self.collection.find(
+                {"content_type": content_type, "tmdb_id": {"$in": ids}},
+                {"_id": 0, "tmdb_id": 1, "content_hash": 1, "popularity": 1},
+            )
+        }
+
+        operations = []
+        for tmdb_id, entry in titles.items():
+            digest = content_hash(entry["data"], entry["ranks"])
+            stored = existing.get(tmdb_id)
+            if (
+                stored is not None
+                and stored.get("content_hash") == digest
+                and not popularity_changed(stored.get("popularity"), entry["popularity"])
+            ):
+                continue
+            operations.append(UpdateOne(
+                {"content_type": content_type, "tmdb_id": tmdb_id},
+                {
+                    "$set": {
+                        "data": entry["data"],
+                        "popularity": entry["popularity"],
+                        "ranks": entry["ranks"],
+                        "content_hash": digest,
+                        "updated_at": now,
+                    },
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            ))
+
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+        # Titles that fell off every list keep their document but lose their ranks
+        unranked = await self.collection.update_many(
+            {"content_type": content_type, "tmdb_id": {"$nin": ids}, "ranks": {"$ne": {}}},
+            {"$set": {"ranks": {}, "updated_at": now}},
+        )
+        return len(operations), len(titles) - len(operations), unranked.modified_count
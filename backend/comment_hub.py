@@ -0,0 +1,137 @@
+"""In-process pub/sub for pushing new comments to connected viewers.
+
+Each SSE/WebSocket connection holds a ``Subscription`` with a bounded queue.
+``CommentHub.publish`` never blocks: when a slow client's queue is full the
+oldest message is dropped and the subscription is flagged as lagged so the
+client can refetch the page instead of the server buffering without bound.
+
+With several workers, ``ChangeStreamBridge`` tails inserts on the comments
+collection (MongoDB change streams need a replica set) and publishes them to
+the local hub, so every worker sees comments written by any other.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Topic = Tuple[str, int]
+
+
+def encode_comment(doc: Dict[str, Any]) -> str:
+    payload = {k: v for k, v in doc.items() if k != "_id"}
+    return json.dumps(payload, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+
+
+class Subscription:
+    def __init__(self, hub: "CommentHub", topic: Topic, maxsize: int):
+        self.hub = hub
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.lagged = False
+
+    def deliver(self, message: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.lagged = True
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Next message, or None if ``timeout`` elapses first."""
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def take_lagged(self) -> bool:
+        lagged, self.lagged = self.lagged, False
+        return lagged
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class CommentHub:
+    def __init__(self, queue_size: int = 32, max_subscribers: int = 20000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._topics: Dict[Topic, Set[Subscription]] = {}
+        self._count = 0
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, topic: Topic) -> Optional[Subscription]:
+        """Register a subscriber; returns None when the worker is at capacity."""
+        if self._count >= self.max_subscribers:
+            return None
+        subscription = Subscription(self, topic, self.queue_size)
+        self._topics.setdefault(topic, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._topics.get(subscription.topic)
+        if subscribers is not None and subscription in subscribers:
+            subscribers.discard(subscription)
+            self._count -= 1
+            if not subscribers:
+                del self._topics[subscription.topic]
+
+    def publish(self, topic: Topic, message: str) -> int:
+        subscribers = self._topics.get(topic, ())
+        for subscription in subscribers:
+            subscription.deliver(message)
+        self.published += 1
+        self.delivered += len(subscribers)
+        return len(subscribers)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "topics": len(self._topics),
+            "subscribers": self._count,
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+class ChangeStreamBridge:
+    def __init__(self, collection, hub: CommentHub, retry_delay: float = 5.0):
+        self.collection = collection
+        self.hub = hub
+        self.retry_delay = retry_delay
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.collection.watch(pipeline, resume_after=self._resume_token) as stream:
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        doc = change["fullDocument"]
+                        self.hub.publish((doc["content_type"], doc["tmdb_id"]), encode_comment(doc))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Comment change stream failed; retrying in %.0fs", self.retry_delay)
+                await asyncio.sleep(self.retry_delay)
@@ -0,0 +1,134 @@
+"""Keyset-paginated, threaded comment retrieval.
+
+Top-level comments for a title are paged newest first on
+``(created_at, id)``, so page N costs the same as page 1. Replies carry a
+``root_id`` pointing at their thread's top-level comment; one query fetches
+up to ``max_replies`` replies for the page, oldest first on
+``(created_at, id)``, and ``assemble_threads`` nests them in one pass. When
+that cap cuts replies off, the threads with more are flagged
+``has_more_replies`` and ``fetch_replies`` continues any of them from the
+page's ``replies_cursor``.
+"""
+import asyncio
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+
+PROJECTION = {"_id": 0}
+
+
+def encode_cursor(comment: Dict[str, Any]) -> str:
+    raw = json.dumps([comment["created_at"].isoformat(), comment["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of ``encode_cursor``; raises ValueError on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, comment_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(comment_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def assemble_threads(top_level: List[Dict[str, Any]], replies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Nest ``replies`` (oldest first) under their parents in a single pass."""
+    nodes = {}
+    for comment in top_level:
+        comment["replies"] = []
+        nodes[comment["id"]] = comment
+    for reply in replies:
+        reply["replies"] = []
+        nodes[reply["id"]] = reply
+        parent = nodes.get(reply.get("parent_id"))
+        if parent is not None:
+            parent["replies"].append(reply)
+    return top_level
+
+
+def replies_query(root_ids: List[str], after: Optional[Tuple[datetime, str]] = None) -> Dict[str, Any]:
+    # root_id covers whole threads; parent_id covers replies written before
+    # root_id existed.
+    query: Dict[str, Any] = {"$or": [{"root_id": {"$in": root_ids}}, {"parent_id": {"$in": root_ids}}]}
+    if after is not None:
+        created_at, comment_id = after
+        query = {"$and": [query, {"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "id": {"$gt": comment_id}},
+        ]}]}
+    return query
+
+
+async def fetch_replies(
+    collection,
+    root_ids: List[str],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Replies of the threads ``root_ids``, oldest first, after ``cursor``.
+
+    Returns the flat replies (each keeps its ``parent_id``) and the cursor
+    of the next batch, or None when there is none.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    replies = await collection.find(replies_query(root_ids, after), PROJECTION).sort(
+        [("created_at", ASCENDING), ("id", ASCENDING)]
+    ).limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(replies[limit - 1]) if len(replies) > limit else None
+    return replies[:limit], next_cursor
+
+
+async def threads_with_more(collection, root_ids: List[str], cursor: str) -> Set[str]:
+    """Which of ``root_ids`` have replies after ``cursor``."""
+    query = replies_query(root_ids, decode_cursor(cursor))
+    by_root, by_parent = await asyncio.gather(
+        collection.distinct("root_id", query),
+        collection.distinct("parent_id", query),
+    )
+    return set(root_ids) & (set(by_root) | set(by_parent))
+
+
+async def fetch_comment_page(
+    collection,
+    content_type: str,
+    tmdb_id: int,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    max_replies: int = 500,
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"content_type": content_type, "tmdb_id": tmdb_id, "parent_id": None}
+    if cursor:
+        created_at, comment_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": comment_id}},
+        ]
+
+    top_level = await collection.find(query, PROJECTION).sort(
+        [("created_at", DESCENDING), ("id", DESCENDING)]
+    ).limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(top_level[limit - 1]) if len(top_level) > limit else None
+    top_level = top_level[:limit]
+
+    replies: List[Dict[str, Any]] = []
+    replies_cursor = None
+    truncated: Set[str] = set()
+    if top_level:
+        ids = [comment["id"] for comment in top_level]
+        replies, replies_cursor = await fetch_replies(collection, ids, max_replies)
+        if replies_cursor:
+            truncated = await threads_with_more(collection, ids, replies_cursor)
+
+    comments = assemble_threads(top_level, replies)
+    for comment in comments:
+        comment["has_more_replies"] = comment["id"] in truncated
+    return {
+        "comments": comments,
+        "next_cursor": next_cursor,
+        "has_more_replies": bool(truncated),
+        "replies_cursor": replies_cursor if truncated else None,
+    }
@@ -0,0 +1,288 @@
+"""Response compression with stored variants for cacheable payloads.
+
+``CompressionMiddleware`` picks brotli or gzip from ``Accept-Encoding``.
+Responses that carry an ``ETag`` (set by ``HTTPCacheMiddleware``) are
+compressed once per ETag and encoding and kept in ``CompressedStore``, so a
+popular list is not recompressed for every client. Other responses are
+compressed on the fly as their body streams through. Bodies smaller than
+``minimum_size`` are sent as-is.
+
+Compressed variants get their own ETag (``"<etag>-br"`` / ``"<etag>-gzip"``);
+the suffix is stripped from ``If-None-Match`` on the way in so conditional
+requests still validate against the identity ETag.
+
+brotli is optional; without it only gzip is offered.
+"""
+import gzip
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASGIApp = Callable[..., Any]
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Preferred encoding we support from an ``Accept-Encoding`` value."""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def variant_etag(etag: str, encoding: str) -> str:
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+def strip_variant(if_none_match: str, encoding: str) -> str:
+    """Map ``encoding`` variant ETags in ``If-None-Match`` back to identity ETags."""
+    suffix = f'-{encoding}"'
+    candidates = []
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.endswith(suffix):
+            candidate = candidate[: -len(suffix)] + '"'
+        candidates.append(candidate)
+    return ", ".join(candidates)
+
+
+class CompressedStore:
+    """LRU of compressed bodies keyed by ``(etag, encoding)``, bounded in bytes."""
+
+    def __init__(self, max_bytes: int = 64 << 20, gzip_level: int = 6, brotli_quality: int = 5):
+        self.max_bytes = max_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def get(self, etag: str, encoding: str, body: bytes) -> bytes:
+        key = (etag, encoding)
+        compressed = self._entries.get(key)
+        if compressed is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            compressed = self.compress(body, encoding)
+            if len(compressed) <= self.max_bytes:
+                self._entries[key] = compressed
+                self._bytes += len(compressed)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        self.bytes_in += len(body)
+        self.bytes_out += len(compressed)
+        return compressed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+class StreamCompressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def process(self, data: bytes) -> bytes:
+        """Compress ``data`` and flush, so each chunk reaches the client promptly."""
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: Optional[CompressedStore] = None,
+        minimum_size: int = 1024,
+        chunk_size: int = 64 * 1024,
+    ):
+        self.app = app
+        self.store = store or CompressedStore()
+        self.minimum_size = minimum_size
+        self.chunk_size = chunk_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate(_header(scope["headers"], b"accept-encoding") or "")
+        if encoding is None:
+            return await self.app(scope, receive, _vary_only(send))
+
+        # Validate compressed variants against the identity ETag
+        if_none_match = _header(scope["headers"], b"if-none-match")
+        variant_requested = False
+        if if_none_match is not None:
+            stripped = strip_variant(if_none_match, encoding)
+            variant_requested = stripped != if_none_match
+            scope = {**scope, "headers": [
+                (k, stripped.encode("latin-1") if k == b"if-none-match" else v) for k, v in scope["headers"]
+            ]}
+        start = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                return await send(message)
+
+            if message["type"] == "http.response.start":
+                headers = message["headers"]
+                if message["status"] == 304:
+                    passthrough = True
+                    headers = _add_vary(headers)
+                    if variant_requested:
+                        headers = [
+                            (k, variant_etag(v.decode("latin-1"), encoding).encode("latin-1") if k == b"etag" else v)
+                            for k, v in headers
+                        ]
+                    return await send({**message, "headers": headers})
+                length = _header(headers, b"content-length")
+                if (
+                    message["status"] != 200
+                    or _header(headers, b"content-encoding") is not None
+                    or not _compressible(_header(headers, b"content-type") or "")
+                    or (length is not None and int(length) < self.minimum_size)
+                ):
+                    passthrough = True
+                    if message["status"] == 200 and _compressible(_header(headers, b"content-type") or ""):
+                        message = {**message, "headers": _add_vary(headers)}
+                    return await send(message)
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None and not more_body:
+                # Whole body in one message (HTTPCacheMiddleware buffers its
+                # routes): compress once per ETag and send in chunks.
+                passthrough = True
+                if len(body) < self.minimum_size:
+                    await send({**start, "headers": _add_vary(start["headers"])})
+                    return await send(message)
+                etag = _header(start["headers"], b"etag")
+                if etag is not None:
+                    compressed = self.store.get(etag, encoding, body)
+                else:
+                    compressed = self.store.compress(body, encoding)
+                await send({**start, "headers": _encoded_headers(start["headers"], encoding, len(compressed))})
+                for offset in range(0, len(compressed), self.chunk_size):
+                    await send({
+                        "type": "http.response.body",
+                        "body": compressed[offset:offset + self.chunk_size],
+                        "more_body": offset + self.chunk_size < len(compressed),
+                    })
+                return
+
+            if compressor is None:
+                # Streaming body: compress chunk by chunk without buffering;
+                # the identity ETag no longer describes what we send.
+                compressor = StreamCompressor(encoding, self.store.gzip_level, self.store.brotli_quality)
+                headers = [(k, v) for k, v in start["headers"] if k != b"etag"]
+                await send({**start, "headers": _encoded_headers(headers, encoding, None)})
+            data = compressor.process(body)
+            if not more_body:
+                data += compressor.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _vary_only(send):
+    # Identity responses still depend on Accept-Encoding for shared caches
+    async def send_wrapper(message):
+        if message["type"] == "http.response.start" and (
+            message["status"] == 304
+            or (message["status"] == 200 and _compressible(_header(message["headers"], b"content-type") or ""))
+        ):
+            message = {**message, "headers": _add_vary(message["headers"])}
+        await send(message)
+    return send_wrapper
+
+
+def _compressible(content_type: str) -> bool:
+    # Event streams are left alone: proxies buffer compressed streams
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+
+def _header(headers, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _add_vary(headers) -> List[Tuple[bytes, bytes]]:
+    vary = _header(headers, b"vary")
+    if vary is not None and "accept-encoding" in vary.lower():
+        return list(headers)
+    value = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    return [(k, v) for k, v in headers if k != b"vary"] + [(b"vary", value.encode("latin-1"))]
+
+
+def _encoded_headers(headers, encoding: str, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+    result = []
+    for key, value in _add_vary(headers):
+        if key == b"content-length":
+            continue
+        if key == b"etag":
+            value = variant_etag(value.decode("latin-1"), encoding).encode("latin-1")
+        result.append((key, value))
+    if length is not None:
+        result.append((b"content-length", str(length).encode("latin-1")))
+    result.append((b"content-encoding", encoding.encode("latin-1")))
+    return result
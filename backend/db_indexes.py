@@ -0,0 +1,191 @@
+"""MongoDB index bootstrap and query-plan verification.
+
+``ensure_indexes`` is run on startup and idempotently creates every index the
+handlers rely on. Running this module as a script explains each query shape
+the handlers issue and exits non-zero if any of them would scan a whole
+collection:
+
+    python db_indexes.py            # create indexes, then verify plans
+    python db_indexes.py --no-create
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from catalog_warmer import CATALOG_LISTS
+
+logger = logging.getLogger(__name__)
+
+IndexSpec = Tuple[str, List[Tuple[str, int]], Dict[str, Any]]
+
+CATALOG_LIST_NAMES = sorted({list_name for _, list_name in CATALOG_LISTS})
+
+INDEXES: List[IndexSpec] = [
+    ("users", [("id", ASCENDING)], {"unique": True}),
+    ("users", [("email", ASCENDING)], {"unique": True}),
+    ("users", [("premium_expires_at", ASCENDING)], {}),
+    ("watch_history", [("user_id", ASCENDING), ("content_type", ASCENDING), ("tmdb_id", ASCENDING)], {"unique": True}),
+    ("watch_history", [("user_id", ASCENDING), ("last_watched", DESCENDING)], {}),
+    ("favorites", [("user_id", ASCENDING), ("content_type", ASCENDING), ("tmdb_id", ASCENDING)], {"unique": True}),
+    ("favorites", [("user_id", ASCENDING), ("added_at", DESCENDING)], {}),
+    ("comments", [("id", ASCENDING)], {"unique": True}),
+    ("comments", [
+        ("content_type", ASCENDING), ("tmdb_id", ASCENDING), ("parent_id", ASCENDING),
+        ("created_at", DESCENDING), ("id", DESCENDING),
+    ], {}),
+    ("comments", [("root_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], {}),
+    ("comments", [("parent_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], {}),
+    ("payment_transactions", [("session_id", ASCENDING)], {"unique": True}),
+    ("webhook_events", [("status", ASCENDING), ("available_at", ASCENDING)], {}),
+    # Finished events only need to outlive Stripe's redelivery window (3 days)
+    ("webhook_events", [("processed_at", ASCENDING)], {"expireAfterSeconds": 3 * 24 * 3600}),
+    ("catalog", [("content_type", ASCENDING), ("tmdb_id", ASCENDING)], {"unique": True}),
+    # Shared L2 cache entries (shared_cache.MongoL2) expire at their own time
+    ("cache_entries", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+] + [
+    (
+        "catalog",
+        [("content_type", ASCENDING), (f"ranks.{list_name}", ASCENDING)],
+        {"partialFilterExpression": {f"ranks.{list_name}": {"$exists": True}}},
+    )
+    for list_name in CATALOG_LIST_NAMES
+]
+
+
+def query_shapes() -> List[Dict[str, Any]]:
+    """Representative filter/sort pairs for every query the handlers issue."""
+    now = datetime.utcnow()
+    shapes = [
+        {"name": "users by id", "collection": "users", "filter": {"id": "u"}},
+        {"name": "users by email", "collection": "users", "filter": {"email": "e"}},
+        {"name": "expired premium sweep", "collection": "users",
+         "filter": {"is_premium": True, "premium_expires_at": {"$lte": now}}},
+        {"name": "watch history upsert key", "collection": "watch_history",
+         "filter": {"user_id": "u", "content_type": "movie", "tmdb_id": 1}},
+        {"name": "watch history list", "collection": "watch_history",
+         "filter": {"user_id": "u"}, "sort": [("last_watched", DESCENDING)]},
+        {"name": "favorite by key", "collection": "favorites",
+         "filter": {"user_id": "u", "content_type": "movie", "tmdb_id": 1}},
+        {"name": "favorites list", "collection": "favorites",
+         "filter": {"user_id": "u"}, "sort": [("added_at", DESCENDING)]},
+        {"name": "comment by id", "collection": "comments", "filter": {"id": "c"}},
+        {"name": "comment count for title", "collection": "comments",
+         "filter": {"content_type": "movie", "tmdb_id": 1}},
+        {"name": "comment page", "collection": "comments",
+         "filter": {"content_type": "movie", "tmdb_id": 1, "parent_id": None,
+                    "$or": [{"created_at": {"$lt": now}}, {"created_at": now, "id": {"$lt": "c"}}]},
+         "sort": [("created_at", DESCENDING), ("id", DESCENDING)]},
+        {"name": "comment replies for page", "collection": "comments",
+         "filter": {"$or": [{"root_id": {"$in": ["a", "b"]}}, {"parent_id": {"$in": ["a", "b"]}}]},
+         "sort": [("created_at", ASCENDING), ("id", ASCENDING)]},
+        {"name": "transaction by session", "collection": "payment_transactions", "filter": {"session_id": "s"}},
+        {"name": "webhook event claim", "collection": "webhook_events",
+         "filter": {"status": {"$in": ["pending", "processing"]}, "available_at": {"$lte": now}},
+         "sort": [("available_at", ASCENDING)]},
+        {"name": "catalog hashes", "collection": "catalog",
+         "filter": {"content_type": "movie", "tmdb_id": {"$in": [1, 2, 3]}}},
+    ]
+    for list_name in CATALOG_LIST_NAMES:
+        field = f"ranks.{list_name}"
+        shapes.append({
+            "name": f"catalog {list_name} page", "collection": "catalog",
+            "filter": {"content_type": "movie", field: {"$exists": True}}, "sort": [(field, ASCENDING)],
+        })
+    return shapes
+
+
+async def ensure_indexes(db) -> int:
+    """Create every index in ``INDEXES``; returns how many specs failed.
+
+    The specs are sent concurrently: on an existing database each is a no-op
+    round trip, so startup waits for one round trip instead of one per spec.
+    """
+    async def create(collection: str, keys, options) -> bool:
+        try:
+            await db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            # Usually existing duplicates blocking a unique index, or an index
+            # with the same name but different options. Keep serving.
+            logger.error("Could not create index %s on %s: %s", keys, collection, e)
+            return False
+        return True
+
+    created = await asyncio.gather(*(create(*spec) for spec in INDEXES))
+    return created.count(False)
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages += plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return [stage for stage in stages if stage]
+
+
+def winning_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    planner = explain.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    # Slot-based engine output nests the classic plan tree under queryPlan
+    return plan.get("queryPlan", plan)
+
+
+async def verify_query_plans(db) -> List[Dict[str, Any]]:
+    report = []
+    for shape in query_shapes():
+        cursor = db[shape["collection"]].find(shape["filter"])
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"])
+        stages = plan_stages(winning_plan(await cursor.explain()))
+        report.append({
+            "name": shape["name"],
+            "collection": shape["collection"],
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages,
+        })
+    return report
+
+
+async def _main(create: bool) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if create:
+            await ensure_indexes(db)
+        report = await verify_query_plans(db)
+    finally:
+        client.close()
+
+    failed = False
+    for entry in report:
+        if entry["collscan"]:
+            status = "FAIL COLLSCAN"
+            failed = True
+        elif entry["stages"] == ["EOF"]:
+            status = "skip (no collection)"
+        elif entry["in_memory_sort"]:
+            status = "WARN in-memory sort"
+        else:
+            status = "ok"
+        print(f"{status:20} {entry['collection']:22} {entry['name']:30} {' <- '.join(entry['stages'])}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--no-create", action="store_true", help="only verify plans, do not create indexes")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(create=not args.no_create)))
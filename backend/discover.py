@@ -0,0 +1,291 @@
+"""Faceted catalog discovery over an in-memory columnar snapshot.
+
+Every catalog title is one row of a set of NumPy columns: content type,
+release (or first air) date, vote average, popularity, the adult flag and a
+bitmask of its genres. Its response item is kept pre-encoded as JSON. A
+query is a handful of vectorized comparisons over the columns, facets are
+counted over the matching rows, and results are read off a sort order
+computed ahead of time for every sort key, so filtering never calls TMDB's
+``discover`` endpoint and never sorts per request.
+
+Rows are updated in place as titles arrive. The sort orders are the
+snapshot: they are rebuilt after rows change, right away for catalog batches
+and at most once every ``rebuild_interval`` seconds for single titles. The
+index holds at most ``max_titles`` titles; once full, a new title replaces
+the least popular one, or is dropped if it is less popular still.
+"""
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fast_json import dumps
+
+CONTENT_TYPES = ("movie", "tv")
+SORTS = {
+    "popularity.desc": ("popularity", True),
+    "popularity.asc": ("popularity", False),
+    "vote_average.desc": ("vote_average", True),
+    "vote_average.asc": ("vote_average", False),
+    "release_date.desc": ("release_date", True),
+    "release_date.asc": ("release_date", False),
+}
+MAX_GENRES = 64  # one bit each in the uint64 genre mask
+RATING_BUCKETS = 11  # vote_average floored to 0..10
+
+
+def parse_genres(value: Optional[str]) -> Tuple[List[int], bool]:
+    """Parse TMDB-style ``with_genres``: ``"28,12"`` needs every genre,
+    ``"28|12"`` any of them. Returns ``(genre_ids, match_all)``.
+    """
+    if not value:
+        return [], True
+    match_all = "|" not in value
+    parts = value.split("," if match_all else "|")
+    return [int(part) for part in parts if part.strip()], match_all
+
+
+def release_date(data: Dict[str, Any]) -> int:
+    """``YYYY-MM-DD`` release or first air date as ``YYYYMMDD``; 0 if unknown."""
+    value = data.get("release_date") or data.get("first_air_date") or ""
+    try:
+        year, month, day = value[:10].split("-")
+        return int(year) * 10000 + int(month) * 100 + int(day)
+    except ValueError:
+        return 0
+
+
+def _grown(array: np.ndarray, capacity: int, fill) -> np.ndarray:
+    grown = np.full(capacity, fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class DiscoverIndex:
+    def __init__(self, max_titles: int = 100000, rebuild_interval: float = 1.0, initial_capacity: int = 1024):
+        self.max_titles = max_titles
+        self.rebuild_interval = rebuild_interval
+        capacity = max(1, min(initial_capacity, max_titles))
+        self._type = np.zeros(capacity, dtype=np.int8)
+        self._date = np.zeros(capacity, dtype=np.int32)
+        self._vote = np.full(capacity, np.nan, dtype=np.float32)
+        self._popularity = np.zeros(capacity, dtype=np.float32)
+        self._adult = np.zeros(capacity, dtype=bool)
+        self._genres = np.zeros(capacity, dtype=np.uint64)
+        self._keys: List[Tuple[str, int]] = []
+        self._rows: Dict[Tuple[str, int], int] = {}
+        self._items: List[bytes] = []
+        self._genre_bits: Dict[int, int] = {}
+        self._orders: Dict[str, np.ndarray] = {}
+        self._dirty = False
+        self._rebuilt_at = float("-inf")
+        self.rebuilds = 0
+        self.last_rebuild_seconds = 0.0
+        self.replaced = 0
+        self.dropped = 0
+        self.queries = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    # Catalog
+
+    def upsert_items(self, content_type: str, entries: Iterable[Dict[str, Any]]):
+        """Add or update titles from catalog entries (``tmdb_id``, ``data``,
+        ``popularity``) and rebuild the snapshot if anything was written.
+        """
+        written = False
+        for entry in entries:
+            written |= self._upsert(content_type, entry["tmdb_id"], entry["data"], entry.get("popularity"))
+        if written:
+            self.rebuild()
+
+    def upsert(self, content_type: str, data: Dict[str, Any], popularity: Optional[float] = None):
+        """Add or update one title; it shows up by the next rebuild."""
+        self._upsert(content_type, data["tmdb_id"], data, popularity)
+
+    def _upsert(self, content_type: str, tmdb_id: int, data: Dict[str, Any], popularity: Optional[float]) -> bool:
+        key = (content_type, tmdb_id)
+        popularity = popularity or 0.0
+        row = self._rows.get(key)
+        if row is None:
+            row = self._allocate(key, popularity)
+            if row is None:
+                self.dropped += 1
+                return False
+        self._type[row] = CONTENT_TYPES.index(content_type)
+        self._date[row] = release_date(data)
+        vote = data.get("vote_average")
+        self._vote[row] = np.nan if vote is None else vote
+        self._popularity[row] = popularity
+        self._adult[row] = bool(data.get("adult"))
+        self._genres[row] = self._mask(data.get("genre_ids") or (), create=True)
+        self._items[row] = dumps({"type": content_type, "data": data})
+        self._dirty = True
+        return True
+
+    def _allocate(self, key: Tuple[str, int], popularity: float) -> Optional[int]:
+        size = len(self._keys)
+        if size >= self.max_titles:
+            row = int(np.argmin(self._popularity[:size]))
+            if self._popularity[row] >= popularity:
+                return None
+            del self._rows[self._keys[row]]
+            self._keys[row] = key
+            self._rows[key] = row
+            self.replaced += 1
+            return row
+        if size == len(self._type):
+            capacity = min(size * 2, self.max_titles)
+            self._type = _grown(self._type, capacity, 0)
+            self._date = _grown(self._date, capacity, 0)
+            self._vote = _grown(self._vote, capacity, np.nan)
+            self._popularity = _grown(self._popularity, capacity, 0.0)
+            self._adult = _grown(self._adult, capacity, False)
+            self._genres = _grown(self._genres, capacity, 0)
+        self._rows[key] = size
+        self._keys.append(key)
+        self._items.append(b"")
+        return size
+
+    def _mask(self, genre_ids: Sequence[int], create: bool = False) -> int:
+        mask = 0
+        for genre_id in genre_ids:
+            bit = self._genre_bits.get(genre_id)
+            if bit is None:
+                if not create or len(self._genre_bits) >= MAX_GENRES:
+                    continue
+                bit = self._genre_bits[genre_id] = len(self._genre_bits)
+            mask |= 1 << bit
+        return mask
+
+    def rebuild(self):
+        """Recompute the sort order of every row for each sort key."""
+        started = time.perf_counter()
+        size = len(self._keys)
+        dates = self._date[:size].copy()
+        dates[dates == 0] = np.iinfo(np.int32).max
+        columns = {
+            "popularity": (self._popularity[:size], size),
+            "vote_average": (self._vote[:size], size - int(np.isnan(self._vote[:size]).sum())),
+            "release_date": (dates, int(np.count_nonzero(self._date[:size]))),
+        }
+        orders = {}
+        for column, (values, known) in columns.items():
+            # One sort per column: unknown values sort last ascending, and the
+            # descending order reverses only the known ones so they stay last
+            ascending = np.argsort(values).astype(np.int32)
+            orders[column] = (ascending, np.concatenate((ascending[:known][::-1], ascending[known:])))
+        self._orders = {name: orders[column][descending] for name, (column, descending) in SORTS.items()}
+        self._dirty = False
+        self._rebuilt_at = time.monotonic()
+        self.rebuilds += 1
+        self.last_rebuild_seconds = time.perf_counter() - started
+
+    def _snapshot(self) -> Dict[str, np.ndarray]:
+        if self._dirty and time.monotonic() - self._rebuilt_at >= self.rebuild_interval:
+            self.rebuild()
+        return self._orders
+
+    # Queries
+
+    def discover(
+        self,
+        content_type: Optional[str] = None,
+        genre_ids: Sequence[int] = (),
+        match_all_genres: bool = True,
+        year_gte: Optional[int] = None,
+        year_lte: Optional[int] = None,
+        vote_average_gte: Optional[float] = None,
+        vote_average_lte: Optional[float] = None,
+        include_adult: bool = False,
+        sort_by: str = "popularity.desc",
+        page: int = 1,
+        page_size: int = 20,
+    ) -> Tuple[List[bytes], Dict[str, Any]]:
+        """Return the page's pre-encoded items and the response metadata
+        (``page``, ``page_size``, ``total_results`` and ``facets``).
+        """
+        self.queries += 1
+        orders = self._snapshot()
+        # Rows added since the last rebuild are not in the orders yet
+        size = len(orders["popularity.desc"]) if orders else 0
+        matched = np.ones(size, dtype=bool)
+        if content_type is not None:
+            matched &= self._type[:size] == CONTENT_TYPES.index(content_type)
+        if genre_ids:
+            wanted = np.uint64(self._mask(genre_ids))
+            genres = self._genres[:size]
+            if match_all_genres:
+                known = all(genre_id in self._genre_bits for genre_id in genre_ids)
+                matched &= (genres & wanted) == wanted if known else False
+            else:
+                matched &= (genres & wanted) != 0
+        if year_gte is not None:
+            matched &= self._date[:size] >= year_gte * 10000
+        if year_lte is not None:
+            matched &= (self._date[:size] < (year_lte + 1) * 10000) & (self._date[:size] > 0)
+        if vote_average_gte is not None:
+            matched &= self._vote[:size] >= vote_average_gte
+        if vote_average_lte is not None:
+            matched &= self._vote[:size] <= vote_average_lte
+        if not include_adult:
+            matched &= ~self._adult[:size]
+
+        rows = np.flatnonzero(matched)
+        start = (page - 1) * page_size
+        items = []
+        if size and start < len(rows):
+            order = orders[sort_by]
+            page_rows = order[matched[order]][start:start + page_size]
+            items = [self._items[row] for row in page_rows.tolist()]
+        return items, {
+            "page": page,
+            "page_size": page_size,
+            "total_results": len(rows),
+            "facets": self._facets(rows),
+        }
+
+    def _facets(self, rows: np.ndarray) -> Dict[str, Any]:
+        genres = self._genres[rows]
+        genre_counts = {
+            genre_id: int(np.count_nonzero(genres & np.uint64(1 << bit))) for genre_id, bit in self._genre_bits.items()
+        }
+        years = self._date[rows] // 10000
+        year_counts = np.bincount(years[years > 0])
+        votes = self._vote[rows]
+        rating_counts = np.bincount(np.floor(votes[~np.isnan(votes)]).astype(np.intp).clip(0, 10), minlength=RATING_BUCKETS)
+        type_counts = np.bincount(self._type[rows], minlength=len(CONTENT_TYPES))
+        return {
+            "content_type": {name: int(type_counts[i]) for i, name in enumerate(CONTENT_TYPES)},
+            "genres": sorted(
+                ({"id": genre_id, "count": count} for genre_id, count in genre_counts.items() if count),
+                key=lambda facet: -facet["count"],
+            ),
+            "years": [{"year": year, "count": int(count)} for year, count in enumerate(year_counts.tolist()) if count],
+            "vote_average": [{"min": rating, "count": int(count)} for rating, count in enumerate(rating_counts.tolist()) if count],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        size = len(self._keys)
+        column_bytes = sum(
+            array.nbytes for array in (self._type, self._date, self._vote, self._popularity, self._adult, self._genres)
+        ) + sum(order.nbytes for order in self._orders.values())
+        item_bytes = sum(len(item) for item in self._items)
+        return {
+            "titles": size,
+            "genres": len(self._genre_bits),
+            "rebuilds": self.rebuilds,
+            "last_rebuild_ms": round(self.last_rebuild_seconds * 1000, 3),
+            "array_mb": round(column_bytes / 2**20, 2),
+            "item_mb": round(item_bytes / 2**20, 2),
+            "bytes_per_title": round((column_bytes + item_bytes) / size, 1) if size else 0.0,
+            "replaced": self.replaced,
+            "dropped": self.dropped,
+            "queries": self.queries,
+        }
+
+
+def render_page(items: List[bytes], meta: Dict[str, Any]) -> bytes:
+    """JSON body ``{"results": [...], **meta}`` spliced from pre-encoded items."""
+    return b'{"results":[' + b",".join(items) + b"]," + dumps(meta)[1:]
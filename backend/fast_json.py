@@ -0,0 +1,60 @@
+"""Fast JSON response path for list-heavy endpoints.
+
+By default FastAPI walks every returned object with ``jsonable_encoder``
+and then encodes it with the stdlib ``json`` module. Handlers that opt in
+return ``FastJSONResponse`` directly instead, which skips that walk and
+encodes with orjson, letting pydantic dump models natively.
+
+``validate_many`` validates a whole list in one ``TypeAdapter`` call, and
+``projection`` limits Mongo reads to a model's fields so documents we wrote
+ourselves can be returned as-is without building a model per item.
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_adapters: Dict[type, TypeAdapter] = {}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def validate_many(model: Type[ModelT], items: List[Dict[str, Any]]) -> List[ModelT]:
+    """Validate ``items`` as ``List[model]`` in a single call."""
+    adapter = _adapters.get(model)
+    if adapter is None:
+        adapter = _adapters[model] = TypeAdapter(List[model])
+    return adapter.validate_python(items)
+
+
+def projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection returning exactly ``model``'s fields and no ``_id``."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
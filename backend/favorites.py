@@ -0,0 +1,151 @@
+"""Favorites writes backed by the unique (user_id, content_type, tmdb_id) index.
+
+Single adds are one atomic upsert. Bulk requests apply their adds with one
+unordered ``bulk_write`` and their removes as concurrent single deletes, and
+report an outcome for every item.
+"""
+import asyncio
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+DUPLICATE_KEY = 11000
+CONTENT_TYPES = ("movie", "tv")
+
+FavoriteKey = Tuple[str, int]
+
+
+def favorite_filter(user_id: str, content_type: str, tmdb_id: int) -> Dict[str, Any]:
+    return {"user_id": user_id, "content_type": content_type, "tmdb_id": tmdb_id}
+
+
+async def add_favorite(collection, favorite: Dict[str, Any]) -> bool:
+    """Insert ``favorite`` unless it already exists; returns True when added."""
+    key = favorite_filter(favorite["user_id"], favorite["content_type"], favorite["tmdb_id"])
+    try:
+        result = await collection.update_one(key, {"$setOnInsert": favorite}, upsert=True)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent upsert of the same favorite
+        return False
+    return result.upserted_id is not None
+
+
+def _parse_key(item: Dict[str, Any]) -> FavoriteKey:
+    content_type = item.get("content_type")
+    tmdb_id = item.get("tmdb_id")
+    if content_type not in CONTENT_TYPES or not isinstance(tmdb_id, int) or isinstance(tmdb_id, bool):
+        raise ValueError("content_type must be 'movie' or 'tv' and tmdb_id an integer")
+    return content_type, tmdb_id
+
+
+def _check_add(item: Dict[str, Any]):
+    title = item.get("title")
+    if not isinstance(title, str) or not title:
+        raise ValueError("title must be a non-empty string")
+    poster_path = item.get("poster_path")
+    if poster_path is not None and not isinstance(poster_path, str):
+        raise ValueError("poster_path must be a string")
+
+
+async def bulk_update_favorites(
+    collection,
+    user_id: str,
+    adds: List[Dict[str, Any]],
+    removes: List[Dict[str, Any]],
+    build_favorite: Callable[[Dict[str, Any]], Dict[str, Any]],
+    remove_concurrency: int = 8,
+) -> List[Dict[str, Any]]:
+    """Apply ``adds`` in one bulk write and ``removes`` as single deletes,
+    at most ``remove_concurrency`` at a time.
+
+    ``build_favorite`` turns a validated add item into the document to
+    insert; a ``ValueError`` from it (e.g. a pydantic validation error)
+    marks the item ``invalid``.
+
+    Returns one ``{"op", "content_type", "tmdb_id", "status"}`` entry per
+    input item, in input order (adds first). Statuses are ``added``,
+    ``exists``, ``removed``, ``not_found``, ``duplicate``, ``invalid`` and
+    ``error``. A title both added and removed in the same request is
+    ``invalid`` on both sides, since neither order would be what the client
+    meant.
+    """
+    results: List[Dict[str, Any]] = []
+    parsed: List[Tuple[Dict[str, Any], FavoriteKey, Dict[str, Any]]] = []
+    ops_by_key: Dict[FavoriteKey, Set[str]] = {}
+
+    for op, items in (("add", adds), ("remove", removes)):
+        for item in items:
+            if not isinstance(item, dict):
+                results.append({"op": op, "content_type": None, "tmdb_id": None,
+                                "status": "invalid", "detail": "item must be an object"})
+                continue
+            entry = {"op": op, "content_type": item.get("content_type"), "tmdb_id": item.get("tmdb_id")}
+            results.append(entry)
+            try:
+                key = _parse_key(item)
+                if op == "add":
+                    _check_add(item)
+            except ValueError as e:
+                entry.update(status="invalid", detail=str(e))
+                continue
+            parsed.append((entry, key, item))
+            ops_by_key.setdefault(key, set()).add(op)
+
+    upserts = []
+    upsert_entries: List[Dict[str, Any]] = []
+    remove_entries: List[Tuple[Dict[str, Any], FavoriteKey]] = []
+    seen = set()
+    for entry, key, item in parsed:
+        if len(ops_by_key[key]) > 1:
+            entry.update(status="invalid", detail="cannot add and remove the same title in one request")
+            continue
+        if key in seen:
+            entry["status"] = "duplicate"
+            continue
+        seen.add(key)
+        if entry["op"] == "add":
+            try:
+                favorite = build_favorite(item)
+            except ValueError as e:
+                entry.update(status="invalid", detail=str(e))
+                continue
+            upserts.append(UpdateOne(favorite_filter(user_id, *key), {"$setOnInsert": favorite}, upsert=True))
+            upsert_entries.append(entry)
+        else:
+            remove_entries.append((entry, key))
+
+    async def apply_upserts():
+        errors: Dict[int, Dict[str, Any]] = {}
+        try:
+            bulk = await collection.bulk_write(upserts, ordered=False)
+            upserted = bulk.upserted_ids
+        except BulkWriteError as e:
+            upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+            errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+        for op_index, entry in enumerate(upsert_entries):
+            error = errors.get(op_index)
+            if error is not None and error.get("code") != DUPLICATE_KEY:
+                entry.update(status="error", detail=error.get("errmsg"))
+            else:
+                entry["status"] = "added" if op_index in upserted else "exists"
+
+    removing = asyncio.Semaphore(remove_concurrency)
+
+    async def apply_remove(entry: Dict[str, Any], key: FavoriteKey):
+        # bulk_write only reports a total deletedCount, so each removal is its
+        # own delete and its status comes from what that delete did. The
+        # semaphore keeps a large request from taking the whole Motor pool.
+        try:
+            async with removing:
+                result = await collection.delete_one(favorite_filter(user_id, *key))
+        except PyMongoError as e:
+            entry.update(status="error", detail=str(e))
+        else:
+            entry["status"] = "removed" if result.deleted_count else "not_found"
+
+    writes = [apply_remove(entry, key) for entry, key in remove_entries]
+    if upserts:
+        writes.append(apply_upserts())
+    await asyncio.gather(*writes)
+    return results
@@ -0,0 +1,269 @@
+"""Google sign-in verification without a Google round trip per login.
+
+ID tokens (JWTs) are verified locally against Google's signing keys. The
+JWKS document is cached for as long as its ``Cache-Control`` allows and
+refreshed in the background shortly before it expires; an unknown ``kid``
+(Google rotated keys early) triggers one rate-limited refresh.
+
+Opaque OAuth access tokens cannot be verified locally; for those a single
+``userinfo`` call both validates the token (Google answers 401 otherwise) and
+returns the profile, replacing the old ``tokeninfo`` + ``userinfo`` pair.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+import jwt
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class GoogleAuthError(Exception):
+    """Raised when a Google token is invalid or cannot be checked."""
+
+
+def cache_lifetime(headers: httpx.Headers, default: float) -> float:
+    """Seconds a response may be cached, from ``Cache-Control`` minus ``Age``."""
+    cache_control = headers.get("cache-control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0.0
+    match = _MAX_AGE.search(cache_control)
+    if not match:
+        return default
+    try:
+        age = float(headers.get("age", "0"))
+    except ValueError:
+        age = 0.0
+    return max(0.0, int(match.group(1)) - age)
+
+
+def looks_like_jwt(token: str) -> bool:
+    return token.count(".") == 2
+
+
+async def _timed_get(http: httpx.AsyncClient, url: str, operation: str, on_request, **kwargs) -> httpx.Response:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await http.get(url, **kwargs)
+        outcome = str(response.status_code)
+        return response
+    finally:
+        if on_request is not None:
+            on_request(operation, outcome, time.perf_counter() - started)
+
+
+class JWKSCache:
+    def __init__(
+        self,
+        http: Optional[httpx.AsyncClient],
+        url: str = GOOGLE_JWKS_URL,
+        default_ttl: float = 3600.0,
+        min_ttl: float = 60.0,
+        refresh_ahead: float = 300.0,
+        min_refresh_interval: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        on_request: Optional[Callable[[str, str, float], None]] = None,
+    ):
+        self.http = http
+        self.url = url
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refresh_interval = min_refresh_interval
+        self.clock = clock
+        self.on_request = on_request
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    async def get_key(self, kid: str):
+        """Public key for ``kid``, fetching the key set only when needed."""
+        if self.clock() >= self._expires_at:
+            await self.refresh()
+        key = self._keys.get(kid)
+        if key is None and self._can_refresh_early():
+            await self.refresh(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise GoogleAuthError("Unknown signing key")
+        return key
+
+    def _can_refresh_early(self) -> bool:
+        return self._fetched_at is None or self.clock() - self._fetched_at >= self.min_refresh_interval
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if not force and self.clock() < self._expires_at:
+                return
+            if force and not self._can_refresh_early():
+                return
+            try:
+                response = await _timed_get(self.http, self.url, "jwks", self.on_request)
+                response.raise_for_status()
+                keys = {}
+                for jwk in response.json()["keys"]:
+                    if jwk.get("kty") == "RSA" and jwk.get("kid"):
+                        keys[jwk["kid"]] = jwt.PyJWK(jwk, algorithm="RS256").key
+            except (httpx.HTTPError, KeyError, ValueError, jwt.PyJWKError) as e:
+                self.refresh_errors += 1
+                if self._keys:
+                    # Keep using the keys we have; try again shortly
+                    logger.warning("Google JWKS refresh failed, keeping cached keys: %r", e)
+                    self._expires_at = self.clock() + self.min_ttl
+                    return
+                raise GoogleAuthError("Could not fetch Google signing keys") from e
+            now = self.clock()
+            self._keys = keys
+            self._fetched_at = now
+            self._expires_at = now + max(self.min_ttl, cache_lifetime(response.headers, self.default_ttl))
+            self.refreshes += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self):
+        while True:
+            try:
+                # Refresh ahead of expiry so logins never wait on Google
+                await self.refresh(force=self._fetched_at is not None)
+            except Exception:
+                logger.exception("Google JWKS refresh failed")
+            delay = self._expires_at - self.clock() - self.refresh_ahead
+            await asyncio.sleep(max(self.min_refresh_interval, delay))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._keys),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "expires_in": round(max(0.0, self._expires_at - self.clock()), 1),
+        }
+
+
+class GoogleVerifier:
+    def __init__(
+        self,
+        client_id: str,
+        jwks_url: str = GOOGLE_JWKS_URL,
+        userinfo_url: str = GOOGLE_USERINFO_URL,
+        timeout: float = 5.0,
+        leeway: float = 30.0,
+        on_request: Optional[Callable[[str, str, float], None]] = None,
+    ):
+        self.client_id = client_id
+        self.userinfo_url = userinfo_url
+        self.leeway = leeway
+        self.timeout = timeout
+        self.http: Optional[httpx.AsyncClient] = None
+        self.on_request = on_request
+        self.jwks = JWKSCache(None, jwks_url, on_request=on_request)
+        self.local_verifications = 0
+        self.remote_verifications = 0
+
+    @classmethod
+    def from_env(cls, client_id: str, **kwargs: Any) -> "GoogleVerifier":
+        return cls(
+            client_id=client_id,
+            jwks_url=os.environ.get("GOOGLE_JWKS_URL", GOOGLE_JWKS_URL),
+            userinfo_url=os.environ.get("GOOGLE_USERINFO_URL", GOOGLE_USERINFO_URL),
+            timeout=float(os.environ.get("GOOGLE_HTTP_TIMEOUT", "5.0")),
+            **kwargs,
+        )
+
+    def start(self):
+        if self.http is None:
+            self.http = self.jwks.http = httpx.AsyncClient(timeout=self.timeout)
+        self.jwks.start()
+
+    async def warm(self):
+        """Fetch the signing keys now, which also opens the pooled connection."""
+        self.start()
+        await self.jwks.refresh()
+
+    async def close(self):
+        await self.jwks.stop()
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = self.jwks.http = None
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Return ``{"email", "name", "picture"}`` for a valid Google token."""
+        if not token:
+            raise GoogleAuthError("Missing Google token")
+        if self.http is None:
+            self.start()
+        if looks_like_jwt(token):
+            return await self.verify_id_token(token)
+        return await self.fetch_userinfo(token)
+
+    async def verify_id_token(self, token: str) -> Dict[str, Any]:
+        try:
+            header = jwt.get_unverified_header(token)
+            key = await self.jwks.get_key(header.get("kid", ""))
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=self.client_id,
+                leeway=self.leeway,
+                options={"require": ["exp", "iss", "aud", "email"]},
+            )
+        except jwt.InvalidTokenError as e:
+            raise GoogleAuthError(f"Invalid Google token: {e}") from e
+        if claims["iss"] not in GOOGLE_ISSUERS:
+            raise GoogleAuthError("Invalid Google token issuer")
+        if claims.get("email_verified") is False:
+            raise GoogleAuthError("Google account email is not verified")
+        self.local_verifications += 1
+        return {
+            "email": claims["email"],
+            "name": claims.get("name") or claims["email"].split("@")[0],
+            "picture": claims.get("picture"),
+        }
+
+    async def fetch_userinfo(self, access_token: str) -> Dict[str, Any]:
+        try:
+            userinfo = await _timed_get(
+                self.http, self.userinfo_url, "userinfo", self.on_request, params={"access_token": access_token}
+            )
+        except httpx.HTTPError as e:
+            raise GoogleAuthError(f"Could not reach Google: {e!r}") from e
+        if userinfo.status_code in (400, 401):
+            raise GoogleAuthError("Invalid Google token")
+        if userinfo.status_code != 200:
+            raise GoogleAuthError("Failed to get user info")
+        self.remote_verifications += 1
+        return userinfo.json()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "local_verifications": self.local_verifications,
+            "remote_verifications": self.remote_verifications,
+            "jwks": self.jwks.stats(),
+        }
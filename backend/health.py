@@ -0,0 +1,147 @@
+"""Startup warm-up and the liveness/readiness probes.
+
+The app's lifespan creates indexes and opens the MongoDB and outbound HTTP
+pools before uvicorn accepts traffic, so the first request does not pay the
+connection and TLS setup. ``/healthz`` only says the process and its event
+loop are alive. ``/readyz`` says whether this worker should receive traffic.
+It is green once warm-up has finished, for as long as its dependency checks
+pass, and until shutdown begins. Shutdown then stops every component in
+turn, carrying on past any step that fails so the pools still get closed.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[Any]]
+
+STARTING = "starting"
+READY = "ready"
+DRAINING = "draining"
+
+
+async def warm_mongo_pool(db, connections: int):
+    """Open up to ``connections`` pooled connections with concurrent pings."""
+    # Each ping in flight checks out its own connection, so the pool grows
+    # to the number of overlapping pings instead of one handshake per request
+    await asyncio.gather(*(db.command("ping") for _ in range(max(1, connections))))
+
+
+async def run_warmups(steps: Dict[str, Check], timeout: float) -> Dict[str, str]:
+    """Run every step concurrently and return an outcome per step.
+
+    A warm-up is an optimization: a step that fails or outlives ``timeout``
+    is logged and reported, never raised, so a slow upstream cannot keep the
+    worker from starting.
+    """
+    async def run(name: str, step: Check) -> str:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(step(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Warm-up %s timed out after %gs", name, timeout)
+            return "timeout"
+        except Exception as e:
+            logger.warning("Warm-up %s failed: %r", name, e)
+            return "error"
+        logger.info("Warm-up %s took %.1fms", name, (time.perf_counter() - started) * 1000)
+        return "ok"
+
+    outcomes = await asyncio.gather(*(run(name, step) for name, step in steps.items()))
+    return dict(zip(steps, outcomes))
+
+
+async def run_shutdown(steps: Dict[str, Callable[[], Any]], timeout: float) -> Dict[str, str]:
+    """Run every step in order and return an outcome per step.
+
+    A step may be sync or async. One that raises or outlives ``timeout``
+    (say, a final flush while Mongo is down) is logged and the next one
+    still runs.
+    """
+    outcomes = {}
+    for name, step in steps.items():
+        try:
+            result = step()
+            if inspect.isawaitable(result):
+                await asyncio.wait_for(result, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Shutdown of %s timed out after %gs", name, timeout)
+            outcomes[name] = "timeout"
+        except Exception:
+            logger.exception("Shutdown of %s failed", name)
+            outcomes[name] = "error"
+        else:
+            outcomes[name] = "ok"
+    return outcomes
+
+
+class Readiness:
+    def __init__(
+        self,
+        checks: Dict[str, Check],
+        timeout: float = 1.0,
+        cache_ttl: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """``checks`` are awaited on ``/readyz``; any that raises or outlives
+        ``timeout`` makes the worker unready. Results are reused for
+        ``cache_ttl`` seconds so frequent probes do not load the database.
+        """
+        self.checks = checks
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.clock = clock
+        self.state = STARTING
+        self.startup_seconds: Optional[float] = None
+        self.warmups: Dict[str, str] = {}
+        self._created = clock()
+        self._last: Optional[Tuple[float, bool, Dict[str, str]]] = None
+        self._lock = asyncio.Lock()
+        self.probes = 0
+        self.failures = 0
+
+    def mark_ready(self, warmups: Dict[str, str]):
+        self.warmups = warmups
+        self.startup_seconds = self.clock() - self._created
+        self.state = READY
+
+    def mark_draining(self):
+        self.state = DRAINING
+
+    async def check(self) -> Tuple[bool, Dict[str, Any]]:
+        """Return ``(ready, report)`` for the readiness probe."""
+        self.probes += 1
+        if self.state != READY:
+            return False, {"status": self.state}
+        async with self._lock:
+            if self._last is None or self.clock() - self._last[0] >= self.cache_ttl:
+                results = await asyncio.gather(*(self._run(check) for check in self.checks.values()))
+                outcomes = dict(zip(self.checks, results))
+                ok = all(outcome == "ok" for outcome in outcomes.values())
+                if not ok:
+                    self.failures += 1
+                self._last = (self.clock(), ok, outcomes)
+        _, ok, outcomes = self._last
+        return ok, {"status": READY if ok else "degraded", "checks": outcomes}
+
+    async def _run(self, check: Check) -> str:
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+        except asyncio.TimeoutError:
+            return "timeout"
+        except Exception as e:
+            logger.warning("Readiness check failed: %r", e)
+            return "error"
+        return "ok"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "startup_ms": round(self.startup_seconds * 1000, 1) if self.startup_seconds is not None else None,
+            "warmups": self.warmups,
+            "probes": self.probes,
+            "failures": self.failures,
+        }
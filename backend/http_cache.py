@@ -0,0 +1,179 @@
+"""HTTP validators and Cache-Control policies for read endpoints.
+
+``HTTPCacheMiddleware`` buffers GET responses on routes that have a
+policy, adds a strong ``ETag`` (a hash of the body, unless the handler
+already set one) plus the route's ``Cache-Control``, and turns the response
+into a bodyless 304 when ``If-None-Match`` matches.
+
+Handlers whose payload comes from a versioned cache can use
+``RenderedCache`` to serialize and hash each cache entry once, so repeat
+requests are answered without re-encoding anything.
+"""
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Pattern, Tuple
+
+ASGIApp = Callable[..., Any]
+
+# Headers a 304 must repeat from the 200 it stands in for (RFC 9110 15.4.5)
+NOT_MODIFIED_HEADERS = {b"cache-control", b"content-location", b"date", b"etag", b"expires", b"vary"}
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of ``etag`` against an ``If-None-Match`` header value."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class CachePolicy:
+    def __init__(self, pattern: str, cache_control: str, vary: Optional[str] = None):
+        self.pattern: Pattern = re.compile(pattern)
+        self.cache_control = cache_control
+        self.vary = vary
+
+
+class RenderedCache:
+    """Serialized bodies and ETags keyed by ``(cache key, entry version)``."""
+
+    def __init__(self, render: Callable[[Any], bytes], max_entries: int = 256):
+        self.render = render
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[bytes, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Optional[int], payload: Any) -> Tuple[bytes, str]:
+        """Body and ETag for ``payload``, rendering it only once per version."""
+        if version is None:
+            body = self.render(payload)
+            return body, strong_etag(body)
+        entry = self._entries.get((key, version))
+        if entry is not None:
+            self._entries.move_to_end((key, version))
+            self.hits += 1
+            return entry
+        self.misses += 1
+        body = self.render(payload)
+        entry = (body, strong_etag(body))
+        # Older versions of the same key are never requested again
+        self._entries[(key, version)] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class HTTPCacheMiddleware:
+    def __init__(self, app: ASGIApp, policies: Iterable[CachePolicy], max_body: int = 1 << 20):
+        self.app = app
+        self.policies: List[CachePolicy] = list(policies)
+        self.max_body = max_body
+
+    def policy_for(self, path: str) -> Optional[CachePolicy]:
+        for policy in self.policies:
+            if policy.pattern.match(path):
+                return policy
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        policy = self.policy_for(scope["path"])
+        if policy is None:
+            return await self.app(scope, receive, send)
+
+        if_none_match = None
+        for name, value in scope["headers"]:
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+                break
+
+        start = None
+        chunks: List[bytes] = []
+        size = 0
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, size, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                start = message
+                if start["status"] != 200 or _is_streaming(start["headers"]):
+                    # Errors and event streams must not pick up a public max-age
+                    passthrough = True
+                    await send(start)
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > self.max_body:
+                # Too large to buffer: stream it without a validator
+                passthrough = True
+                await send(_with_policy(start, policy))
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": message.get("more_body", False)})
+                return
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = [(k, v) for k, v in start["headers"] if k != b"etag"]
+            etag = _header(start["headers"], b"etag") or strong_etag(body)
+            headers.append((b"etag", etag.encode("latin-1")))
+            response = _with_policy({**start, "headers": headers}, policy)
+
+            if if_none_match is not None and etag_matches(if_none_match, etag):
+                await send({
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": [(k, v) for k, v in response["headers"] if k in NOT_MODIFIED_HEADERS],
+                })
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(response)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _header(headers, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _is_streaming(headers) -> bool:
+    content_type = _header(headers, b"content-type") or ""
+    return content_type.startswith("text/event-stream")
+
+
+def _with_policy(start, policy: CachePolicy):
+    headers = list(start["headers"])
+    names = {key for key, _ in headers}
+    if b"cache-control" not in names:
+        headers.append((b"cache-control", policy.cache_control.encode("latin-1")))
+    if policy.vary and b"vary" not in names:
+        headers.append((b"vary", policy.vary.encode("latin-1")))
+    return {**start, "headers": headers}
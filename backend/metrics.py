@@ -0,0 +1,290 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Histograms are plain dicts keyed by label values, updated
+under a lock because PyMongo's command listener runs on Motor's worker
+threads. Collectors read component ``stats()`` at scrape time, so caches
+keep their own counters and nothing is double counted on the hot path.
+
+The per-request budget for ``MetricsMiddleware`` (route lookup, timing and
+one histogram observation) is 20µs; ``benchmarks/bench_metrics.py``
+measures it together with the Mongo listener overhead.
+"""
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+ASGIApp = Callable[..., Any]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Observe the duration of the block; an ``outcome`` label of "ok"/"error" is appended."""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            self.observe(time.perf_counter() - started, *labels, outcome)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CacheCollector:
+    """Hit/miss counters and sizes read from ``stats()`` callables at scrape time."""
+
+    def __init__(self, sources: Dict[str, Callable[[], Dict[str, Any]]], prefix: str = "popflix_cache"):
+        self.sources = sources
+        self.prefix = prefix
+
+    def render(self) -> List[str]:
+        series = {"hits": [], "misses": [], "entries": []}
+        for name, stats in self.sources.items():
+            try:
+                values = stats()
+            except Exception:
+                logger.exception("Metrics collector for %s failed", name)
+                continue
+            for stat, samples in series.items():
+                if stat in values:
+                    samples.append((name, values[stat]))
+        lines = []
+        for stat, kind in (("hits", "counter"), ("misses", "counter"), ("entries", "gauge")):
+            name = f"{self.prefix}_{stat}_total" if kind == "counter" else f"{self.prefix}_{stat}"
+            lines += [f"# HELP {name} Cache {stat} by cache.", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{cache="{_escape(cache)}"}} {value}' for cache, value in series[stat]]
+        return lines
+
+
+class GaugeCollector:
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_number(self.read())}"]
+
+
+class RateGovernorCollector:
+    """Queue depth, waits and shedding per priority from a governor's ``stats()``."""
+
+    SERIES = (
+        ("queue_depth", "gauge", "Requests waiting for a token."),
+        ("granted_total", "counter", "Requests granted a token."),
+        ("queued_total", "counter", "Requests that waited for a token."),
+        ("wait_seconds_total", "counter", "Seconds spent waiting for a token."),
+        ("wait_max_seconds", "gauge", "Longest wait for a token."),
+        ("shed_total", "counter", "Requests shed because the queue was full."),
+    )
+
+    def __init__(self, stats: Callable[[], Optional[Dict[str, Any]]], prefix: str = "popflix_tmdb_governor"):
+        self.stats = stats
+        self.prefix = prefix
+
+    def render(self) -> List[str]:
+        try:
+            values = self.stats()
+        except Exception:
+            logger.exception("Metrics collector for %s failed", self.prefix)
+            return []
+        if values is None:
+            return []
+        samples = {
+            "queue_depth": values["queue_depth"],
+            "granted_total": {p: v["granted"] for p, v in values["priorities"].items()},
+            "queued_total": {p: v["queued"] for p, v in values["priorities"].items()},
+            "wait_seconds_total": {p: v["wait_seconds_total"] for p, v in values["priorities"].items()},
+            "wait_max_seconds": {p: v["wait_max_ms"] / 1000 for p, v in values["priorities"].items()},
+            "shed_total": {p: v["shed"] for p, v in values["priorities"].items()},
+        }
+        lines = []
+        for stat, kind, help in self.SERIES:
+            name = f"{self.prefix}_{stat}"
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{priority="{_escape(p)}"}} {_number(v)}' for p, v in samples[stat].items()]
+        for stat, kind, help in (("tokens", "gauge", "Tokens left in the bucket."),
+                                 ("throttled", "counter", "429 responses that paused all traffic.")):
+            name = f"{self.prefix}_{stat}_total" if kind == "counter" else f"{self.prefix}_{stat}"
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_number(values[stat])}"]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._collectors: List[Any] = []
+
+    def register(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for collector in self._collectors:
+            lines += collector.render()
+        return "\n".join(lines) + "\n"
+
+
+def upstream_observer(histogram: Histogram, service: str) -> Callable[[str, str, float], None]:
+    """Callback for clients that report ``(operation, outcome, seconds)`` per call."""
+    def observe(operation: str, outcome: str, seconds: float):
+        histogram.observe(seconds, service, operation, outcome)
+    return observe
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """PyMongo command listener timing every command by name and collection."""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self._collections: Dict[Tuple[Any, int], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            # getMore names the cursor id; the collection is a separate field
+            target = event.command.get("collection", "")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, "ok")
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, "error")
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        self.histogram.observe(event.duration_micros / 1e6, event.command_name, collection, outcome)
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a sleeping task."""
+
+    def __init__(self, histogram: Histogram, interval: float = 0.5):
+        self.histogram = histogram
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, loop.time() - started - self.interval)
+            self.histogram.observe(self.last_lag)
+
+
+class MetricsMiddleware:
+    """Times each HTTP request, labelled by route template, method and status.
+
+    Must sit inside any middleware that copies ``scope``: the route is read
+    from ``scope["route"]``, which the router sets on the scope it receives.
+    Unmatched paths share one label so scanners cannot blow up cardinality.
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram, exclude: Iterable[str] = ()):
+        self.app = app
+        self.histogram = histogram
+        self.exclude = frozenset(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            self.histogram.observe(
+                time.perf_counter() - started,
+                getattr(route, "path", "unmatched"),
+                scope["method"],
+                str(status),
+            )
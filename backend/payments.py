@@ -0,0 +1,109 @@
+"""Checkout status polling backed by ``payment_transactions``.
+
+The success page polls ``/payments/status/{session_id}`` until the payment
+settles. ``CheckoutStatusPoller`` answers from Mongo once the transaction is
+paid or its session has settled, and otherwise asks Stripe at most once per
+``ttl`` seconds per session, however many polls arrive concurrently.
+"""
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cache import SWRCache
+
+# A complete session can still be unpaid while an async payment method (bank
+# debit, voucher) clears, so only these payment statuses settle it
+SETTLED_PAYMENT_STATUSES = ("paid", "no_payment_required")
+
+TRANSACTION_PROJECTION = {
+    "_id": 0, "session_id": 1, "user_id": 1, "amount": 1, "currency": 1, "payment_status": 1, "checkout_status": 1,
+}
+
+
+def is_settled(snapshot: Dict[str, Any]) -> bool:
+    """Whether a checkout status can no longer change."""
+    if snapshot["status"] == "expired":
+        return True
+    return snapshot["status"] == "complete" and snapshot["payment_status"] in SETTLED_PAYMENT_STATUSES
+
+
+def status_snapshot(checkout_status) -> Dict[str, Any]:
+    """The fields of a Stripe checkout status that the API returns."""
+    return {
+        "status": checkout_status.status,
+        "payment_status": checkout_status.payment_status,
+        "amount": checkout_status.amount_total,
+        "currency": checkout_status.currency,
+    }
+
+
+def paid_snapshot(transaction: Dict[str, Any]) -> Dict[str, Any]:
+    """The status Stripe reports for a paid session, from its transaction."""
+    return {
+        "status": "complete",
+        "payment_status": "paid",
+        # Stripe reports amounts in the currency's smallest unit
+        "amount": round(transaction["amount"] * 100),
+        "currency": transaction["currency"].lower(),
+    }
+
+
+class CheckoutStatusPoller:
+    def __init__(
+        self,
+        transactions,
+        fetch_status: Callable[[str], Awaitable[Any]],
+        on_paid: Callable[[Dict[str, Any]], Awaitable[None]],
+        ttl: float = 2.0,
+        max_entries: int = 10000,
+    ):
+        """``fetch_status(session_id)`` asks Stripe for the checkout status;
+        ``on_paid(transaction)`` upgrades the buyer the first time a session
+        is seen paid.
+        """
+        self.transactions = transactions
+        self.fetch_status = fetch_status
+        self.on_paid = on_paid
+        self._cache = SWRCache(ttl=ttl, stale_ttl=0, max_entries=max_entries)
+        self.terminal_hits = 0
+        self.stripe_calls = 0
+
+    async def status(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Current status of ``session_id``, or None if there is no such transaction."""
+        transaction = await self.transactions.find_one({"session_id": session_id}, TRANSACTION_PROJECTION)
+        if transaction is None:
+            return None
+
+        snapshot = transaction.get("checkout_status")
+        if snapshot and is_settled(snapshot):
+            self.terminal_hits += 1
+            return snapshot
+        if transaction["payment_status"] == "paid":
+            # Marked paid without a stored status, e.g. by the webhook queue
+            self.terminal_hits += 1
+            return paid_snapshot(transaction)
+
+        return await self._cache.get_or_load(session_id, lambda: self._refresh(transaction))
+
+    def forget(self, session_id: str):
+        self._cache.invalidate(session_id)
+
+    async def _refresh(self, transaction: Dict[str, Any]) -> Dict[str, Any]:
+        session_id = transaction["session_id"]
+        self.stripe_calls += 1
+        snapshot = status_snapshot(await self.fetch_status(session_id))
+
+        if snapshot["payment_status"] == "paid" and transaction["payment_status"] != "paid":
+            await self.on_paid(transaction)
+        if is_settled(snapshot):
+            await self.transactions.update_one(
+                {"session_id": session_id},
+                {"$set": {"checkout_status": snapshot, "updated_at": datetime.utcnow()}},
+            )
+        return snapshot
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "terminal_hits": self.terminal_hits,
+            "stripe_calls": self.stripe_calls,
+            **{k: v for k, v in self._cache.stats().items() if k in ("hits", "coalesced", "entries")},
+        }
@@ -0,0 +1,100 @@
+"""Premium expiry handling off the request path.
+
+Requests only compare ``premium_expires_at`` against the clock in memory
+(``effective_user``); persisting the demotion is left to ``PremiumSweeper``,
+which periodically flips every expired user with one ``update_many`` on the
+indexed ``premium_expires_at`` field.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+Clock = Callable[[], datetime]
+
+
+def as_utc_naive(value: Any) -> Optional[datetime]:
+    """Normalize a stored expiry (naive/aware datetime or ISO string) to naive UTC."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def premium_expired(is_premium: bool, premium_expires_at: Any, now: datetime) -> bool:
+    if not is_premium or premium_expires_at is None:
+        return False
+    return as_utc_naive(premium_expires_at) <= now
+
+
+def effective_user(user, now: datetime):
+    """Return ``user`` as the request should see it at ``now``, without writing."""
+    if premium_expired(user.is_premium, user.premium_expires_at, now):
+        return user.model_copy(update={"is_premium": False, "premium_expires_at": None})
+    return user
+
+
+class PremiumSweeper:
+    def __init__(self, users, interval: float = 60.0, clock: Clock = datetime.utcnow):
+        self.users = users
+        self.interval = interval
+        self.clock = clock
+        self._task: Optional[asyncio.Task] = None
+        self.demoted_total = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self):
+        try:
+            await self.migrate_string_expiries()
+        except Exception:
+            logger.exception("Premium expiry migration failed")
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Premium expiry sweep failed")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> int:
+        """Demote every user whose premium has expired; returns the count."""
+        result = await self.users.update_many(
+            {"is_premium": True, "premium_expires_at": {"$lte": self.clock()}},
+            {"$set": {"is_premium": False, "premium_expires_at": None}},
+        )
+        if result.modified_count:
+            self.demoted_total += result.modified_count
+            logger.info("Premium sweep demoted %d users", result.modified_count)
+        return result.modified_count
+
+    async def migrate_string_expiries(self) -> int:
+        """Rewrite legacy ISO-string expiries as datetimes so range queries see them."""
+        migrated = 0
+        async for user in self.users.find(
+            {"premium_expires_at": {"$type": "string"}},
+            {"_id": 0, "id": 1, "premium_expires_at": 1},
+        ):
+            await self.users.update_one(
+                {"id": user["id"]},
+                {"$set": {"premium_expires_at": as_utc_naive(user["premium_expires_at"])}},
+            )
+            migrated += 1
+        if migrated:
+            logger.info("Converted %d string premium_expires_at values to datetimes", migrated)
+        return migrated
@@ -0,0 +1,180 @@
+"""Token-bucket rate governor with priority queueing for outbound calls.
+
+Callers ``await governor.acquire(priority)`` before each upstream request.
+While tokens are available they pass straight through; once the bucket is
+empty they queue and are released in priority order (lower value first,
+FIFO within a priority) as tokens refill. ``throttle`` pauses all releases,
+e.g. for the ``Retry-After`` of a 429, and empties the bucket so traffic
+resumes at the sustained rate instead of a burst.
+
+The queue holds at most ``max_queue`` waiters. When it is full a newcomer
+sheds the newest waiter of a lower priority, which then raises
+``GovernorQueueFull``; if there is none, the newcomer raises it instead.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Any, Dict, Hashable, List, Optional
+
+
+class Priority(IntEnum):
+    SEARCH = 0
+    PAGE = 1
+    PREFETCH = 2
+
+
+class GovernorQueueFull(Exception):
+    pass
+
+
+class RateGovernor:
+    def __init__(self, rate: float, burst: Optional[int] = None, max_queue: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.max_queue = max_queue
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        # Entries are [priority, seq, enqueued_at, future, key] so they can be
+        # re-prioritized in place
+        self._waiters: List[list] = []
+        self._queued: Dict[Hashable, list] = {}
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.throttled = 0
+        self._granted = {p: 0 for p in Priority}
+        self._queued_count = {p: 0 for p in Priority}
+        self._wait_total = {p: 0.0 for p in Priority}
+        self._wait_max = {p: 0.0 for p in Priority}
+        self._shed = {p: 0 for p in Priority}
+
+    def _available(self, now: float) -> float:
+        # Nothing accrues while throttled, so a 429 is not followed by a burst
+        since = max(self._updated, self._blocked_until)
+        if now <= since:
+            return self._tokens
+        return min(self.burst, self._tokens + (now - since) * self.rate)
+
+    def _refill(self, now: float):
+        self._tokens = self._available(now)
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return False
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, priority: Priority = Priority.PAGE, key: Optional[Hashable] = None):
+        """Wait for a token. ``key`` lets a later caller ``promote`` this wait."""
+        if not self._waiters and self._try_take():
+            self._record(priority, 0.0)
+            return
+        if self.max_queue is not None:
+            self._make_room(priority)
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), time.monotonic(), future, key]
+        heapq.heappush(self._waiters, entry)
+        if key is not None:
+            self._queued[key] = entry
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled: hand the token back
+                self._tokens = min(self.burst, self._tokens + 1)
+                self._dispatch()
+            raise
+        finally:
+            if key is not None and self._queued.get(key) is entry:
+                del self._queued[key]
+
+    def _make_room(self, priority: Priority):
+        waiting = [entry for entry in self._waiters if not entry[3].done()]
+        if len(waiting) < self.max_queue:
+            return
+        victim = max(waiting, key=lambda entry: (entry[0], entry[1]), default=None)
+        if victim is None or victim[0] <= priority:
+            self._shed[priority] += 1
+            raise GovernorQueueFull(f"{len(waiting)} requests already queued")
+        self._shed[Priority(victim[0])] += 1
+        victim[3].set_exception(GovernorQueueFull("shed for a higher-priority request"))
+
+    def promote(self, key: Hashable, priority: Priority):
+        """Raise the priority of the queued wait registered under ``key``."""
+        entry = self._queued.get(key)
+        if entry is not None and priority < entry[0]:
+            entry[0] = priority
+            heapq.heapify(self._waiters)
+
+    def throttle(self, retry_after: float):
+        """Release nothing for ``retry_after`` seconds and drain the bucket."""
+        now = time.monotonic()
+        self.throttled += 1
+        self._blocked_until = max(self._blocked_until, now + retry_after)
+        self._tokens = 0.0
+
+    def _dispatch(self):
+        self._timer = None
+        while self._waiters:
+            if self._waiters[0][3].done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take():
+                break
+            priority, _, enqueued_at, future, _ = heapq.heappop(self._waiters)
+            future.set_result(None)
+            self._record(Priority(priority), time.monotonic() - enqueued_at)
+        self._schedule()
+
+    def _schedule(self):
+        if not self._waiters or self._timer is not None:
+            return
+        now = time.monotonic()
+        self._refill(now)
+        delay = max(0.0, self._blocked_until - now) + max(0.0, (1 - self._tokens) / self.rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _record(self, priority: Priority, waited: float):
+        self._granted[priority] += 1
+        if waited > 0:
+            self._queued_count[priority] += 1
+            self._wait_total[priority] += waited
+            self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+    def queue_depth(self) -> Dict[str, int]:
+        depth = {p.name.lower(): 0 for p in Priority}
+        for entry in self._waiters:
+            if not entry[3].done():
+                depth[Priority(entry[0]).name.lower()] += 1
+        return depth
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "max_queue": self.max_queue,
+            "tokens": round(self._available(now), 2),
+            "throttled": self.throttled,
+            "blocked_for": round(max(0.0, self._blocked_until - now), 3),
+            "queue_depth": self.queue_depth(),
+            "priorities": {
+                p.name.lower(): {
+                    "granted": self._granted[p],
+                    "queued": self._queued_count[p],
+                    "wait_mean_ms": round(self._wait_total[p] / self._queued_count[p] * 1000, 3) if self._queued_count[p] else 0.0,
+                    "wait_max_ms": round(self._wait_max[p] * 1000, 3),
+                    "wait_seconds_total": round(self._wait_total[p], 6),
+                    "shed": self._shed[p],
+                }
+                for p in Priority
+            },
+        }
@@ -0,0 +1,295 @@
+"""Genre-based recommendations scored with NumPy.
+
+Every catalog title is an L2-normalized row of ``F`` over ``GENRE_IDS``.
+Genre co-occurrence across the catalog gives a genre-genre similarity
+``C``, blended with the identity so a title's own genres dominate, and the
+item-item similarity is ``S = F C Fᵀ``. ``S`` is never materialized:
+``M = F C`` is kept instead, and a user's profile ``p`` is the weighted sum
+of the rows of ``F`` they watched or favorited, so ``M @ p`` equals the
+weighted sum of ``S`` columns and scoring a user is one matrix-vector
+product over the catalog.
+
+New or changed titles update their rows of ``M`` in place; ``C`` itself is
+only recomputed once the catalog has grown by ``refresh_growth`` since the
+last refresh. Profiles are cached per user and adjusted by the weight delta
+of each new history or favorite event instead of being rebuilt.
+"""
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from cache import TTLCache
+
+# TMDB movie genres plus the TV-only ones; the TV genres that merge two movie
+# genres are mapped onto them so movie and TV profiles share one space.
+GENRE_IDS = (
+    28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37,
+    10763, 10764, 10766, 10767,
+)
+GENRE_ALIASES = {
+    10759: (28, 12),     # Action & Adventure
+    10762: (10751,),     # Kids
+    10765: (878, 14),    # Sci-Fi & Fantasy
+    10768: (10752,),     # War & Politics
+}
+_COLUMNS = {genre_id: column for column, genre_id in enumerate(GENRE_IDS)}
+CONTENT_TYPES = ("movie", "tv")
+
+# Starting a title counts for something; finishing it counts more; a
+# favorite outweighs any amount of watching.
+HISTORY_BASE_WEIGHT = 0.25
+FAVORITE_WEIGHT = 2.0
+
+Key = Tuple[str, int]
+
+
+def genre_columns(genre_ids: Optional[Iterable[int]]) -> List[int]:
+    return [
+        _COLUMNS[mapped]
+        for genre_id in genre_ids or ()
+        for mapped in GENRE_ALIASES.get(genre_id, (genre_id,))
+        if mapped in _COLUMNS
+    ]
+
+
+def _doubled(array: np.ndarray, axis: int) -> np.ndarray:
+    return np.concatenate((array, np.zeros_like(array)), axis=axis)
+
+
+class Profile:
+    __slots__ = ("history", "favorites", "vector", "version")
+
+    def __init__(self, history: Dict[Key, float], favorites: Set[Key]):
+        self.history = history
+        self.favorites = favorites
+        self.vector: Optional[np.ndarray] = None
+        self.version = -1
+
+    def weight(self, key: Key) -> float:
+        weight = HISTORY_BASE_WEIGHT + self.history[key] if key in self.history else 0.0
+        return weight + (FAVORITE_WEIGHT if key in self.favorites else 0.0)
+
+    def seen(self) -> Set[Key]:
+        return self.history.keys() | self.favorites
+
+
+class RecommendationEngine:
+    def __init__(
+        self,
+        max_profiles: int = 50000,
+        profile_ttl: float = 300.0,
+        popularity_weight: float = 0.05,
+        genre_blend: float = 0.3,
+        refresh_growth: float = 0.1,
+        initial_capacity: int = 1024,
+    ):
+        self.popularity_weight = popularity_weight
+        self.genre_blend = genre_blend
+        self.refresh_growth = refresh_growth
+        dims = len(GENRE_IDS)
+        initial_capacity = max(1, initial_capacity)
+        self._features = np.zeros((initial_capacity, dims), dtype=np.float32)
+        # M is stored transposed: scoring is then a product with contiguous
+        # per-genre rows, about twice as fast as with an (items, genres) M.
+        self._mixed = np.zeros((dims, initial_capacity), dtype=np.float32)
+        self._log_popularity = np.zeros(initial_capacity, dtype=np.float32)
+        # Per content type: 0 for titles of that type, -inf for the rest
+        self._type_filter = np.zeros((len(CONTENT_TYPES), initial_capacity), dtype=np.float32)
+        self._keys: List[Key] = []
+        self._data: List[Dict[str, Any]] = []
+        self._rows: Dict[Key, int] = {}
+        # Genre co-occurrence counts over the catalog, kept exact on every
+        # upsert; the similarity derived from them is refreshed lazily.
+        self._cooccurrence = np.zeros((dims, dims), dtype=np.float64)
+        self._similarity = np.eye(dims, dtype=np.float32)
+        self._refreshed_at_size = 0
+        self._max_log_popularity = 0.0
+        self.version = 0
+        self.refreshes = 0
+        self.last_refresh_seconds = 0.0
+        self._profiles = TTLCache(ttl=profile_ttl, max_entries=max_profiles)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows
+
+    # Catalog
+
+    def upsert_items(self, content_type: str, entries: Iterable[Dict[str, Any]]):
+        """Add or update titles from catalog entries (``tmdb_id``, ``data``, ``popularity``)."""
+        entries = list(entries)
+        if not entries:
+            return
+        size = len(self._keys)
+        row_ids: List[int] = []
+        popularity: List[float] = []
+        cells: List[int] = []  # flat (entry, genre) indices of set features
+        dims = len(GENRE_IDS)
+        for i, entry in enumerate(entries):
+            key = (content_type, entry["tmdb_id"])
+            row = self._rows.get(key)
+            if row is None:
+                row = self._append(key)
+            row_ids.append(row)
+            self._data[row] = entry["data"]
+            cells += [i * dims + column for column in genre_columns(entry["data"].get("genre_ids"))]
+            popularity.append(entry.get("popularity") or 0.0)
+        for index, filtered_type in enumerate(CONTENT_TYPES):
+            self._type_filter[index, size:len(self._keys)] = 0.0 if filtered_type == content_type else -np.inf
+        rows = np.array(row_ids, dtype=np.intp)
+        vectors = np.zeros((len(entries), dims), dtype=np.float32)
+        vectors.flat[cells] = 1.0
+
+        # Last occurrence wins when a title repeats within the batch
+        reversed_rows, first = np.unique(rows[::-1], return_index=True)
+        last = len(rows) - 1 - first
+        rows, vectors = reversed_rows, vectors[last]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        log_popularity = np.log1p(np.maximum(np.array(popularity, dtype=np.float32)[last], 0))
+        self._log_popularity[rows] = log_popularity
+        self._max_log_popularity = max(self._max_log_popularity, float(log_popularity.max()))
+
+        changed = (rows >= size) | np.any(self._features[rows] != vectors, axis=1)
+        if not changed.any():
+            return
+        rows, vectors = rows[changed], vectors[changed]
+        # New rows are still zero here, so only replaced genres are subtracted
+        before = (self._features[rows] > 0).astype(np.float64)
+        after = (vectors > 0).astype(np.float64)
+        self._cooccurrence += after.T @ after - before.T @ before
+        self._features[rows] = vectors
+
+        self.version += 1
+        if len(self._keys) > self._refreshed_at_size * (1 + self.refresh_growth):
+            self.refresh()
+        else:
+            self._mixed[:, rows] = self._similarity.T @ self._features[rows].T
+
+    def refresh(self):
+        """Recompute the genre similarity and every row of ``M`` from scratch."""
+        started = time.perf_counter()
+        counts = self._cooccurrence
+        diagonal = np.sqrt(np.diag(counts))
+        scale = np.outer(diagonal, diagonal)
+        cosine = np.divide(counts, scale, out=np.zeros_like(counts), where=scale > 0)
+        dims = len(GENRE_IDS)
+        self._similarity = ((1 - self.genre_blend) * np.eye(dims) + self.genre_blend * cosine).astype(np.float32)
+        size = len(self._keys)
+        self._mixed[:, :size] = self._similarity.T @ self._features[:size].T
+        self._refreshed_at_size = size
+        self.refreshes += 1
+        self.last_refresh_seconds = time.perf_counter() - started
+
+    def _append(self, key: Key) -> int:
+        row = len(self._keys)
+        if row == len(self._features):
+            self._features = _doubled(self._features, axis=0)
+            self._log_popularity = _doubled(self._log_popularity, axis=0)
+            self._mixed = _doubled(self._mixed, axis=1)
+            self._type_filter = _doubled(self._type_filter, axis=1)
+        self._rows[key] = row
+        self._keys.append(key)
+        self._data.append({})
+        return row
+
+    # Profiles
+
+    def has_profile(self, user_id: str) -> bool:
+        return self._profiles.get(user_id) is not None
+
+    def build_profile(self, user_id: str, history: Iterable[Tuple[Key, float]], favorites: Iterable[Key]):
+        """Cache a profile from the user's ``(key, progress)`` history and favorite keys."""
+        profile = Profile(
+            {key: min(max(progress or 0.0, 0.0), 1.0) for key, progress in history},
+            set(favorites),
+        )
+        self._profiles.set(user_id, profile)
+
+    def record_history(self, user_id: str, key: Key, progress: float):
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            return
+        before = profile.weight(key)
+        profile.history[key] = min(max(progress or 0.0, 0.0), 1.0)
+        self._apply(profile, key, profile.weight(key) - before)
+
+    def record_favorite(self, user_id: str, key: Key, added: bool):
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            return
+        before = profile.weight(key)
+        if added:
+            profile.favorites.add(key)
+        else:
+            profile.favorites.discard(key)
+        self._apply(profile, key, profile.weight(key) - before)
+
+    def _apply(self, profile: Profile, key: Key, delta: float):
+        row = self._rows.get(key)
+        if delta and row is not None and profile.version == self.version:
+            profile.vector += delta * self._features[row]
+
+    def _vector(self, profile: Profile) -> np.ndarray:
+        if profile.version != self.version:
+            # Titles were added or re-tagged since this vector was summed
+            keys = [key for key in profile.seen() if key in self._rows]
+            vector = np.zeros(len(GENRE_IDS), dtype=np.float32)
+            if keys:
+                weights = np.array([profile.weight(key) for key in keys], dtype=np.float32)
+                vector = weights @ self._features[[self._rows[key] for key in keys]]
+            profile.vector = vector
+            profile.version = self.version
+        return profile.vector
+
+    # Scoring
+
+    def recommend(self, user_id: str, limit: int = 20, content_type: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Return up to ``limit`` ``(content_type, data)`` pairs, best first.
+
+        Users without a cached profile, or whose titles are all unknown to
+        the catalog, get the most popular titles they have not seen.
+        """
+        size = len(self._keys)
+        if not size:
+            return []
+        scores = self._log_popularity[:size] * np.float32(
+            self.popularity_weight / self._max_log_popularity if self._max_log_popularity else 0.0
+        )
+        profile = self._profiles.get(user_id)
+        seen: Set[Key] = set()
+        if profile is not None:
+            seen = profile.seen()
+            vector = self._vector(profile)
+            norm = float(np.linalg.norm(vector))
+            if norm:
+                scores += (vector / norm) @ self._mixed[:, :size]
+
+        if content_type is not None:
+            scores += self._type_filter[CONTENT_TYPES.index(content_type), :size]
+        excluded = [self._rows[key] for key in seen if key in self._rows]
+        if excluded:
+            scores[excluded] = -np.inf
+
+        limit = min(limit, size)
+        top = np.argpartition(scores, size - limit)[size - limit:]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (self._keys[row][0], self._data[row])
+            for row in top.tolist() if scores[row] != -np.inf
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "titles": len(self._keys),
+            "version": self.version,
+            "refreshes": self.refreshes,
+            "last_refresh_ms": round(self.last_refresh_seconds * 1000, 3),
+            "array_mb": round(sum(
+                array.nbytes for array in (self._features, self._mixed, self._log_popularity, self._type_filter)
+            ) / 2**20, 1),
+            "profiles": self._profiles.stats(),
+        }
@@ -0,0 +1,225 @@
+"""In-memory typeahead index over every title the backend has seen.
+
+Titles are tokenized and every token prefix (up to ``max_prefix_len``
+characters) maps to the set of documents containing it. Results are ranked by
+TMDB popularity, then vote average. Selective queries filter the smallest
+posting set and heap-select the best matches; broad ones walk a score-ordered
+list of all titles and stop after ``limit`` matches, so no query materializes
+a large intersection. Recent query results are memoized until the index
+changes; re-adding a title with the same text, item and score is not a
+change. ``add_many`` loads a batch and sorts the score order once for it.
+"""
+import bisect
+import heapq
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+class SearchIndex:
+    def __init__(self, max_prefix_len: int = 10, result_cache_size: int = 8192):
+        self.max_prefix_len = max_prefix_len
+        self.result_cache_size = result_cache_size
+        self._ids: Dict[Hashable, int] = {}
+        self._keys: List[Hashable] = []
+        self._items: List[Any] = []
+        self._tokens: List[Tuple[str, ...]] = []
+        self._scores: List[Tuple[float, float]] = []
+        self._postings: Dict[str, Set[int]] = {}
+        # Tokens longer than max_prefix_len, for queries past the prefix cap
+        self._long_tokens: Dict[str, Set[int]] = {}
+        self._long_vocab: List[str] = []
+        # (-popularity, -vote_average, doc_id), kept sorted on every insert
+        # outside add_many, which re-sorts it (and _long_vocab) once at the end
+        self._order: List[Tuple[float, float, int]] = []
+        self._batch = False
+        self._results: "OrderedDict[Tuple[str, int], List[Any]]" = OrderedDict()
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._ids
+
+    def add(self, key: Hashable, title: str, item: Any, popularity: float = 0.0, vote_average: Optional[float] = None):
+        """Insert or update ``item`` under ``key``, searchable by ``title``."""
+        if self._upsert(key, title, item, popularity, vote_average):
+            self._changed()
+
+    def add_many(self, entries: Iterable[Tuple[Hashable, str, Any, float, Optional[float]]]):
+        """``add`` for ``(key, title, item, popularity, vote_average)`` entries."""
+        changed = False
+        self._batch = True
+        try:
+            for entry in entries:
+                changed |= self._upsert(*entry)
+        finally:
+            self._batch = False
+            if changed:
+                self._order = sorted((-score[0], -score[1], doc_id) for doc_id, score in enumerate(self._scores))
+                self._long_vocab = sorted(self._long_tokens)
+        if changed:
+            self._changed()
+
+    def _upsert(self, key: Hashable, title: str, item: Any, popularity: float, vote_average: Optional[float]) -> bool:
+        """Write one title; returns whether anything searchable changed."""
+        tokens = tuple(dict.fromkeys(tokenize(title)))
+        score = (popularity or 0.0, vote_average or 0.0)
+        doc_id = self._ids.get(key)
+
+        if doc_id is None:
+            if not tokens:
+                return False
+            doc_id = len(self._keys)
+            self._ids[key] = doc_id
+            self._keys.append(key)
+            self._items.append(item)
+            self._tokens.append(tokens)
+            self._scores.append(score)
+            self._index_tokens(doc_id, tokens)
+            if not self._batch:
+                bisect.insort(self._order, (-score[0], -score[1], doc_id))
+            return True
+
+        changed = False
+        if tokens and tokens != self._tokens[doc_id]:
+            self._unindex_tokens(doc_id, self._tokens[doc_id])
+            self._tokens[doc_id] = tokens
+            self._index_tokens(doc_id, tokens)
+            changed = True
+        if item != self._items[doc_id]:
+            self._items[doc_id] = item
+            changed = True
+        # Entries learned from favorites/history carry no ranking signal;
+        # keep whatever score a TMDB listing gave them.
+        if (popularity or vote_average is not None) and score != self._scores[doc_id]:
+            if not self._batch:
+                old = self._scores[doc_id]
+                del self._order[bisect.bisect_left(self._order, (-old[0], -old[1], doc_id))]
+                bisect.insort(self._order, (-score[0], -score[1], doc_id))
+            self._scores[doc_id] = score
+            changed = True
+        return changed
+
+    def add_if_missing(self, key: Hashable, title: str, item: Any):
+        if key not in self._ids:
+            self.add(key, title, item)
+
+    def search(self, query: str, limit: int = 20) -> List[Any]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        cache_key = (" ".join(terms), limit)
+        cached = self._results.get(cache_key)
+        if cached is not None:
+            self._results.move_to_end(cache_key)
+            return cached
+
+        results = [self._items[doc_id] for doc_id in self._rank(terms, limit)]
+        self._results[cache_key] = results
+        if len(self._results) > self.result_cache_size:
+            self._results.popitem(last=False)
+        return results
+
+    def _postings_for(self, terms: List[str]) -> List[Set[int]]:
+        # A term that prefixes another term is implied by it ("crown c").
+        terms = [t for t in set(terms) if not any(o != t and o.startswith(t) for o in terms)]
+        postings = []
+        for term in terms:
+            if len(term) > self.max_prefix_len:
+                posting = self._long_posting(term)
+            else:
+                posting = self._postings.get(term)
+            if not posting:
+                return []
+            postings.append(posting)
+        return sorted(postings, key=len)
+
+    def _long_posting(self, term: str) -> Set[int]:
+        start = bisect.bisect_left(self._long_vocab, term)
+        end = bisect.bisect_left(self._long_vocab, term + "\uffff", start)
+        if end - start == 1:
+            return self._long_tokens[self._long_vocab[start]]
+        return set().union(*(self._long_tokens[token] for token in self._long_vocab[start:end]))
+
+    def _rank(self, terms: List[str], limit: int) -> List[int]:
+        postings = self._postings_for(terms)
+        if not postings:
+            return []
+        smallest, others = postings[0], postings[1:]
+
+        # Expected number of titles to walk in score order before finding
+        # ``limit`` matches, assuming terms occur independently.
+        total = len(self._keys)
+        density = 1.0
+        for posting in postings:
+            density *= len(posting) / total
+        if limit / density < len(smallest):
+            ranked = []
+            for _, _, doc_id in self._order:
+                if doc_id in smallest and all(doc_id in posting for posting in others):
+                    ranked.append(doc_id)
+                    if len(ranked) == limit:
+                        break
+            return ranked
+
+        candidates = smallest.intersection(*others) if others else smallest
+        return heapq.nlargest(limit, candidates, key=self._scores.__getitem__)
+
+    def _prefixes(self, tokens: Tuple[str, ...]) -> Set[str]:
+        return {token[:end] for token in tokens for end in range(1, min(len(token), self.max_prefix_len) + 1)}
+
+    def _index_tokens(self, doc_id: int, tokens: Tuple[str, ...]):
+        for prefix in self._prefixes(tokens):
+            self._postings.setdefault(prefix, set()).add(doc_id)
+        for token in tokens:
+            if len(token) > self.max_prefix_len:
+                if token not in self._long_tokens:
+                    self._long_tokens[token] = set()
+                    if not self._batch:
+                        bisect.insort(self._long_vocab, token)
+                self._long_tokens[token].add(doc_id)
+
+    def _unindex_tokens(self, doc_id: int, tokens: Tuple[str, ...]):
+        for prefix in self._prefixes(tokens):
+            posting = self._postings.get(prefix)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[prefix]
+        for token in tokens:
+            posting = self._long_tokens.get(token)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._long_tokens[token]
+                    if not self._batch:
+                        del self._long_vocab[bisect.bisect_left(self._long_vocab, token)]
+
+    def _changed(self):
+        self.version += 1
+        self._results.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "titles": len(self._keys),
+            "prefixes": len(self._postings),
+            "cached_queries": len(self._results),
+            "version": self.version,
+        }
@@ -1,29 +1,106 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import os
 import logging
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uuid
+import hashlib
+import time
+import asyncio
 from datetime import datetime, timedelta
-import requests
 import json
-from urllib.parse import quote
 import jwt
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+
+from cache import SWRCache, TTLCache
+from catalog_warmer import CatalogWarmer, TMDB_PAGE_SIZE
+from comment_hub import ChangeStreamBridge, CommentHub, encode_comment
+from comments import fetch_comment_page, fetch_replies
+from compression import CompressedStore, CompressionMiddleware
+from payments import CheckoutStatusPoller
+from premium_sweeper import PremiumSweeper, effective_user
+from recommendations import RecommendationEngine
+from db_indexes import ensure_indexes
+from discover import SORTS as DISCOVER_SORTS, DiscoverIndex, parse_genres, render_page
+from fast_json import FastJSONResponse, projection, validate_many
+from favorites import add_favorite, bulk_update_favorites
+from google_auth import GoogleVerifier
+from health import Readiness, run_shutdown, run_warmups, warm_mongo_pool
+from http_cache import CachePolicy, HTTPCacheMiddleware, RenderedCache
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, FAST_BUCKETS, CacheCollector, GaugeCollector, LoopLagMonitor,
+    MetricsMiddleware, MongoCommandMetrics, RateGovernorCollector, Registry, upstream_observer,
+)
+from search_index import SearchIndex
+from shared_cache import MongoInvalidationBus, MongoL2, RedisInvalidationBus, RedisL2, TwoLevelCache
+from watch_buffer import WatchHistoryBuffer
+from webhook_queue import WebhookQueue
+from rate_governor import Priority
+from tmdb_client import TMDBClient, TMDBError
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics, scraped from /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+metrics_registry = Registry()
+request_seconds = metrics_registry.histogram(
+    "popflix_http_request_duration_seconds", "API request latency by route, method and status.",
+    ("route", "method", "status"),
+)
+upstream_seconds = metrics_registry.histogram(
+    "popflix_upstream_request_duration_seconds", "Outbound call latency by service, operation and outcome.",
+    ("service", "operation", "outcome"),
+)
+mongo_seconds = metrics_registry.histogram(
+    "popflix_mongo_command_duration_seconds", "MongoDB command latency by command, collection and outcome.",
+    ("command", "collection", "outcome"), buckets=FAST_BUCKETS,
+)
+loop_lag_seconds = metrics_registry.histogram(
+    "popflix_event_loop_lag_seconds", "How late the event loop wakes a sleeping task.", buckets=FAST_BUCKETS,
+)
+loop_lag_monitor = LoopLagMonitor(loop_lag_seconds)
+
 # MongoDB connection
+# connect=False: no sockets or monitor threads until the lifespan warms the
+# pool, so importing this module stays cheap and does no I/O.
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    connect=False,
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+    event_listeners=[MongoCommandMetrics(mongo_seconds)] if METRICS_ENABLED else [],
+)
 db = client[os.environ['DB_NAME']]
 
+# Startup warm-up and the /healthz and /readyz probes
+MONGO_WARM_CONNECTIONS = int(os.environ.get('MONGO_WARM_CONNECTIONS', '4'))
+TMDB_WARM_CONNECTIONS = int(os.environ.get('TMDB_WARM_CONNECTIONS', '2'))
+WARMUP_TIMEOUT = float(os.environ.get('WARMUP_TIMEOUT', '5.0'))
+INDEX_RETRY_DELAY = float(os.environ.get('INDEX_RETRY_DELAY', '5.0'))
+SHUTDOWN_STEP_TIMEOUT = float(os.environ.get('SHUTDOWN_STEP_TIMEOUT', '10.0'))
+indexes_created = asyncio.Event()
+
+async def check_indexes():
+    if not indexes_created.is_set():
+        raise RuntimeError("indexes are not created yet")
+
+readiness = Readiness(
+    {"mongo": lambda: db.command("ping"), "indexes": check_indexes},
+    timeout=float(os.environ.get('READINESS_TIMEOUT', '1.0')),
+    cache_ttl=float(os.environ.get('READINESS_CACHE_TTL', '1.0')),
+)
+
 # API Keys
 TMDB_API_KEY = os.environ.get('TMDB_API_KEY', '1baf462ff9a6d4a3461ca615496ecf84')
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID', '267961051535-vfvp7i0d4hjgqvo365fm7jioca28fqaq.apps.googleusercontent.com')
@@ -35,11 +112,12 @@ STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY')
 # JWT Secret
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-here-change-in-production')
 
-# Create the main app
+# Create the main app; startup and shutdown are in lifespan() at the bottom
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Models
 class User(BaseModel):
@@ -108,6 +186,7 @@ class Comment(BaseModel):
     tmdb_id: int
     text: str
     parent_id: Optional[str] = None
+    root_id: Optional[str] = None  # top-level comment of the thread
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class PaymentTransaction(BaseModel):
@@ -122,145 +201,363 @@ class PaymentTransaction(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+# Shared cache tier
+# Caches that must agree across uvicorn workers and pods keep an in-process
+# L1 in front of a shared L2 (MongoDB by default, or Redis), and broadcast
+# invalidations so no worker keeps serving an entry another one dropped.
+SHARED_CACHE_BACKEND = os.environ.get('SHARED_CACHE_BACKEND', 'mongo')  # mongo, redis or none
+CACHE_INVALIDATION_BUS = os.environ.get('CACHE_INVALIDATION_BUS', 'true').lower() in ('1', 'true', 'yes')
+if SHARED_CACHE_BACKEND == "redis":
+    shared_l2 = RedisL2.from_url(os.environ['REDIS_URL'])
+    cache_bus = RedisInvalidationBus(shared_l2.client) if CACHE_INVALIDATION_BUS else None
+elif SHARED_CACHE_BACKEND == "mongo":
+    shared_l2 = MongoL2(db.cache_entries)
+    cache_bus = MongoInvalidationBus(db) if CACHE_INVALIDATION_BUS else None
+else:
+    shared_l2 = cache_bus = None
+
 # Authentication helpers
+# Every authenticated request would otherwise decode the JWT and re-read the
+# user from Mongo. Entries are invalidated wherever the code mutates a user.
+token_cache = TTLCache(
+    ttl=float(os.environ.get('TOKEN_CACHE_TTL', '300')),
+    max_entries=int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', '50000')),
+)
+user_cache = TwoLevelCache(
+    "user",
+    shared_l2,
+    cache_bus,
+    ttl=float(os.environ.get('USER_CACHE_TTL', '60')),
+    max_entries=int(os.environ.get('USER_CACHE_MAX_ENTRIES', '50000')),
+    encode=lambda user: user.dict(),
+    decode=lambda doc: User(**doc),
+)
+
+async def invalidate_user(user_id: str):
+    await user_cache.invalidate(user_id)
+
+def decode_token(token: str) -> Dict[str, Any]:
+    token_key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(token_key)
+    if payload is None:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        # Never serve a cached payload past the token's own expiry
+        ttl = token_cache.ttl
+        if payload.get("exp") is not None:
+            ttl = min(ttl, payload["exp"] - time.time())
+        token_cache.set(token_key, payload, ttl=ttl)
+    return payload
+
+premium_sweeper = PremiumSweeper(
+    db.users,
+    interval=float(os.environ.get('PREMIUM_SWEEP_INTERVAL', '60')),
+)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        payload = decode_token(token)
         user_id = payload.get("user_id")
         
-        user = await db.users.find_one({"id": user_id})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+        async def load_user():
+            user = await db.users.find_one({"id": user_id})
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            return User(**user)
+        
+        # Not written back if invalidate_user ran while the user was read
+        resolved = await user_cache.get_or_load(user_id, load_user)
         
-        # Check if premium expired
-        if user.get('premium_expires_at') and datetime.fromisoformat(user['premium_expires_at'].replace('Z', '+00:00')) < datetime.utcnow():
-            await db.users.update_one({"id": user_id}, {"$set": {"is_premium": False, "premium_expires_at": None}})
-            user['is_premium'] = False
-            
-        return User(**user)
+        # Expired premium is hidden here and persisted by premium_sweeper,
+        # both against the sweeper's clock
+        return effective_user(resolved, premium_sweeper.clock())
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[User]:
+    """Like ``get_current_user``, but anonymous (or invalid) credentials give ``None``."""
+    if credentials is None:
+        return None
+    try:
+        return await get_current_user(credentials)
+    except HTTPException:
+        return None
+
 # TMDB API Integration
-@api_router.get("/movies/popular")
-async def get_popular_movies():
-    url = f"https://api.themoviedb.org/3/movie/popular?api_key={TMDB_API_KEY}&language=en-US&page=1"
-    response = requests.get(url)
-    data = response.json()
+tmdb_client = TMDBClient.from_env(TMDB_API_KEY, on_request=upstream_observer(upstream_seconds, "tmdb"))
+
+# Genre vectors for every catalog title; user profiles are built on first
+# request and then kept current by the history and favorites handlers.
+recommender = RecommendationEngine(
+    max_profiles=int(os.environ.get('RECOMMENDER_MAX_PROFILES', '50000')),
+    profile_ttl=float(os.environ.get('RECOMMENDER_PROFILE_TTL', '300')),
+    popularity_weight=float(os.environ.get('RECOMMENDER_POPULARITY_WEIGHT', '0.05')),
+)
+
+# Filters, sorts and facets for /discover, served from the catalog in memory
+discover_index = DiscoverIndex(
+    max_titles=int(os.environ.get('DISCOVER_MAX_TITLES', '100000')),
+    rebuild_interval=float(os.environ.get('DISCOVER_REBUILD_INTERVAL', '1.0')),
+)
+catalog_load_lock = asyncio.Lock()
+# Set once db.catalog has been read, even if it was empty, so requests on a
+# cold catalog do not each scan it again
+stored_catalog_loaded = asyncio.Event()
+
+# Every title we see (listings, search hits, favorites, history) feeds the
+# local typeahead index so most searches never reach TMDB.
+search_index = SearchIndex()
+SEARCH_RESULT_LIMIT = 20
+SEARCH_LOCAL_MIN_RESULTS = int(os.environ.get('SEARCH_LOCAL_MIN_RESULTS', '5'))
+
+# Popular lists change a few times a day; cache the built payloads so a hit
+# skips both the TMDB round trip and the model construction loop.
+catalog_cache = SWRCache(
+    ttl=float(os.environ.get('CATALOG_CACHE_TTL', '600')),
+    stale_ttl=float(os.environ.get('CATALOG_CACHE_STALE_TTL', '3600')),
+    max_entries=int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '256')),
+)
+# Shared by every worker; catalog_cache above remains each worker's copy and
+# is dropped whenever another worker clears this namespace.
+shared_catalog = TwoLevelCache(
+    "catalog",
+    shared_l2,
+    cache_bus,
+    ttl=catalog_cache.ttl,
+    l1_ttl=0,
+    encode=jsonable_encoder,
+    on_invalidate=lambda key: catalog_cache.clear(),
+)
+
+async def load_cached_catalog(key, loader):
+    return await catalog_cache.get_or_load(key, lambda: shared_catalog.get_or_load(key, loader))
+
+async def tmdb_get(path: str, priority: Priority = Priority.PAGE, **params) -> Dict[str, Any]:
+    try:
+        return await tmdb_client.get(path, priority=priority, **params)
+    except TMDBError as e:
+        logger.warning(str(e))
+        if e.status_code == 429:
+            raise HTTPException(status_code=503, detail="TMDB rate limit reached, try again shortly")
+        raise HTTPException(status_code=502, detail="Failed to fetch data from TMDB")
+
+def movie_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(
+        tmdb_id=item['id'],
+        title=item['title'],
+        overview=item.get('overview'),
+        poster_path=item.get('poster_path'),
+        backdrop_path=item.get('backdrop_path'),
+        release_date=item.get('release_date'),
+        vote_average=item.get('vote_average'),
+        genre_ids=item.get('genre_ids', []),
+        adult=item.get('adult', False)
+    )
+
+def tv_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(
+        tmdb_id=item['id'],
+        name=item['name'],
+        overview=item.get('overview'),
+        poster_path=item.get('poster_path'),
+        backdrop_path=item.get('backdrop_path'),
+        first_air_date=item.get('first_air_date'),
+        vote_average=item.get('vote_average'),
+        genre_ids=item.get('genre_ids', [])
+    )
+
+def movie_from_tmdb(item: Dict[str, Any]) -> Movie:
+    return Movie(**movie_fields(item))
+
+def tv_from_tmdb(item: Dict[str, Any]) -> TVShow:
+    return TVShow(**tv_fields(item))
+
+def search_entry(content_type: str, content, popularity: Optional[float] = None):
+    title = content.title if content_type == "movie" else content.name
+    return (content_type, content.tmdb_id), title, {"type": content_type, "data": content}, popularity, content.vote_average
+
+def index_title(content_type: str, content, popularity: Optional[float] = None):
+    search_index.add(*search_entry(content_type, content, popularity))
+    discover_index.upsert(content_type, content.model_dump(), popularity)
+
+def remember_title(content_type: str, tmdb_id: int, title: str, poster_path: Optional[str] = None):
+    """Make titles known only from user activity searchable locally."""
+    if (content_type, tmdb_id) in search_index or not title:
+        return
+    if content_type == "movie":
+        content = Movie(tmdb_id=tmdb_id, title=title, poster_path=poster_path)
+    elif content_type == "tv":
+        content = TVShow(tmdb_id=tmdb_id, name=title, poster_path=poster_path)
+    else:
+        return
+    search_index.add_if_missing((content_type, tmdb_id), title, {"type": content_type, "data": content})
+
+def content_from_tmdb(content_type: str, item: Dict[str, Any]):
+    return movie_from_tmdb(item) if content_type == "movie" else tv_from_tmdb(item)
+
+def content_from_catalog(content_type: str, data: Dict[str, Any]):
+    return Movie(**data) if content_type == "movie" else TVShow(**data)
+
+def contents_from_tmdb(content_type: str, items: List[Dict[str, Any]]):
+    if content_type == "movie":
+        return validate_many(Movie, [movie_fields(item) for item in items])
+    return validate_many(TVShow, [tv_fields(item) for item in items])
+
+def contents_from_catalog(content_type: str, data: List[Dict[str, Any]]):
+    return validate_many(Movie if content_type == "movie" else TVShow, data)
+
+CATALOG_LIST_PATHS = {
+    ("movie", "popular"): "/movie/popular",
+    ("tv", "popular"): "/tv/popular",
+}
+
+async def load_catalog_page(content_type: str, list_name: str, page: int, page_size: int):
+    skip = (page - 1) * page_size
+    rank_field = f"ranks.{list_name}"
+    docs = await db.catalog.find(
+        {"content_type": content_type, rank_field: {"$exists": True}},
+        {"_id": 0, "data": 1},
+    ).sort(rank_field, 1).skip(skip).limit(page_size).to_list(page_size)
+    if len(docs) == page_size:
+        return {"results": contents_from_catalog(content_type, [doc['data'] for doc in docs]), "page": page, "page_size": page_size}
     
-    movies = []
-    for item in data.get('results', []):
-        movies.append(Movie(
-            tmdb_id=item['id'],
-            title=item['title'],
-            overview=item.get('overview'),
-            poster_path=item.get('poster_path'),
-            backdrop_path=item.get('backdrop_path'),
-            release_date=item.get('release_date'),
-            vote_average=item.get('vote_average'),
-            genre_ids=item.get('genre_ids', []),
-            adult=item.get('adult', False)
-        ))
+    # Not warmed yet, or the page runs past the warmed range: read through to TMDB
+    first_page = skip // TMDB_PAGE_SIZE + 1
+    last_page = (skip + page_size - 1) // TMDB_PAGE_SIZE + 1
+    path = CATALOG_LIST_PATHS[(content_type, list_name)]
+    responses = await asyncio.gather(*(tmdb_get(path, page=p) for p in range(first_page, last_page + 1)))
+    items = [item for data in responses for item in data.get('results', [])]
+    offset = skip - (first_page - 1) * TMDB_PAGE_SIZE
     
-    return {"results": movies}
+    items = items[offset:offset + page_size]
+    results = contents_from_tmdb(content_type, items)
+    for item, content in zip(items, results):
+        index_title(content_type, content, item.get('popularity'))
+    return {"results": results, "page": page, "page_size": page_size}
+
+async def on_catalog_update(content_type: str, entries: List[Dict[str, Any]], changed: bool):
+    search_index.add_many(
+        search_entry(content_type, content_from_catalog(content_type, entry['data']), entry.get('popularity'))
+        for entry in entries
+    )
+    recommender.upsert_items(content_type, entries)
+    discover_index.upsert_items(content_type, entries)
+    if changed:
+        # Also clears catalog_cache, here and in every other worker
+        await shared_catalog.clear()
+
+catalog_warmer = CatalogWarmer(
+    db.catalog,
+    tmdb_client,
+    content_from_tmdb,
+    pages=int(os.environ.get('CATALOG_WARM_PAGES', '5')),
+    interval=float(os.environ.get('CATALOG_WARM_INTERVAL', '3600')),
+    concurrency=int(os.environ.get('CATALOG_WARM_CONCURRENCY', '4')),
+    on_update=on_catalog_update,
+    # One worker fetches from TMDB per interval; the rest reload db.catalog
+    leases=db.leases,
+    poll_interval=float(os.environ.get('CATALOG_WARM_POLL_INTERVAL', '60')),
+)
+CATALOG_WARMER_ENABLED = os.environ.get('CATALOG_WARMER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Opt-in: list endpoints return orjson-encoded responses directly, skipping
+# FastAPI's jsonable_encoder pass over every item.
+FAST_JSON_ENABLED = os.environ.get('FAST_JSON_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+def respond(content: Any):
+    return FastJSONResponse(content) if FAST_JSON_ENABLED else content
+
+def render_json(content: Any) -> bytes:
+    if FAST_JSON_ENABLED:
+        return FastJSONResponse(content).body
+    return JSONResponse(jsonable_encoder(content)).body
+
+# Each catalog cache entry is serialized and hashed once; repeat requests
+# reuse the bytes and HTTPCacheMiddleware answers If-None-Match from the ETag.
+rendered_catalog = RenderedCache(render_json, max_entries=catalog_cache.max_entries)
+
+async def catalog_response(key, loader) -> Response:
+    payload = await load_cached_catalog(key, loader)
+    entry = catalog_cache.get_entry(key)
+    version = entry.version if entry is not None and entry.value is payload else None
+    body, etag = rendered_catalog.get(key, version, payload)
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+@api_router.get("/movies/popular")
+async def get_popular_movies(page: int = Query(1, ge=1, le=500), page_size: int = Query(20, ge=1, le=100)):
+    return await catalog_response(
+        ("movie", "popular", page, page_size),
+        lambda: load_catalog_page("movie", "popular", page, page_size),
+    )
 
 @api_router.get("/tv/popular")
-async def get_popular_tv():
-    url = f"https://api.themoviedb.org/3/tv/popular?api_key={TMDB_API_KEY}&language=en-US&page=1"
-    response = requests.get(url)
-    data = response.json()
-    
-    shows = []
-    for item in data.get('results', []):
-        shows.append(TVShow(
-            tmdb_id=item['id'],
-            name=item['name'],
-            overview=item.get('overview'),
-            poster_path=item.get('poster_path'),
-            backdrop_path=item.get('backdrop_path'),
-            first_air_date=item.get('first_air_date'),
-            vote_average=item.get('vote_average'),
-            genre_ids=item.get('genre_ids', [])
-        ))
-    
-    return {"results": shows}
+async def get_popular_tv(page: int = Query(1, ge=1, le=500), page_size: int = Query(20, ge=1, le=100)):
+    return await catalog_response(
+        ("tv", "popular", page, page_size),
+        lambda: load_catalog_page("tv", "popular", page, page_size),
+    )
 
 @api_router.get("/search")
 async def search_content(q: str):
-    encoded_query = quote(q)
-    url = f"https://api.themoviedb.org/3/search/multi?api_key={TMDB_API_KEY}&language=en-US&query={encoded_query}&page=1"
-    response = requests.get(url)
-    data = response.json()
+    local_results = search_index.search(q, limit=SEARCH_RESULT_LIMIT)
+    if len(local_results) >= SEARCH_LOCAL_MIN_RESULTS:
+        return respond({"results": local_results})
+
+    data = await tmdb_get("/search/multi", priority=Priority.SEARCH, query=q, page=1)
     
     results = []
+    seen = set()
     for item in data.get('results', []):
         if item['media_type'] == 'movie':
-            results.append({
-                "type": "movie",
-                "data": Movie(
-                    tmdb_id=item['id'],
-                    title=item['title'],
-                    overview=item.get('overview'),
-                    poster_path=item.get('poster_path'),
-                    backdrop_path=item.get('backdrop_path'),
-                    release_date=item.get('release_date'),
-                    vote_average=item.get('vote_average'),
-                    genre_ids=item.get('genre_ids', []),
-                    adult=item.get('adult', False)
-                )
-            })
+            content = movie_from_tmdb(item)
         elif item['media_type'] == 'tv':
-            results.append({
-                "type": "tv",
-                "data": TVShow(
-                    tmdb_id=item['id'],
-                    name=item['name'],
-                    overview=item.get('overview'),
-                    poster_path=item.get('poster_path'),
-                    backdrop_path=item.get('backdrop_path'),
-                    first_air_date=item.get('first_air_date'),
-                    vote_average=item.get('vote_average'),
-                    genre_ids=item.get('genre_ids', [])
-                )
-            })
-    
-    return {"results": results}
+            content = tv_from_tmdb(item)
+        else:
+            continue
+        index_title(item['media_type'], content, item.get('popularity'))
+        results.append({"type": item['media_type'], "data": content})
+        seen.add((item['media_type'], content.tmdb_id))
+    
+    # Keep TMDB's relevance order and append local matches it did not return
+    for result in local_results:
+        if (result["type"], result["data"].tmdb_id) not in seen:
+            results.append(result)
+    
+    return respond({"results": results})
 
 # Google OAuth
+# ID tokens are verified locally against cached Google signing keys; opaque
+# access tokens fall back to one async userinfo call.
+google_verifier = GoogleVerifier.from_env(GOOGLE_CLIENT_ID, on_request=upstream_observer(upstream_seconds, "google"))
+
+async def upsert_google_user(user_data: Dict[str, Any]) -> User:
+    new_user = User(
+        email=user_data['email'],
+        name=user_data['name'],
+        picture=user_data.get('picture')
+    )
+    try:
+        existing_user = await db.users.find_one_and_update(
+            {"email": new_user.email},
+            {"$setOnInsert": new_user.dict()},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent first login inserted the same email
+        existing_user = await db.users.find_one({"email": new_user.email})
+    return User(**existing_user)
+
 @api_router.post("/auth/google")
 async def google_auth(request: Dict[str, str]):
     # Verify Google token
     token = request.get('token')
     
     try:
-        # Verify the token with Google
-        google_response = requests.get(f"https://www.googleapis.com/oauth2/v1/tokeninfo?access_token={token}")
-        if google_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Invalid Google token")
-            
-        # Get user info from Google
-        user_info_response = requests.get(f"https://www.googleapis.com/oauth2/v2/userinfo?access_token={token}")
-        if user_info_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to get user info")
-            
-        user_data = user_info_response.json()
-        
-        # Check if user exists
-        existing_user = await db.users.find_one({"email": user_data['email']})
-        
-        if existing_user:
-            user = User(**existing_user)
-        else:
-            # Create new user
-            user = User(
-                email=user_data['email'],
-                name=user_data['name'],
-                picture=user_data.get('picture')
-            )
-            await db.users.insert_one(user.dict())
+        user_data = await google_verifier.verify(token)
+        user = await upsert_google_user(user_data)
         
         # Create JWT token
         jwt_payload = {
@@ -300,6 +597,14 @@ async def get_stream_url(content_type: str, tmdb_id: int, season: Optional[int]
         raise HTTPException(status_code=400, detail="Invalid content type")
 
 # User features
+watch_buffer = WatchHistoryBuffer(
+    db.watch_history,
+    max_staleness=float(os.environ.get('WATCH_BUFFER_MAX_STALENESS', '5')),
+    max_entries=int(os.environ.get('WATCH_BUFFER_MAX_ENTRIES', '10000')),
+)
+WATCH_BUFFER_ENABLED = os.environ.get('WATCH_BUFFER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+WATCH_HISTORY_PROJECTION = projection(WatchHistory)
+
 @api_router.post("/watchhistory")
 async def add_to_watch_history(
     request: Dict[str, Any],
@@ -316,20 +621,48 @@ async def add_to_watch_history(
         episode=request.get('episode')
     )
     
-    # Update existing or create new
-    await db.watch_history.replace_one(
-        {"user_id": user.id, "content_type": request['content_type'], "tmdb_id": request['tmdb_id']},
-        watch_item.dict(),
-        upsert=True
-    )
+    remember_title(watch_item.content_type, watch_item.tmdb_id, watch_item.title, watch_item.poster_path)
+    recommender.record_history(user.id, (watch_item.content_type, watch_item.tmdb_id), watch_item.progress)
+    
+    # Progress heartbeats are coalesced in memory and flushed in bulk; write
+    # directly only when buffering is off or the buffer is full.
+    if not (WATCH_BUFFER_ENABLED and watch_buffer.add(watch_item.dict())):
+        await db.watch_history.replace_one(
+            {"user_id": user.id, "content_type": request['content_type'], "tmdb_id": request['tmdb_id']},
+            watch_item.dict(),
+            upsert=True
+        )
     
     return watch_item
 
+async def load_watch_history(user_id: str) -> List[Dict[str, Any]]:
+    history = await db.watch_history.find(
+        {"user_id": user_id}, WATCH_HISTORY_PROJECTION
+    ).sort("last_watched", -1).to_list(100)
+    pending = watch_buffer.pending_for_user(user_id)
+    if pending:
+        merged = {(item['content_type'], item['tmdb_id']): item for item in history}
+        for item in pending:
+            merged[(item['content_type'], item['tmdb_id'])] = item
+        history = sorted(merged.values(), key=lambda item: item['last_watched'], reverse=True)[:100]
+    for item in history:
+        remember_title(item['content_type'], item['tmdb_id'], item['title'], item.get('poster_path'))
+    return history
+
 @api_router.get("/watchhistory")
 async def get_watch_history(user: User = Depends(get_current_user)):
-    history = await db.watch_history.find({"user_id": user.id}).sort("last_watched", -1).to_list(100)
+    history = await load_watch_history(user.id)
+    if FAST_JSON_ENABLED:
+        # Every document was written from WatchHistory.dict(), so the
+        # projected fields already match the model
+        return FastJSONResponse(history)
     return [WatchHistory(**item) for item in history]
 
+FAVORITES_BULK_LIMIT = 1000
+# Bulk removes are single deletes; cap how many one request runs at once
+FAVORITES_REMOVE_CONCURRENCY = int(os.environ.get('FAVORITES_REMOVE_CONCURRENCY', '8'))
+FAVORITES_PROJECTION = projection(Favorite)
+
 @api_router.post("/favorites")
 async def add_to_favorites(
     request: Dict[str, Any],
@@ -343,22 +676,61 @@ async def add_to_favorites(
         poster_path=request.get('poster_path')
     )
     
-    # Check if already favorited
-    existing = await db.favorites.find_one({
-        "user_id": user.id,
-        "content_type": request['content_type'],
-        "tmdb_id": request['tmdb_id']
-    })
-    
-    if existing:
+    if not await add_favorite(db.favorites, favorite.dict()):
         return {"message": "Already in favorites"}
     
-    await db.favorites.insert_one(favorite.dict())
+    remember_title(favorite.content_type, favorite.tmdb_id, favorite.title, favorite.poster_path)
+    recommender.record_favorite(user.id, (favorite.content_type, favorite.tmdb_id), True)
     return favorite
 
+@api_router.post("/favorites/bulk")
+async def bulk_update_favorites_endpoint(
+    request: Dict[str, Any],
+    user: User = Depends(get_current_user)
+):
+    adds = request.get('add', [])
+    removes = request.get('remove', [])
+    if len(adds) + len(removes) > FAVORITES_BULK_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {FAVORITES_BULK_LIMIT} items per request")
+    
+    def build_favorite(item: Dict[str, Any]) -> Dict[str, Any]:
+        return Favorite(
+            user_id=user.id,
+            content_type=item['content_type'],
+            tmdb_id=item['tmdb_id'],
+            title=item['title'],
+            poster_path=item.get('poster_path')
+        ).dict()
+    
+    results = await bulk_update_favorites(
+        db.favorites, user.id, adds, removes, build_favorite, remove_concurrency=FAVORITES_REMOVE_CONCURRENCY
+    )
+    for item, result in zip(adds, results):
+        if result['status'] == "added":
+            remember_title(item['content_type'], item['tmdb_id'], item['title'], item.get('poster_path'))
+    for result in results:
+        if result['status'] in ("added", "removed"):
+            recommender.record_favorite(user.id, (result['content_type'], result['tmdb_id']), result['status'] == "added")
+    
+    return {
+        "results": results,
+        "added": sum(1 for r in results if r['status'] == "added"),
+        "removed": sum(1 for r in results if r['status'] == "removed"),
+    }
+
+async def load_favorites(user_id: str) -> List[Dict[str, Any]]:
+    favorites = await db.favorites.find(
+        {"user_id": user_id}, FAVORITES_PROJECTION
+    ).sort("added_at", -1).to_list(100)
+    for item in favorites:
+        remember_title(item['content_type'], item['tmdb_id'], item['title'], item.get('poster_path'))
+    return favorites
+
 @api_router.get("/favorites")
 async def get_favorites(user: User = Depends(get_current_user)):
-    favorites = await db.favorites.find({"user_id": user.id}).sort("added_at", -1).to_list(100)
+    favorites = await load_favorites(user.id)
+    if FAST_JSON_ENABLED:
+        return FastJSONResponse(favorites)
     return [Favorite(**item) for item in favorites]
 
 @api_router.delete("/favorites/{content_type}/{tmdb_id}")
@@ -376,13 +748,246 @@ async def remove_from_favorites(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Favorite not found")
     
+    recommender.record_favorite(user.id, (content_type, tmdb_id), False)
     return {"message": "Removed from favorites"}
 
+# Recommendations
+RECOMMENDER_PROFILE_LIMIT = 500
+
+async def load_stored_catalog():
+    """Fill the in-memory catalog indexes from Mongo once, before the warmer
+    has necessarily run. Both indexes upsert, so titles the warmer or single
+    listings and searches already added are only refreshed.
+    """
+    async with catalog_load_lock:
+        if stored_catalog_loaded.is_set():
+            return
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        async for doc in db.catalog.find({}, {"_id": 0, "content_type": 1, "tmdb_id": 1, "data": 1, "popularity": 1}):
+            by_type.setdefault(doc['content_type'], []).append(doc)
+        for content_type, entries in by_type.items():
+            recommender.upsert_items(content_type, entries)
+            discover_index.upsert_items(content_type, entries)
+        stored_catalog_loaded.set()
+
+async def build_recommender_profile(user_id: str):
+    history, favorites = await asyncio.gather(
+        db.watch_history.find(
+            {"user_id": user_id}, {"_id": 0, "content_type": 1, "tmdb_id": 1, "progress": 1}
+        ).sort("last_watched", -1).to_list(RECOMMENDER_PROFILE_LIMIT),
+        db.favorites.find(
+            {"user_id": user_id}, {"_id": 0, "content_type": 1, "tmdb_id": 1}
+        ).sort("added_at", -1).to_list(RECOMMENDER_PROFILE_LIMIT),
+    )
+    progress = {(item['content_type'], item['tmdb_id']): item.get('progress', 0.0) for item in history}
+    for item in watch_buffer.pending_for_user(user_id):
+        progress[(item['content_type'], item['tmdb_id'])] = item['progress']
+    recommender.build_profile(
+        user_id,
+        progress.items(),
+        [(item['content_type'], item['tmdb_id']) for item in favorites],
+    )
+
+@api_router.get("/recommendations")
+async def get_recommendations(
+    limit: int = Query(20, ge=1, le=100),
+    content_type: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    if content_type not in (None, "movie", "tv"):
+        raise HTTPException(status_code=400, detail="Invalid content type")
+    if not stored_catalog_loaded.is_set():
+        await load_stored_catalog()
+    if not recommender.has_profile(user.id):
+        await build_recommender_profile(user.id)
+    return respond({"results": [
+        {"type": item_type, "data": content_from_catalog(item_type, data)}
+        for item_type, data in recommender.recommend(user.id, limit=limit, content_type=content_type)
+    ]})
+
+# Discover
+# Filtering by genre, year and rating with facet counts, answered from
+# discover_index so no click reaches TMDB's discover endpoint.
+@api_router.get("/discover")
+async def discover(
+    content_type: Optional[str] = None,
+    with_genres: Optional[str] = None,
+    year_gte: Optional[int] = Query(None, ge=1800, le=2200),
+    year_lte: Optional[int] = Query(None, ge=1800, le=2200),
+    vote_average_gte: Optional[float] = Query(None, ge=0, le=10),
+    vote_average_lte: Optional[float] = Query(None, ge=0, le=10),
+    include_adult: bool = False,
+    sort_by: str = "popularity.desc",
+    page: int = Query(1, ge=1, le=500),
+    page_size: int = Query(20, ge=1, le=100),
+):
+    if content_type not in (None, "movie", "tv"):
+        raise HTTPException(status_code=400, detail="Invalid content type")
+    if sort_by not in DISCOVER_SORTS:
+        raise HTTPException(status_code=400, detail="Invalid sort")
+    try:
+        genre_ids, match_all_genres = parse_genres(with_genres)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid genres")
+    if not stored_catalog_loaded.is_set():
+        await load_stored_catalog()
+    items, meta = discover_index.discover(
+        content_type=content_type,
+        genre_ids=genre_ids,
+        match_all_genres=match_all_genres,
+        year_gte=year_gte,
+        year_lte=year_lte,
+        vote_average_gte=vote_average_gte,
+        vote_average_lte=vote_average_lte,
+        include_adult=include_adult,
+        sort_by=sort_by,
+        page=page,
+        page_size=page_size,
+    )
+    return Response(render_page(items, meta), media_type="application/json")
+
+# Home feed
+# Everything the landing page shows in one round trip. Sections load
+# concurrently and each has its own deadline: a slow or failing section comes
+# back empty with its status instead of holding up or failing the others.
+HOME_SECTION_TIMEOUT = float(os.environ.get('HOME_SECTION_TIMEOUT', '2.0'))
+HOME_PAGE_SIZE = 20
+CONTINUE_WATCHING_MAX_PROGRESS = 0.95
+
+def _retrieve_exception(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
+
+async def home_section(name: str, loader, timeout: float) -> Dict[str, Any]:
+    task = asyncio.ensure_future(loader())
+    # A load that outlives the deadline keeps running so it still fills
+    # catalog_cache for the next request; its result is dropped here.
+    task.add_done_callback(_retrieve_exception)
+    try:
+        results = await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Home section %s timed out after %gs", name, timeout)
+        return {"status": "timeout", "results": []}
+    except Exception:
+        logger.exception("Home section %s failed", name)
+        return {"status": "error", "results": []}
+    return {"status": "ok", "results": results}
+
+async def load_popular(content_type: str) -> List[Any]:
+    key = (content_type, "popular", 1, HOME_PAGE_SIZE)
+    payload = await load_cached_catalog(key, lambda: load_catalog_page(content_type, "popular", 1, HOME_PAGE_SIZE))
+    return payload["results"]
+
+async def load_continue_watching(user_id: str) -> List[Dict[str, Any]]:
+    history = await load_watch_history(user_id)
+    return [item for item in history if item['progress'] < CONTINUE_WATCHING_MAX_PROGRESS][:HOME_PAGE_SIZE]
+
+@api_router.get("/home")
+async def get_home(user: Optional[User] = Depends(get_optional_user)):
+    loaders = {
+        "popular_movies": lambda: load_popular("movie"),
+        "popular_tv": lambda: load_popular("tv"),
+    }
+    if user is not None:
+        loaders["continue_watching"] = lambda: load_continue_watching(user.id)
+        loaders["favorites"] = lambda: load_favorites(user.id)
+    sections = await asyncio.gather(*(
+        home_section(name, loader, HOME_SECTION_TIMEOUT) for name, loader in loaders.items()
+    ))
+    return respond({"user": user, "sections": dict(zip(loaders, sections))})
+
 # Premium payments with Stripe
 PACKAGES = {
     "premium_monthly": {"amount": 200.0, "currency": "INR", "duration_days": 30}
 }
 
+# emergentintegrations pulls in the Stripe SDK, which only payments need, so
+# it is imported on first use (or in the background after startup, see
+# lifespan) instead of every worker paying for it before it can serve.
+def import_stripe_checkout():
+    from emergentintegrations.payments.stripe import checkout
+    return checkout
+
+# Shared by status polling and the webhook; checkout creation still builds
+# its own because the webhook URL depends on the caller's origin.
+@lru_cache(maxsize=None)
+def shared_stripe_checkout():
+    return import_stripe_checkout().StripeCheckout(api_key=STRIPE_API_KEY, webhook_url="")
+
+async def apply_premium_upgrade(transaction: Dict[str, Any]):
+    """Upgrade the buyer of ``transaction``; safe to repeat.
+
+    The first call fixes ``paid_at`` on the transaction and the expiry is
+    derived from it, so webhook redeliveries, retries and a status poll
+    racing the webhook all write the same values.
+    """
+    session_id = transaction['session_id']
+    await db.payment_transactions.update_one(
+        {"session_id": session_id, "paid_at": None},
+        {"$set": {"paid_at": datetime.utcnow()}}
+    )
+    transaction = await db.payment_transactions.find_one(
+        {"session_id": session_id},
+        {"_id": 0, "user_id": 1, "paid_at": 1, "metadata": 1}
+    )
+    user_id = transaction['user_id']
+    package = PACKAGES.get(transaction.get('metadata', {}).get('package_id'), PACKAGES['premium_monthly'])
+    premium_expires = transaction['paid_at'] + timedelta(days=package['duration_days'])
+    
+    await db.users.update_one(
+        {"id": user_id},
+        {
+            "$set": {"is_premium": True},
+            # Never shorten a later expiry from another purchase
+            "$max": {"premium_expires_at": premium_expires}
+        }
+    )
+    await invalidate_user(user_id)
+    
+    await db.payment_transactions.update_one(
+        {"session_id": session_id},
+        {
+            "$set": {
+                "payment_status": "paid",
+                "updated_at": datetime.utcnow()
+            }
+        }
+    )
+
+async def fetch_checkout_status(session_id: str):
+    with upstream_seconds.time("stripe", "checkout_status"):
+        return await shared_stripe_checkout().get_checkout_status(session_id)
+
+checkout_status_poller = CheckoutStatusPoller(
+    db.payment_transactions,
+    fetch_checkout_status,
+    apply_premium_upgrade,
+    ttl=float(os.environ.get('CHECKOUT_STATUS_CACHE_TTL', '2')),
+)
+
+async def process_webhook_event(event: Dict[str, Any]):
+    if event['type'] != "checkout.session.completed":
+        return
+    session_id = event['payload']['session_id']
+    transaction = await db.payment_transactions.find_one(
+        {"session_id": session_id},
+        {"_id": 0, "session_id": 1, "payment_status": 1}
+    )
+    if not transaction:
+        # The checkout request may still be writing it; retried with backoff
+        raise LookupError(f"No transaction for session {session_id}")
+    if transaction['payment_status'] != "paid":
+        await apply_premium_upgrade(transaction)
+    checkout_status_poller.forget(session_id)
+
+webhook_queue = WebhookQueue(
+    db.webhook_events,
+    db.webhook_events_dead,
+    process_webhook_event,
+    workers=int(os.environ.get('WEBHOOK_WORKERS', '4')),
+    max_attempts=int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8')),
+)
+
 @api_router.post("/payments/create-checkout")
 async def create_payment_checkout(
     request: Dict[str, Any],
@@ -400,15 +1005,16 @@ async def create_payment_checkout(
     package = PACKAGES[package_id]
     
     # Initialize Stripe checkout
+    checkout = import_stripe_checkout()
     host_url = origin_url
     webhook_url = f"{origin_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+    origin_checkout = checkout.StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
     
     # Create checkout session
     success_url = f"{origin_url}/premium/success?session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{origin_url}/premium/cancel"
     
-    checkout_request = CheckoutSessionRequest(
+    checkout_request = checkout.CheckoutSessionRequest(
         amount=package['amount'],
         currency=package['currency'],
         success_url=success_url,
@@ -420,7 +1026,8 @@ async def create_payment_checkout(
         }
     )
     
-    session = await stripe_checkout.create_checkout_session(checkout_request)
+    with upstream_seconds.time("stripe", "create_checkout"):
+        session = await origin_checkout.create_checkout_session(checkout_request)
     
     # Create payment transaction record
     transaction = PaymentTransaction(
@@ -438,89 +1045,51 @@ async def create_payment_checkout(
 
 @api_router.get("/payments/status/{session_id}")
 async def check_payment_status(session_id: str):
-    # Get transaction from DB
-    transaction = await db.payment_transactions.find_one({"session_id": session_id})
-    if not transaction:
+    # Settled sessions are answered from Mongo; open ones hit Stripe at most
+    # once per CHECKOUT_STATUS_CACHE_TTL however often the page polls.
+    status = await checkout_status_poller.status(session_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    # Check with Stripe
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url="")
-    checkout_status = await stripe_checkout.get_checkout_status(session_id)
-    
-    # Update transaction status
-    if checkout_status.payment_status == "paid" and transaction['payment_status'] != "paid":
-        # Update user to premium
-        user_id = transaction['user_id']
-        premium_expires = datetime.utcnow() + timedelta(days=30)
-        
-        await db.users.update_one(
-            {"id": user_id},
-            {
-                "$set": {
-                    "is_premium": True,
-                    "premium_expires_at": premium_expires
-                }
-            }
-        )
-        
-        # Update transaction
-        await db.payment_transactions.update_one(
-            {"session_id": session_id},
-            {
-                "$set": {
-                    "payment_status": "paid",
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-    
-    return {
-        "status": checkout_status.status,
-        "payment_status": checkout_status.payment_status,
-        "amount": checkout_status.amount_total,
-        "currency": checkout_status.currency
-    }
+    return status
 
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
     body = await request.body()
     signature = request.headers.get("Stripe-Signature")
     
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url="")
-    webhook_response = await stripe_checkout.handle_webhook(body, signature)
-    
-    if webhook_response.event_type == "checkout.session.completed":
-        session_id = webhook_response.session_id
-        
-        # Update transaction and user
-        transaction = await db.payment_transactions.find_one({"session_id": session_id})
-        if transaction and transaction['payment_status'] != "paid":
-            user_id = transaction['user_id']
-            premium_expires = datetime.utcnow() + timedelta(days=30)
-            
-            await db.users.update_one(
-                {"id": user_id},
-                {
-                    "$set": {
-                        "is_premium": True,
-                        "premium_expires_at": premium_expires
-                    }
-                }
-            )
-            
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {
-                    "$set": {
-                        "payment_status": "paid",
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
+    webhook_response = await shared_stripe_checkout().handle_webhook(body, signature)
     
+    # Persist and acknowledge; webhook_queue workers apply the upgrade.
+    # Redelivered events are deduplicated on the Stripe event id.
+    await webhook_queue.enqueue(
+        webhook_response.event_id,
+        webhook_response.event_type,
+        {"session_id": webhook_response.session_id, "payment_status": webhook_response.payment_status}
+    )
     return {"status": "success"}
 
 # Comments (Premium only)
+# New comments are pushed to viewers over SSE/WebSocket. "memory" publishes
+# from add_comment and reaches this worker only; "changestream" tails Mongo
+# inserts so every worker sees every comment (requires a replica set).
+COMMENT_PUSH_BACKEND = os.environ.get('COMMENT_PUSH_BACKEND', 'memory')
+COMMENT_STREAM_KEEPALIVE = 15.0
+comment_hub = CommentHub(
+    queue_size=int(os.environ.get('COMMENT_PUSH_QUEUE_SIZE', '32')),
+    max_subscribers=int(os.environ.get('COMMENT_PUSH_MAX_SUBSCRIBERS', '20000')),
+)
+comment_bridge = ChangeStreamBridge(db.comments, comment_hub)
+
+comment_counts = TTLCache(ttl=float(os.environ.get('COMMENT_COUNT_CACHE_TTL', '300')), max_entries=50000)
+
+async def get_comment_count(content_type: str, tmdb_id: int) -> int:
+    key = (content_type, tmdb_id)
+    count = comment_counts.get(key)
+    if count is None:
+        count = await db.comments.count_documents({"content_type": content_type, "tmdb_id": tmdb_id})
+        comment_counts.set(key, count)
+    return count
+
 @api_router.post("/comments")
 async def add_comment(
     request: Dict[str, Any],
@@ -529,35 +1098,200 @@ async def add_comment(
     if not user.is_premium:
         raise HTTPException(status_code=403, detail="Premium membership required for comments")
     
+    root_id = None
+    parent_id = request.get('parent_id')
+    if parent_id:
+        parent = await db.comments.find_one(
+            {"id": parent_id, "content_type": request['content_type'], "tmdb_id": request['tmdb_id']},
+            {"_id": 0, "id": 1, "root_id": 1}
+        )
+        if not parent:
+            raise HTTPException(status_code=400, detail="Parent comment not found")
+        root_id = parent.get('root_id') or parent['id']
+    
     comment = Comment(
         user_id=user.id,
         user_name=user.name,
         content_type=request['content_type'],
         tmdb_id=request['tmdb_id'],
         text=request['text'],
-        parent_id=request.get('parent_id')
+        parent_id=parent_id,
+        root_id=root_id
     )
     
     await db.comments.insert_one(comment.dict())
+    
+    key = (comment.content_type, comment.tmdb_id)
+    count = comment_counts.get(key)
+    if count is not None:
+        comment_counts.set(key, count + 1)
+    if COMMENT_PUSH_BACKEND == "memory":
+        comment_hub.publish(key, encode_comment(comment.dict()))
     return comment
 
 @api_router.get("/comments/{content_type}/{tmdb_id}")
-async def get_comments(content_type: str, tmdb_id: int):
-    comments = await db.comments.find({
-        "content_type": content_type,
-        "tmdb_id": tmdb_id
-    }).sort("created_at", -1).to_list(1000)
+async def get_comments(
+    content_type: str,
+    tmdb_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    try:
+        page = await fetch_comment_page(db.comments, content_type, tmdb_id, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    return [Comment(**comment) for comment in comments]
+    page["count"] = await get_comment_count(content_type, tmdb_id)
+    return respond(page)
+
+@api_router.get("/comments/{content_type}/{tmdb_id}/{comment_id}/replies")
+async def get_comment_replies(
+    content_type: str,
+    tmdb_id: int,
+    comment_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None
+):
+    """Continue a thread flagged ``has_more_replies`` from the page's
+    ``replies_cursor``. Replies are flat, oldest first; nest them by
+    ``parent_id``.
+    """
+    try:
+        replies, next_cursor = await fetch_replies(db.comments, [comment_id], limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return respond({"replies": replies, "next_cursor": next_cursor})
+
+@api_router.get("/comments/{content_type}/{tmdb_id}/count")
+async def get_comments_count(content_type: str, tmdb_id: int):
+    return {"count": await get_comment_count(content_type, tmdb_id)}
+
+def subscribe_comments(content_type: str, tmdb_id: int):
+    subscription = comment_hub.subscribe((content_type, tmdb_id))
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many live comment subscribers")
+    return subscription
+
+@api_router.get("/comments/{content_type}/{tmdb_id}/stream")
+async def stream_comments(content_type: str, tmdb_id: int):
+    subscription = subscribe_comments(content_type, tmdb_id)
+    
+    async def events():
+        # StreamingResponse cancels this generator when the client
+        # disconnects; the finally then frees the subscription right away
+        try:
+            while True:
+                message = await subscription.get(timeout=COMMENT_STREAM_KEEPALIVE)
+                if subscription.take_lagged():
+                    # Messages were dropped for this client; tell it to refetch
+                    yield "event: lagged\ndata: {}\n\n"
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: comment\ndata: {message}\n\n"
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.websocket("/comments/{content_type}/{tmdb_id}/ws")
+async def comments_websocket(websocket: WebSocket, content_type: str, tmdb_id: int):
+    subscription = comment_hub.subscribe((content_type, tmdb_id))
+    if subscription is None:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    
+    async def send_comments():
+        while True:
+            message = await subscription.get()
+            if subscription.take_lagged():
+                await websocket.send_text('{"event": "lagged"}')
+            await websocket.send_text(message)
+    
+    # The client never sends anything meaningful; receiving only detects disconnects
+    sender = asyncio.create_task(send_comments())
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        subscription.close()
+        try:
+            await sender
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.warning("Pushing comments to a WebSocket failed", exc_info=True)
 
 # User profile
 @api_router.get("/profile")
 async def get_profile(user: User = Depends(get_current_user)):
     return user
 
+# Cache diagnostics
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "shared_catalog": shared_catalog.stats(),
+        "cache_bus": cache_bus.stats() if cache_bus is not None else None,
+        "rendered_catalog": rendered_catalog.stats(),
+        "compressed_store": compressed_store.stats(),
+        "comment_counts": comment_counts.stats(),
+        "search_index": search_index.stats(),
+        "watch_buffer": watch_buffer.stats(),
+        "comment_hub": comment_hub.stats(),
+        "google_auth": google_verifier.stats(),
+        "checkout_status": checkout_status_poller.stats(),
+        "webhook_queue": webhook_queue.stats(),
+        "tmdb": tmdb_client.stats(),
+        "recommender": recommender.stats(),
+        "discover": discover_index.stats(),
+    }
+
 # Include the router
 app.include_router(api_router)
 
+# Innermost, so the router's scope["route"] is visible; 304s produced by
+# HTTPCacheMiddleware are therefore recorded with the handler's 200.
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, histogram=request_seconds, exclude=("/metrics",))
+
+# Stream URLs are a pure function of the path; catalog and comments may be
+# shared by browsers and CDNs for a short while; user data only revalidates.
+CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE', '60'))
+COMMENTS_MAX_AGE = int(os.environ.get('COMMENTS_MAX_AGE', '10'))
+HTTP_CACHE_POLICIES = [
+    CachePolicy(r"^/api/stream/", "public, max-age=31536000, immutable"),
+    CachePolicy(r"^/api/(movies|tv)/popular$", f"public, max-age={CATALOG_MAX_AGE}, stale-while-revalidate={CATALOG_MAX_AGE * 5}"),
+    CachePolicy(r"^/api/search$", f"public, max-age={CATALOG_MAX_AGE}"),
+    CachePolicy(r"^/api/discover$", f"public, max-age={CATALOG_MAX_AGE}"),
+    CachePolicy(r"^/api/comments/[^/]+/[^/]+(/count)?$", f"public, max-age={COMMENTS_MAX_AGE}"),
+    CachePolicy(r"^/api/(watchhistory|favorites|profile|recommendations|home)$", "private, no-cache", vary="Authorization"),
+]
+app.add_middleware(HTTPCacheMiddleware, policies=HTTP_CACHE_POLICIES)
+
+# Outside the cache layer, so stored variants are keyed by its ETags
+compressed_store = CompressedStore(
+    max_bytes=int(os.environ.get('COMPRESSION_STORE_MAX_BYTES', str(64 << 20))),
+    gzip_level=int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6')),
+    brotli_quality=int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5')),
+)
+app.add_middleware(
+    CompressionMiddleware,
+    store=compressed_store,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024')),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -566,13 +1300,120 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cache counters and loop lag are read at scrape time
+metrics_registry.register(CacheCollector({
+    "token_cache": token_cache.stats,
+    "user_cache": user_cache.stats,
+    "catalog_cache": catalog_cache.stats,
+    "shared_catalog": shared_catalog.stats,
+    "rendered_catalog": rendered_catalog.stats,
+    "compressed_store": compressed_store.stats,
+    "comment_counts": comment_counts.stats,
+    "checkout_status": checkout_status_poller.stats,
+}))
+metrics_registry.register(RateGovernorCollector(
+    lambda: tmdb_client.governor.stats() if tmdb_client.governor is not None else None,
+))
+metrics_registry.register(GaugeCollector(
+    "popflix_event_loop_lag_last_seconds", "Most recent event loop lag sample.", lambda: loop_lag_monitor.last_lag,
+))
+metrics_registry.register(GaugeCollector(
+    "popflix_startup_seconds", "Seconds from app setup to ready, including warm-up.", lambda: readiness.startup_seconds or 0.0,
+))
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# httpx logs every request URL at INFO, which would leak the TMDB api_key.
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    # Liveness only: answering at all means the process and its loop are up
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    ready, report = await readiness.check()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+PRELOAD_PAYMENTS = os.environ.get('PRELOAD_PAYMENTS', 'true').lower() in ('1', 'true', 'yes')
+
+async def preload_payments():
+    try:
+        await asyncio.to_thread(import_stripe_checkout)
+    except ImportError as e:
+        logger.warning("Stripe checkout unavailable: %r", e)
+
+async def warm_up() -> Dict[str, str]:
+    return await run_warmups({
+        "mongo_pool": lambda: warm_mongo_pool(db, MONGO_WARM_CONNECTIONS),
+        "tmdb": lambda: tmdb_client.warm(TMDB_WARM_CONNECTIONS),
+        "google_jwks": google_verifier.warm,
+        "catalog": load_stored_catalog,
+    }, WARMUP_TIMEOUT)
+
+async def provision_indexes():
+    """Create indexes, retrying until MongoDB is reachable."""
+    while True:
+        try:
+            await ensure_indexes(db)
+        except PyMongoError as e:
+            logger.warning("Could not create indexes, retrying in %gs: %r", INDEX_RETRY_DELAY, e)
+            await asyncio.sleep(INDEX_RETRY_DELAY)
+        else:
+            indexes_created.set()
+            return
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await tmdb_client.start()
+    google_verifier.start()
+    # Indexes are created while the pools are opened. If MongoDB is down the
+    # worker still starts, and /readyz answers 503 until they exist.
+    indexes = asyncio.create_task(provision_indexes())
+    _, warmups = await asyncio.gather(asyncio.wait({indexes}, timeout=WARMUP_TIMEOUT), warm_up())
+    if cache_bus is not None:
+        cache_bus.start()
+    if CATALOG_WARMER_ENABLED:
+        catalog_warmer.start()
+    premium_sweeper.start()
+    watch_buffer.start()
+    if COMMENT_PUSH_BACKEND == "changestream":
+        comment_bridge.start()
+    webhook_queue.start()
+    if METRICS_ENABLED:
+        loop_lag_monitor.start()
+    preload = asyncio.create_task(preload_payments()) if PRELOAD_PAYMENTS else None
+    readiness.mark_ready(warmups)
+    logger.info("Ready in %.0fms (warm-ups: %s)", readiness.startup_seconds * 1000, warmups)
+    try:
+        yield
+    finally:
+        readiness.mark_draining()
+        indexes.cancel()
+        if preload is not None:
+            preload.cancel()
+        # In order, and each step runs even if the ones before it failed
+        await run_shutdown({
+            "loop_lag_monitor": loop_lag_monitor.stop,
+            "webhook_queue": webhook_queue.stop,
+            "comment_bridge": comment_bridge.stop,
+            "watch_buffer": watch_buffer.stop,
+            "premium_sweeper": premium_sweeper.stop,
+            "catalog_warmer": catalog_warmer.stop,
+            **({"cache_bus": cache_bus.stop} if cache_bus is not None else {}),
+            "tmdb_client": tmdb_client.close,
+            "google_verifier": google_verifier.close,
+            "mongo": client.close,
+        }, SHUTDOWN_STEP_TIMEOUT)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+# Set here rather than in FastAPI(...) because it starts components defined above
+app.router.lifespan_context = lifespan
@@ -0,0 +1,529 @@
+"""Two-level cache shared across uvicorn workers and pods.
+
+``TwoLevelCache`` keeps an in-process L1 (a ``TTLCache``) in front of a
+shared L2 that every worker reads: a TTL-indexed MongoDB collection
+(``MongoL2``) or any Redis-compatible server (``RedisL2``). A miss on both
+levels is loaded once per worker and written through to L2, so only the
+first worker to miss pays for the upstream call or database read.
+
+Keys are versioned as ``namespace:schema:generation:key``. ``schema`` is set
+in code and bumped when the shape of a cached value changes, so a deploy
+never reads what the previous one wrote. ``generation`` is a counter kept in
+L2; ``clear()`` increments it, which drops a whole namespace on every worker
+without scanning L2, and the orphaned entries simply expire.
+
+``invalidate`` leaves a tombstone in L2 that bumps a per-key version, and a
+loaded value is written back only if the version is still the one its L2
+miss saw. A load that read the old value before an invalidation on any
+worker therefore cannot put it back into L2 afterwards.
+
+``invalidate`` and ``clear`` are also published on an invalidation bus (a
+capped MongoDB collection tailed by every worker, or Redis pub/sub) so other
+workers drop their L1 copies at once instead of when their L1 TTL runs out.
+L2 and bus failures are logged and counted but never fail a request: the
+cache degrades to L1 plus the loader.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from pymongo import CursorType, ReturnDocument
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+
+from cache import TTLCache, start_load
+from fast_json import dumps
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - redis is only needed for SHARED_CACHE_BACKEND=redis
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+# Generation counters must outlive any entry written under them
+COUNTER_TTL = 365 * 24 * 3600.0
+
+
+def flatten_key(key: Hashable) -> str:
+    if isinstance(key, tuple):
+        return ":".join(str(part) for part in key)
+    return str(key)
+
+
+class MongoL2:
+    """L2 entries as ``{_id, value, version, expires_at}`` documents; a
+    tombstone left by ``invalidate`` has no ``value``.
+
+    The collection needs a TTL index on ``expires_at`` with
+    ``expireAfterSeconds=0`` (see ``db_indexes``). The TTL monitor only runs
+    once a minute, so reads filter on ``expires_at`` as well.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, key: str) -> Any:
+        doc = await self.collection.find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.utcnow()}}, {"_id": 0, "value": 1}
+        )
+        return None if doc is None else doc.get("value")
+
+    async def get_versioned(self, key: str) -> Tuple[Any, int]:
+        doc = await self.collection.find_one({"_id": key}, {"_id": 0, "value": 1, "version": 1, "expires_at": 1})
+        if doc is None:
+            return None, 0
+        value = doc.get("value") if doc["expires_at"] > datetime.utcnow() else None
+        return value, doc.get("version", 0)
+
+    async def set_if_version(self, key: str, value: Any, ttl: float, version: int) -> bool:
+        """Write ``value`` unless ``key`` was invalidated since ``version`` was read."""
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        try:
+            result = await self.collection.update_one(
+                {"_id": key, "version": version or {"$in": [0, None]}},
+                {"$set": {"value": value, "version": version, "expires_at": expires_at}},
+                upsert=not version,
+            )
+        except DuplicateKeyError:
+            # A tombstone appeared after the miss, so the upsert collided with it
+            return False
+        return result.matched_count > 0 or result.upserted_id is not None
+
+    async def set(self, key: str, value: Any, ttl: float):
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        await self.collection.replace_one({"_id": key}, {"value": value, "expires_at": expires_at}, upsert=True)
+
+    async def invalidate(self, key: str, ttl: float):
+        await self.collection.update_one(
+            {"_id": key},
+            {
+                "$inc": {"version": 1},
+                "$unset": {"value": ""},
+                "$set": {"expires_at": datetime.utcnow() + timedelta(seconds=ttl)},
+            },
+            upsert=True,
+        )
+
+    async def incr(self, key: str) -> int:
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"value": 1}, "$set": {"expires_at": datetime.utcnow() + timedelta(seconds=COUNTER_TTL)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["value"]
+
+
+class RedisL2:
+    """L2 on any server speaking the Redis protocol; values are stored as JSON
+    and each key's version in ``<key>:version``.
+    """
+
+    # KEYS: entry, version; ARGV: expected version, value, ttl in ms
+    SET_IF_VERSION = """
+    if tonumber(redis.call('get', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+        return 0
+    end
+    redis.call('set', KEYS[1], ARGV[2], 'PX', ARGV[3])
+    return 1
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisL2":
+        if redis_asyncio is None:
+            raise RuntimeError("SHARED_CACHE_BACKEND=redis needs the redis package")
+        return cls(redis_asyncio.from_url(url))
+
+    async def get(self, key: str) -> Any:
+        raw = await self.client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    async def get_versioned(self, key: str) -> Tuple[Any, int]:
+        raw, version = await self.client.mget(key, f"{key}:version")
+        return None if raw is None else json.loads(raw), int(version or 0)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self.client.set(key, dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def set_if_version(self, key: str, value: Any, ttl: float, version: int) -> bool:
+        written = await self.client.eval(
+            self.SET_IF_VERSION, 2, key, f"{key}:version", version, dumps(value), max(1, int(ttl * 1000))
+        )
+        return bool(written)
+
+    async def invalidate(self, key: str, ttl: float):
+        version_key = f"{key}:version"
+        async with self.client.pipeline(transaction=True) as pipe:
+            await pipe.delete(key).incr(version_key).pexpire(version_key, max(1, int(ttl * 1000))).execute()
+
+    async def incr(self, key: str) -> int:
+        value = await self.client.incr(key)
+        await self.client.expire(key, int(COUNTER_TTL))
+        return value
+
+
+class InvalidationBus(ABC):
+    """Fans invalidation messages out to the caches of every worker.
+
+    Subclasses implement ``_send`` and ``_listen``; messages from this
+    worker are skipped on receipt because they were applied before sending.
+    """
+
+    def __init__(self, retry_delay: float = 5.0):
+        self.retry_delay = retry_delay
+        self.origin = uuid.uuid4().hex
+        self._caches: Dict[str, "TwoLevelCache"] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    def register(self, cache: "TwoLevelCache"):
+        self._caches[cache.namespace] = cache
+
+    async def publish(self, message: Dict[str, Any]):
+        try:
+            await self._send({**message, "origin": self.origin})
+            self.published += 1
+        except Exception:
+            self.errors += 1
+            logger.warning("Could not publish cache invalidation %r", message, exc_info=True)
+
+    def deliver(self, message: Dict[str, Any]):
+        if message.get("origin") == self.origin:
+            return
+        cache = self._caches.get(message.get("namespace"))
+        if cache is not None:
+            self.received += 1
+            cache.apply(message)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.warning("Cache invalidation listener failed; retrying in %gs", self.retry_delay, exc_info=True)
+            await asyncio.sleep(self.retry_delay)
+
+    @abstractmethod
+    async def _send(self, message: Dict[str, Any]):
+        """Publish one message to every worker."""
+
+    @abstractmethod
+    async def _listen(self):
+        """Deliver incoming messages until the connection ends."""
+
+    def stats(self) -> Dict[str, int]:
+        return {"published": self.published, "received": self.received, "errors": self.errors}
+
+
+class MongoInvalidationBus(InvalidationBus):
+    """Tails a capped collection; unlike change streams this needs no replica set."""
+
+    def __init__(self, db, name: str = "cache_invalidations", size_bytes: int = 1 << 20, retry_delay: float = 5.0):
+        super().__init__(retry_delay)
+        self.db = db
+        self.name = name
+        self.size_bytes = size_bytes
+        self._last_id = None
+        self._positioned = False
+
+    async def _send(self, message: Dict[str, Any]):
+        await self.db[self.name].insert_one(message)
+
+    async def _listen(self):
+        try:
+            await self.db.create_collection(self.name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        collection = self.db[self.name]
+        if not self._positioned:
+            # Only messages sent after this worker started matter
+            last = await collection.find_one({}, {"_id": 1}, sort=[("$natural", -1)])
+            self._last_id = last["_id"] if last else None
+            self._positioned = True
+        # ObjectIds from different processes do not sort in insertion order,
+        # so the cursor reads the whole collection in $natural (insertion)
+        # order and skips up to the last message seen. If that one has already
+        # been overwritten, everything is replayed; replays are harmless.
+        skipping = (
+            self._last_id is not None
+            and await collection.find_one({"_id": self._last_id}, {"_id": 1}) is not None
+        )
+        cursor = collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+        async for message in cursor:
+            message_id = message.pop("_id")
+            if skipping:
+                skipping = message_id != self._last_id
+                continue
+            self._last_id = message_id
+            self.deliver(message)
+        # The cursor dies when the collection is empty or it falls behind the
+        # capped window; _run_forever reopens it after retry_delay.
+
+
+class RedisInvalidationBus(InvalidationBus):
+    def __init__(self, client, channel: str = "popflix:cache-invalidations", retry_delay: float = 5.0):
+        super().__init__(retry_delay)
+        self.client = client
+        self.channel = channel
+
+    async def _send(self, message: Dict[str, Any]):
+        await self.client.publish(self.channel, dumps(message))
+
+    async def _listen(self):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for item in pubsub.listen():
+                if item.get("type") == "message":
+                    self.deliver(json.loads(item["data"]))
+        finally:
+            await pubsub.close()
+
+
+class TwoLevelCache:
+    _MISSING = object()
+
+    def __init__(
+        self,
+        namespace: str,
+        l2=None,
+        bus: Optional[InvalidationBus] = None,
+        ttl: float = 300.0,
+        l1_ttl: Optional[float] = None,
+        max_entries: int = 10000,
+        schema: int = 1,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+        on_invalidate: Optional[Callable[[Optional[str]], None]] = None,
+        generation_check_interval: float = 30.0,
+    ):
+        self.namespace = namespace
+        self.l2 = l2
+        self.bus = bus
+        self.ttl = ttl
+        self.schema = schema
+        self.encode = encode
+        self.decode = decode
+        self.on_invalidate = on_invalidate
+        self.generation_check_interval = generation_check_interval
+        # l1_ttl=0 disables L1, for callers that keep their own in-process copy
+        self.l1 = TTLCache(ttl=ttl if l1_ttl is None else l1_ttl, max_entries=max_entries)
+        self._generation = 0
+        self._generation_checked_at: Optional[float] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Keys invalidated while being loaded; their loads are not written back
+        self._stale: Set[str] = set()
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+        self.loads = 0
+        self.skipped_writes = 0
+        if bus is not None:
+            bus.register(self)
+
+    def _l2_error(self, action: str, key: str):
+        self.l2_errors += 1
+        logger.warning("Shared cache %s %s failed for %s", self.namespace, action, key, exc_info=True)
+
+    async def _physical_key(self, key: str) -> str:
+        now = asyncio.get_running_loop().time()
+        checked = self._generation_checked_at
+        if self.l2 is not None and (checked is None or now - checked >= self.generation_check_interval):
+            # Backstop for missed bus messages: another worker's clear() is
+            # picked up within generation_check_interval.
+            self._generation_checked_at = now
+            try:
+                stored = await self.l2.get(self._generation_key())
+            except Exception:
+                self._l2_error("generation read", key)
+            else:
+                self._set_generation(stored or 0)
+        return f"{self.namespace}:{self.schema}:{self._generation}:{key}"
+
+    def _generation_key(self) -> str:
+        return f"{self.namespace}:{self.schema}:generation"
+
+    def _set_generation(self, generation: int):
+        if generation != self._generation:
+            self._generation = generation
+            self._drop_local()
+
+    def _drop_local(self):
+        self._stale.update(self._inflight)
+        self.l1.clear()
+        if self.on_invalidate:
+            self.on_invalidate(None)
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        flat = flatten_key(key)
+        value = self.l1.get(flat, self._MISSING)
+        if value is not self._MISSING:
+            return value
+        if self.l2 is None:
+            return default
+        physical = await self._physical_key(flat)
+        try:
+            stored = await self.l2.get(physical)
+        except Exception:
+            self._l2_error("read", physical)
+            return default
+        if stored is None:
+            self.l2_misses += 1
+            return default
+        self.l2_hits += 1
+        value = self.decode(stored)
+        self.l1.set(flat, value)
+        return value
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        flat = flatten_key(key)
+        ttl = self.ttl if ttl is None else ttl
+        self.l1.set(flat, value, ttl=min(ttl, self.l1.ttl))
+        if self.l2 is None:
+            return
+        physical = await self._physical_key(flat)
+        try:
+            await self.l2.set(physical, self.encode(value), ttl)
+        except Exception:
+            self._l2_error("write", physical)
+
+    async def get_or_load(self, key: Hashable, loader: Loader, ttl: Optional[float] = None) -> Any:
+        """Return the value from L1 or L2, else load it once per worker and
+        write it through unless ``key`` was invalidated in the meantime.
+        """
+        flat = flatten_key(key)
+        value = self.l1.get(flat, self._MISSING)
+        if value is not self._MISSING:
+            return value
+        task = self._inflight.get(flat)
+        if task is None:
+            task = self._inflight[flat] = start_load(self._load(flat, loader, ttl))
+        # Cancelling one caller must not cancel the load the others await
+        return await asyncio.shield(task)
+
+    async def _load(self, flat: str, loader: Loader, ttl: Optional[float]) -> Any:
+        try:
+            return await self._read_or_load(flat, loader, ttl)
+        finally:
+            self._inflight.pop(flat, None)
+            self._stale.discard(flat)
+
+    async def _read_or_load(self, flat: str, loader: Loader, ttl: Optional[float]) -> Any:
+        physical = version = None
+        if self.l2 is not None:
+            physical = await self._physical_key(flat)
+            try:
+                stored, version = await self.l2.get_versioned(physical)
+            except Exception:
+                self._l2_error("read", physical)
+            else:
+                if stored is not None:
+                    self.l2_hits += 1
+                    value = self.decode(stored)
+                    if flat not in self._stale:
+                        self.l1.set(flat, value)
+                    return value
+                self.l2_misses += 1
+
+        value = await loader()
+        self.loads += 1
+        ttl = self.ttl if ttl is None else ttl
+        if flat in self._stale:
+            self.skipped_writes += 1
+            return value
+        if version is not None:
+            try:
+                written = await self.l2.set_if_version(physical, self.encode(value), ttl, version)
+            except Exception:
+                self._l2_error("write", physical)
+            else:
+                if not written:
+                    # Invalidated by some worker since the miss; what we
+                    # loaded may predate the change
+                    self.skipped_writes += 1
+                    return value
+        if flat in self._stale:
+            # Invalidated during the L2 write; L2 has the tombstone, keep L1 clear too
+            self.skipped_writes += 1
+            return value
+        self.l1.set(flat, value, ttl=min(ttl, self.l1.ttl))
+        return value
+
+    async def invalidate(self, key: Hashable):
+        """Drop ``key`` here, in L2 and in every other worker's L1."""
+        flat = flatten_key(key)
+        self.l1.invalidate(flat)
+        if flat in self._inflight:
+            self._stale.add(flat)
+        if self.l2 is not None:
+            physical = await self._physical_key(flat)
+            try:
+                await self.l2.invalidate(physical, self.ttl)
+            except Exception:
+                self._l2_error("invalidate", physical)
+        if self.bus is not None:
+            await self.bus.publish({"namespace": self.namespace, "op": "invalidate", "key": flat})
+
+    async def clear(self):
+        """Drop the whole namespace everywhere by moving to a new generation."""
+        generation = self._generation + 1
+        if self.l2 is not None:
+            try:
+                generation = await self.l2.incr(self._generation_key())
+            except Exception:
+                self._l2_error("generation bump", self._generation_key())
+        self._generation = generation
+        self._drop_local()
+        if self.bus is not None:
+            await self.bus.publish({"namespace": self.namespace, "op": "clear", "generation": generation})
+
+    def apply(self, message: Dict[str, Any]):
+        """Apply an invalidation published by another worker."""
+        if message.get("op") == "clear":
+            generation = message.get("generation", 0)
+            if generation > self._generation:
+                self._set_generation(generation)
+        elif message.get("op") == "invalidate":
+            self.l1.invalidate(message["key"])
+            if message["key"] in self._inflight:
+                self._stale.add(message["key"])
+            if self.on_invalidate:
+                self.on_invalidate(message["key"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.l1.stats(),
+            "l2_hits": self.l2_hits,
+            "l2_misses": self.l2_misses,
+            "l2_errors": self.l2_errors,
+            "loads": self.loads,
+            "skipped_writes": self.skipped_writes,
+            "generation": self._generation,
+        }
@@ -0,0 +1,235 @@
+"""Shared async client for the TMDB API.
+
+One ``TMDBClient`` is created when the app starts and reused by every
+catalog endpoint, so TMDB round trips never block the event loop and reuse
+pooled keep-alive connections instead of paying a TLS handshake per call.
+
+Outbound calls go through a ``RateGovernor`` so bursts queue locally (search
+ahead of page loads ahead of background prefetch) instead of tripping TMDB's
+per-IP limit, identical requests already in flight share one round trip,
+and a 429 pauses all traffic for its ``Retry-After`` before retrying. When
+the local queue is full, the lowest-priority calls fail fast with a 429
+``TMDBError`` rather than waiting without bound.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import httpx
+
+from rate_governor import GovernorQueueFull, Priority, RateGovernor
+
+logger = logging.getLogger(__name__)
+
+TMDB_BASE_URL = "https://api.themoviedb.org/3"
+
+
+class TMDBError(Exception):
+    """Raised when TMDB cannot be reached or answers with an error status."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def retry_after_seconds(value: Optional[str], default: float = 1.0) -> float:
+    """Parse a ``Retry-After`` header given in seconds or as an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+
+class TMDBClient:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = TMDB_BASE_URL,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        max_concurrency: int = 20,
+        http2: bool = False,
+        rate_limit: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_retries: int = 2,
+        max_retry_after: float = 10.0,
+        dedupe: bool = True,
+        on_request: Optional[Callable[[str, str, float], None]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        if http2 and not _http2_available():
+            logger.warning("TMDB_HTTP2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self._transport = transport
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.governor = RateGovernor(rate_limit, burst, max_queue) if rate_limit else None
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.dedupe = dedupe
+        self.on_request = on_request
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.requests = 0
+        self.deduplicated = 0
+        self.rate_limited = 0
+
+    @classmethod
+    def from_env(cls, api_key: str, **kwargs: Any) -> "TMDBClient":
+        return cls(
+            api_key=api_key,
+            base_url=os.environ.get("TMDB_BASE_URL", TMDB_BASE_URL),
+            connect_timeout=float(os.environ.get("TMDB_CONNECT_TIMEOUT", "3.0")),
+            read_timeout=float(os.environ.get("TMDB_READ_TIMEOUT", "10.0")),
+            max_connections=int(os.environ.get("TMDB_MAX_CONNECTIONS", "50")),
+            max_keepalive_connections=int(os.environ.get("TMDB_MAX_KEEPALIVE", "20")),
+            max_concurrency=int(os.environ.get("TMDB_MAX_CONCURRENCY", "20")),
+            http2=os.environ.get("TMDB_HTTP2", "false").lower() in ("1", "true", "yes"),
+            # TMDB allows roughly 50 requests/second per IP; rate + burst stays
+            # within that even for a full bucket
+            rate_limit=float(os.environ.get("TMDB_RATE_LIMIT", "40")),
+            burst=int(os.environ.get("TMDB_RATE_BURST", "10")),
+            # About five seconds of traffic at the sustained rate
+            max_queue=int(os.environ.get("TMDB_MAX_QUEUE", "200")),
+            max_retries=int(os.environ.get("TMDB_MAX_RETRIES", "2")),
+            max_retry_after=float(os.environ.get("TMDB_MAX_RETRY_AFTER", "10")),
+            **kwargs,
+        )
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self._transport,
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def warm(self, connections: int = 2):
+        """Open ``connections`` keep-alive connections before the first request.
+
+        Each is a ``/configuration`` call, the cheapest TMDB endpoint; they run
+        concurrently so each one opens its own connection.
+        """
+        await self.start()
+        query = {"api_key": self.api_key}
+        await asyncio.gather(*(
+            self._fetch("/configuration", query, Priority.PREFETCH, None) for _ in range(max(1, connections))
+        ))
+
+    async def get(self, path: str, priority: Priority = Priority.PAGE, **params: Any) -> Dict[str, Any]:
+        """GET ``path`` (e.g. ``/movie/popular``) and return the decoded JSON body.
+
+        Concurrent calls for the same path and params share one request and
+        receive the same dict, so callers must not mutate it.
+        """
+        if self._client is None:
+            await self.start()
+
+        query = {"api_key": self.api_key, "language": "en-US"}
+        query.update({k: v for k, v in params.items() if v is not None})
+        if not self.dedupe:
+            return await self._fetch(path, query, priority, None)
+
+        key = (path, tuple(sorted((k, str(v)) for k, v in query.items())))
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+            if self.governor is not None:
+                # A search must not wait behind the prefetch it piggybacks on
+                self.governor.promote(key, priority)
+        else:
+            task = asyncio.ensure_future(self._fetch(path, query, priority, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # One caller giving up must not cancel the request for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved even if every caller was cancelled
+
+    async def _fetch(self, path: str, query: Dict[str, Any], priority: Priority, key: Optional[Hashable]) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            if self.governor is not None:
+                try:
+                    await self.governor.acquire(priority, key)
+                except GovernorQueueFull as e:
+                    raise TMDBError(f"TMDB request to {path} shed: {e}", status_code=429) from e
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    self.requests += 1
+                    response = await self._client.get(path, params=query)
+                except httpx.HTTPError as e:
+                    self._observe(path, "error", started)
+                    raise TMDBError(f"TMDB request to {path} failed: {e!r}") from e
+                self._observe(path, str(response.status_code), started)
+
+            if response.status_code == 429:
+                self.rate_limited += 1
+                delay = retry_after_seconds(response.headers.get("retry-after"))
+                if self.governor is not None:
+                    self.governor.throttle(delay)
+                if attempt < self.max_retries and delay <= self.max_retry_after:
+                    attempt += 1
+                    logger.warning("TMDB rate limited %s, retrying in %.1fs", path, delay)
+                    if self.governor is None:
+                        await asyncio.sleep(delay)
+                    continue
+            if response.status_code != 200:
+                raise TMDBError(
+                    f"TMDB returned {response.status_code} for {path}",
+                    status_code=response.status_code,
+                )
+            return response.json()
+
+    def _observe(self, path: str, outcome: str, started: float):
+        if self.on_request is not None:
+            self.on_request(path, outcome, time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "deduplicated": self.deduplicated,
+            "rate_limited": self.rate_limited,
+            "in_flight": len(self._inflight),
+            "governor": self.governor.stats() if self.governor is not None else None,
+        }
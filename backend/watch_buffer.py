@@ -0,0 +1,171 @@
+"""Write-behind buffer for watch-history progress heartbeats.
+
+The player posts progress continually, and only the latest value per
+``(user_id, content_type, tmdb_id)`` matters. ``WatchHistoryBuffer`` keeps
+that latest value in memory and writes everything pending as one unordered
+``bulk_write`` of ``$set`` upserts once the oldest entry reaches
+``max_staleness`` seconds, when the buffer fills up, and on shutdown.
+Entries stay visible to ``pending_for_user`` until their write succeeds, so
+reads merged with the buffer see a heartbeat while its flush is in flight.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+WatchKey = Tuple[str, str, int]
+
+
+def watch_key(doc: Dict[str, Any]) -> WatchKey:
+    return doc["user_id"], doc["content_type"], doc["tmdb_id"]
+
+
+class WatchHistoryBuffer:
+    def __init__(
+        self,
+        collection,
+        flush_interval: float = 1.0,
+        max_staleness: float = 5.0,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.max_staleness = max_staleness
+        self.max_entries = max_entries
+        self.clock = clock
+        self._pending: Dict[WatchKey, Dict[str, Any]] = {}
+        self._since: Dict[WatchKey, float] = {}
+        self._by_user: Dict[str, Set[WatchKey]] = {}
+        # The batch being written by the current flush
+        self._inflight: Dict[WatchKey, Dict[str, Any]] = {}
+        self._inflight_by_user: Dict[str, Set[WatchKey]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.updates = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, doc: Dict[str, Any]) -> bool:
+        """Buffer ``doc`` (a full WatchHistory dict).
+
+        Returns False when the buffer is at twice ``max_entries`` (e.g. Mongo
+        is down and flushes keep failing); the caller should then write
+        directly so memory stays bounded.
+        """
+        key = watch_key(doc)
+        previous = self._pending.get(key)
+        if previous is None:
+            if len(self._pending) >= 2 * self.max_entries:
+                self.rejected += 1
+                return False
+            self._since[key] = self.clock()
+            self._by_user.setdefault(key[0], set()).add(key)
+            previous = self._inflight.get(key)
+        else:
+            self.coalesced += 1
+        if previous is not None:
+            # Keep the id of the first buffered heartbeat; it is only used on insert
+            doc = {**doc, "id": previous["id"]}
+        self._pending[key] = doc
+        self.updates += 1
+        if len(self._pending) >= self.max_entries:
+            self._wakeup.set()
+        return True
+
+    def pending_for_user(self, user_id: str) -> List[Dict[str, Any]]:
+        """Buffered entries of ``user_id``, including those being flushed."""
+        keys = self._by_user.get(user_id, set())
+        docs = [self._pending[key] for key in keys]
+        docs.extend(self._inflight[key] for key in self._inflight_by_user.get(user_id, ()) if key not in keys)
+        return docs
+
+    def oldest_age(self) -> float:
+        if not self._since:
+            return 0.0
+        return self.clock() - min(self._since.values())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if len(self._pending) >= self.max_entries or self.oldest_age() >= self.max_staleness:
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("Watch history flush failed; will retry")
+
+    async def flush(self) -> int:
+        """Write every pending entry; returns how many were written."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, since = self._pending, self._since
+            self._inflight, self._inflight_by_user = batch, self._by_user
+            self._pending, self._since, self._by_user = {}, {}, {}
+
+            operations = []
+            for key, doc in batch.items():
+                fields = {k: v for k, v in doc.items() if k != "id"}
+                operations.append(UpdateOne(
+                    {"user_id": key[0], "content_type": key[1], "tmdb_id": key[2]},
+                    {"$set": fields, "$setOnInsert": {"id": doc["id"]}},
+                    upsert=True,
+                ))
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except Exception:
+                self._requeue(batch, since)
+                raise
+            finally:
+                self._inflight, self._inflight_by_user = {}, {}
+
+            self.flushes += 1
+            self.flushed += len(operations)
+            return len(operations)
+
+    def _requeue(self, batch: Dict[WatchKey, Dict[str, Any]], since: Dict[WatchKey, float]):
+        # Upserts are idempotent, so replaying the whole batch is safe; newer
+        # heartbeats that arrived during the failed flush win.
+        for key, doc in batch.items():
+            if key not in self._pending:
+                self._pending[key] = doc
+                self._since[key] = since[key]
+                self._by_user.setdefault(key[0], set()).add(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "updates": self.updates,
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,177 @@
+"""Durable queue for Stripe webhook events.
+
+``stripe_webhook`` verifies an event, stores it with ``_id`` set to Stripe's
+event id and acknowledges immediately; a redelivered event hits the unique
+``_id`` and is dropped. A pool of workers claims due events with a lease, so
+an event held by a worker that died is picked up again once the lease runs
+out. Failures are retried with exponential backoff, and events that keep
+failing are copied to a dead-letter collection for inspection.
+
+The handler may therefore see an event more than once and must be
+idempotent.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+DEAD = "dead"
+
+
+class WebhookQueue:
+    def __init__(
+        self,
+        events,
+        dead_letters,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        workers: int = 4,
+        max_attempts: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        lease: float = 60.0,
+        poll_interval: float = 1.0,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self.events = events
+        self.dead_letters = dead_letters
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.retried = 0
+        self.dead = 0
+
+    async def enqueue(self, event_id: str, event_type: str, payload: Dict[str, Any]) -> bool:
+        """Persist an event; returns False if ``event_id`` was already queued."""
+        now = self.clock()
+        try:
+            await self.events.insert_one({
+                "_id": event_id,
+                "type": event_type,
+                "payload": payload,
+                "status": PENDING,
+                "attempts": 0,
+                "available_at": now,
+                "created_at": now,
+            })
+        except DuplicateKeyError:
+            self.duplicates += 1
+            return False
+        self.enqueued += 1
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run_worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        # A worker cancelled mid-event leaves it leased; it is retried once
+        # the lease expires.
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run_worker(self):
+        while True:
+            try:
+                event = await self.claim()
+            except Exception:
+                logger.exception("Could not claim a webhook event; retrying in %.0fs", self.poll_interval)
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if event is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.process(event)
+            except Exception:
+                logger.exception("Could not record the outcome of webhook event %s", event["_id"])
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Lease the oldest due event, or return None if nothing is due."""
+        now = self.clock()
+        return await self.events.find_one_and_update(
+            {"status": {"$in": [PENDING, PROCESSING]}, "available_at": {"$lte": now}},
+            {
+                "$set": {"status": PROCESSING, "available_at": now + timedelta(seconds=self.lease)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def process(self, event: Dict[str, Any]):
+        try:
+            await self.handler(event)
+        except Exception as e:
+            await self._fail(event, e)
+            return
+        await self.events.update_one(
+            {"_id": event["_id"]},
+            {"$set": {"status": DONE, "processed_at": self.clock()}, "$unset": {"last_error": ""}},
+        )
+        self.processed += 1
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _fail(self, event: Dict[str, Any], error: Exception):
+        now = self.clock()
+        message = f"{type(error).__name__}: {error}"
+        if event["attempts"] >= self.max_attempts:
+            logger.error("Webhook event %s failed %d times; dead-lettering: %s", event["_id"], event["attempts"], message)
+            await self.dead_letters.replace_one(
+                {"_id": event["_id"]},
+                {**event, "status": DEAD, "last_error": message, "dead_at": now},
+                upsert=True,
+            )
+            # Keep the queue entry so redeliveries are still deduplicated
+            await self.events.update_one(
+                {"_id": event["_id"]},
+                {"$set": {"status": DEAD, "last_error": message, "processed_at": now}},
+            )
+            self.dead += 1
+            return
+
+        delay = self.backoff(event["attempts"])
+        logger.warning("Webhook event %s failed (attempt %d), retrying in %.1fs: %s",
+                       event["_id"], event["attempts"], delay, message)
+        await self.events.update_one(
+            {"_id": event["_id"]},
+            {"$set": {"status": PENDING, "available_at": now + timedelta(seconds=delay), "last_error": message}},
+        )
+        self.retried += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "retried": self.retried,
+            "dead": self.dead,
+        }
@@ -252,8 +252,8 @@ else:
 
 # Test get comments (should work without authentication)
 success, result = test_endpoint("GET", "/comments/movie/550")
-if success and isinstance(result, list):
-    test_results.add_result("Get Comments", "PASS", f"Retrieved comments successfully (count: {len(result)})")
+if success and isinstance(result, dict) and isinstance(result.get("comments"), list):
+    test_results.add_result("Get Comments", "PASS", f"Retrieved comments successfully (count: {len(result['comments'])}, total: {result.get('count')})")
 else:
     test_results.add_result("Get Comments", "FAIL", f"Failed to get comments: {result}")
 
@@ -0,0 +1,105 @@
+"""Checkout status polling: Stripe on every poll vs ``CheckoutStatusPoller``.
+
+Half of the sessions are already paid, the rest are still open. Every
+session is polled by several concurrent clients, as when the success page
+is open in a few tabs. Reports poll latency and how many requests reached
+the stand-in Stripe server. Needs a reachable MongoDB (``--mongo-url``,
+default ``$MONGO_URL`` or localhost); uses a throwaway database.
+
+    python benchmarks/bench_checkout_status.py --sessions 100 --pollers 3 --polls 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from types import SimpleNamespace
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import _common
+from payments import CheckoutStatusPoller, status_snapshot
+from stubs.stripe import start_stripe_stub
+
+
+def transaction_doc(session_id, paid):
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": f"user-{session_id}",
+        "session_id": session_id,
+        "amount": 200.0,
+        "currency": "INR",
+        "payment_status": "paid" if paid else "pending",
+        "metadata": {},
+    }
+
+
+async def poll_all(session_ids, pollers, polls, check):
+    samples = []
+
+    async def poller(session_id):
+        for _ in range(polls):
+            started = time.perf_counter()
+            await check(session_id)
+            samples.append(time.perf_counter() - started)
+            await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(poller(s) for s in session_ids for _ in range(pollers)))
+    return samples, time.perf_counter() - started
+
+
+async def run(args):
+    stub, base_url = start_stripe_stub(delay=args.stripe_delay)
+    http = httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=20), timeout=None)
+
+    async def fetch_status(session_id):
+        response = await http.get(f"/v1/checkout/sessions/{session_id}")
+        response.raise_for_status()
+        return SimpleNamespace(**response.json())
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[f"popflix_bench_{uuid.uuid4().hex[:8]}"]
+    transactions = db.payment_transactions
+    await transactions.create_index("session_id", unique=True)
+    session_ids = [f"{'paid_' if i % 2 else 'open_'}{i}" for i in range(args.sessions)]
+    await transactions.insert_many([transaction_doc(s, s.startswith("paid_")) for s in session_ids])
+
+    async def legacy_check(session_id):
+        # The previous handler: read the transaction, then always ask Stripe
+        await transactions.find_one({"session_id": session_id})
+        return status_snapshot(await fetch_status(session_id))
+
+    async def on_paid(transaction):
+        pass
+
+    poller = CheckoutStatusPoller(transactions, fetch_status, on_paid, ttl=args.ttl)
+    report = {"sessions": args.sessions, "pollers_per_session": args.pollers, "polls_per_poller": args.polls}
+    try:
+        for label, check in (("legacy", legacy_check), ("poller", poller.status)):
+            hits_before = stub.hits
+            samples, elapsed = await poll_all(session_ids, args.pollers, args.polls, check)
+            report[label] = {
+                "latency": _common.summarize(samples),
+                "polls_per_sec": round(len(samples) / elapsed, 1),
+                "stripe_requests": stub.hits - hits_before,
+            }
+        report["poller"]["stats"] = poller.stats()
+    finally:
+        await client.drop_database(db.name)
+        await http.aclose()
+        stub.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--pollers", type=int, default=3, help="concurrent clients polling each session")
+    parser.add_argument("--polls", type=int, default=5, help="polls per client")
+    parser.add_argument("--ttl", type=float, default=2.0)
+    parser.add_argument("--stripe-delay", type=float, default=0.05, help="stand-in Stripe latency (s)")
+    asyncio.run(run(parser.parse_args()))
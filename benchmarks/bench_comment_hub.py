@@ -0,0 +1,101 @@
+"""Comment push fan-out with thousands of idle subscribers on one worker.
+
+Starts ``--subscribers`` consumer tasks on a single title, each looping on
+``Subscription.get`` with the SSE keep-alive timeout the endpoint uses, then
+publishes ``--messages`` comments and reports memory per idle subscriber and
+publish-to-delivery latency (time until the last subscriber has the message).
+A fraction of subscribers never read, to show that slow clients stay bounded
+by the queue size instead of growing memory.
+
+    python benchmarks/bench_comment_hub.py --subscribers 5000 --messages 50
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+import _common
+from comment_hub import CommentHub, encode_comment
+
+TOPIC = ("movie", 550)
+
+
+class Tracker:
+    """Counts deliveries per message and notes when the last one arrived."""
+
+    def __init__(self, subscribers):
+        self.subscribers = subscribers
+        self.counts = {}
+        self.completed = {}
+        self.done = {}
+
+    def wait(self, message_id):
+        self.done[message_id] = asyncio.Event()
+        return self.done[message_id]
+
+    def received(self, message_id):
+        count = self.counts.get(message_id, 0) + 1
+        self.counts[message_id] = count
+        if count == self.subscribers:
+            self.completed[message_id] = time.perf_counter()
+            self.done[message_id].set()
+
+
+async def consumer(subscription, tracker, expected):
+    for _ in range(expected):
+        message = None
+        while message is None:
+            message = await subscription.get(timeout=15.0)
+        tracker.received(json.loads(message)["id"])
+
+
+async def run(args):
+    hub = CommentHub(queue_size=args.queue_size, max_subscribers=args.subscribers + args.slow)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracker = Tracker(args.subscribers)
+    tasks = [
+        asyncio.create_task(consumer(hub.subscribe(TOPIC), tracker, args.messages))
+        for _ in range(args.subscribers)
+    ]
+    slow = [hub.subscribe(TOPIC) for _ in range(args.slow)]
+    await asyncio.sleep(0.1)  # let every consumer park on its queue
+    idle_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    comment = {"id": "c", "user_id": "u", "user_name": "User", "content_type": "movie",
+               "tmdb_id": 550, "text": "Great movie! " * 5, "parent_id": None}
+    fanout = []
+    for i in range(args.messages):
+        done = tracker.wait(f"c{i}")
+        published = time.perf_counter()
+        hub.publish(TOPIC, encode_comment({**comment, "id": f"c{i}"}))
+        await done.wait()
+        fanout.append(tracker.completed[f"c{i}"] - published)
+
+    await asyncio.gather(*tasks)
+    report = {
+        "subscribers": args.subscribers,
+        "slow_subscribers": args.slow,
+        "messages": args.messages,
+        "idle_memory_bytes_per_subscriber": round(idle_bytes / (args.subscribers + args.slow)),
+        "fanout_latency": _common.summarize(fanout),
+        "slow_subscriber_queue_depth": max(s.queue.qsize() for s in slow) if slow else 0,
+        "slow_subscriber_dropped": sum(s.dropped for s in slow),
+    }
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--slow", type=int, default=500, help="subscribers that never read")
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--queue-size", type=int, default=32)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Comment retrieval with 100k comments on one title.
+
+Seeds a throwaway database, then compares the previous handler (load up to
+1000 comments and build a model for each) with keyset-paginated, threaded
+pages from ``fetch_comment_page``. Reports p50/p99 latency and peak Python
+memory allocated per request. Needs a reachable MongoDB.
+
+    python benchmarks/bench_comments.py --comments 100000 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import BaseModel
+
+import _common
+from comments import fetch_comment_page
+from db_indexes import INDEXES
+
+
+class Comment(BaseModel):
+    id: str
+    user_id: str
+    user_name: str
+    content_type: str
+    tmdb_id: int
+    text: str
+    parent_id: Optional[str] = None
+    root_id: Optional[str] = None
+    created_at: datetime
+
+
+async def seed(collection, count, reply_ratio, rng):
+    start = datetime(2024, 1, 1)
+    top_ids = []
+    batch = []
+    for i in range(count):
+        doc = {
+            "id": str(uuid.uuid4()),
+            "user_id": f"user-{i % 500}",
+            "user_name": f"User {i % 500}",
+            "content_type": "movie",
+            "tmdb_id": 550,
+            "text": "A comment about the movie " * 3,
+            "parent_id": None,
+            "root_id": None,
+            "created_at": start + timedelta(seconds=i),
+        }
+        if top_ids and rng.random() < reply_ratio:
+            doc["parent_id"] = doc["root_id"] = rng.choice(top_ids[-200:])
+        else:
+            top_ids.append(doc["id"])
+        batch.append(doc)
+        if len(batch) == 5000:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+
+
+async def measure(request, count):
+    latencies, peaks = [], []
+    for _ in range(count):
+        tracemalloc.start()
+        started = time.perf_counter()
+        await request()
+        latencies.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {**_common.summarize(latencies), "peak_kb_per_request": round(max(peaks) / 1024, 1)}
+
+
+async def run(args):
+    rng = random.Random(3)
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[f"popflix_bench_{uuid.uuid4().hex[:8]}"]
+    try:
+        for collection, keys, options in INDEXES:
+            if collection == "comments":
+                await db.comments.create_index(keys, **options)
+        await seed(db.comments, args.comments, args.reply_ratio, rng)
+
+        async def legacy():
+            docs = await db.comments.find({"content_type": "movie", "tmdb_id": 550}).sort("created_at", -1).to_list(1000)
+            return [Comment(**doc) for doc in docs]
+
+        cursors = [None]
+
+        async def keyset():
+            # Walk forward through the pages, wrapping around at the end
+            page = await fetch_comment_page(db.comments, "movie", 550, limit=args.page_size, cursor=cursors[-1])
+            cursors.append(page["next_cursor"])
+            return page
+
+        report = {
+            "comments": args.comments,
+            "page_size": args.page_size,
+            "legacy_to_list_1000": await measure(legacy, args.requests),
+            "keyset_threaded_page": await measure(keyset, args.requests),
+        }
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--comments", type=int, default=100_000)
+    parser.add_argument("--reply-ratio", type=float, default=0.3)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""CPU per request and bytes on the wire for compressed list responses.
+
+Drives a minimal ASGI app that serves popular-list and search payloads
+(shaped like the real handlers' output, from the TMDB stub's fixtures)
+through ``HTTPCacheMiddleware`` and compares: no compression, Starlette's
+``GZipMiddleware`` (recompresses every response) and ``CompressionMiddleware``
+with stored gzip and brotli variants. The ASGI app is called directly so the
+numbers reflect middleware and compression cost, not an HTTP client.
+
+    python benchmarks/bench_compression.py --requests 2000 --page-size 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response
+
+import _common
+from compression import CompressedStore, CompressionMiddleware, brotli
+from http_cache import CachePolicy, HTTPCacheMiddleware, strong_etag
+from stubs.tmdb import fake_movie, fake_tv
+
+MOVIE_FIELDS = ("title", "overview", "poster_path", "backdrop_path", "release_date", "vote_average", "genre_ids", "adult")
+TV_FIELDS = ("name", "overview", "poster_path", "backdrop_path", "first_air_date", "vote_average", "genre_ids")
+
+
+def as_content(item):
+    fields = MOVIE_FIELDS if item["media_type"] == "movie" else TV_FIELDS
+    return {"tmdb_id": item["id"], **{k: item.get(k) for k in fields}}
+
+
+def payloads(page_size):
+    popular = {"results": [as_content(fake_movie(i)) for i in range(1, page_size + 1)], "page": 1, "page_size": page_size}
+    search = {"results": [
+        {"type": item["media_type"], "data": as_content(item)}
+        for i in range(1, page_size // 2 + 1)
+        for item in (fake_movie(i), fake_tv(i))
+    ]}
+    return {
+        "/api/movies/popular": json.dumps(popular, separators=(",", ":")).encode(),
+        "/api/search": json.dumps(search, separators=(",", ":")).encode(),
+    }
+
+
+def make_app(bodies):
+    async def app(scope, receive, send):
+        # Like catalog_response: bytes rendered once, ETag set by the handler
+        body = bodies[scope["path"]]
+        response = Response(body, media_type="application/json", headers={"ETag": strong_etag(body)})
+        await response(scope, receive, send)
+
+    return HTTPCacheMiddleware(app, [CachePolicy(r"^/api/", "public, max-age=60")])
+
+
+async def measure(app, path, accept_encoding, requests):
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "scheme": "http", "server": ("bench", 80), "client": ("bench", 1),
+        "http_version": "1.1", "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    wire = 0
+
+    async def send(message):
+        nonlocal wire
+        if message["type"] == "http.response.body":
+            wire += len(message.get("body", b""))
+
+    cpu = []
+    for _ in range(requests):
+        started = time.process_time()
+        await app(scope, receive, send)
+        cpu.append(time.process_time() - started)
+    return {
+        "cpu_us_per_request": round(sum(cpu) / len(cpu) * 1e6, 1),
+        "bytes_on_wire": wire // requests,
+    }
+
+
+async def run(args):
+    bodies = payloads(args.page_size)
+    variants = {
+        "identity": (make_app(bodies), "identity"),
+        "gzip_per_request": (GZipMiddleware(make_app(bodies), minimum_size=1024), "gzip"),
+        "stored_gzip": (CompressionMiddleware(make_app(bodies), CompressedStore()), "gzip"),
+    }
+    if brotli is not None:
+        variants["stored_br"] = (CompressionMiddleware(make_app(bodies), CompressedStore()), "br")
+
+    report = {"requests": args.requests, "page_size": args.page_size}
+    for path, body in bodies.items():
+        report[path] = {"identity_bytes": len(body)}
+        for label, (app, encoding) in variants.items():
+            report[path][label] = await measure(app, path, encoding, args.requests)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,129 @@
+"""Discover latency, snapshot rebuild time and memory per title.
+
+Builds a synthetic catalog (TMDB-like genre ids, release dates, ratings and
+log-normal popularity, some adult titles) and loads it into
+``DiscoverIndex`` as the server does from the stored catalog, one batch per
+content type. It then times:
+
+* full snapshot rebuilds;
+* a set of filter mixes, each served with facets and rendered to the JSON
+  body ``/api/discover`` returns;
+* single-title upserts followed by the query that rebuilds for them.
+
+Memory is reported from ``DiscoverIndex.stats()``. The columns and sort
+orders are fixed-size per title; the rest is the pre-encoded items.
+
+    python benchmarks/bench_discover.py --titles 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import _common
+from discover import DiscoverIndex, render_page
+
+MOVIE_GENRES = (28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37)
+TV_GENRES = (10759, 16, 35, 80, 99, 18, 10751, 10762, 9648, 10763, 10764, 10765, 10766, 10767, 10768, 37)
+
+QUERIES = {
+    "no_filter": {},
+    "movie_genre": {"content_type": "movie", "genre_ids": [28]},
+    "two_genres_all": {"genre_ids": [28, 12]},
+    "genres_any_recent": {"genre_ids": [35, 18], "match_all_genres": False, "year_gte": 2010},
+    "decade_rated": {"year_gte": 1990, "year_lte": 1999, "vote_average_gte": 7.0, "sort_by": "vote_average.desc"},
+    "tv_newest": {"content_type": "tv", "sort_by": "release_date.desc"},
+    "deep_page": {"page": 200, "page_size": 50},
+    "narrow": {"content_type": "movie", "genre_ids": [27, 878], "year_gte": 2020, "vote_average_gte": 8.0},
+}
+
+
+def build_catalog(titles, rng):
+    popularity = rng.lognormal(mean=2.0, sigma=1.5, size=titles)
+    is_movie = rng.random(titles) < 0.7
+    years = rng.integers(1930, 2026, size=titles)
+    days = rng.integers(1, 29, size=titles)
+    months = rng.integers(1, 13, size=titles)
+    votes = np.round(rng.normal(6.4, 1.2, size=titles).clip(0, 10), 1)
+    genre_count = rng.integers(1, 4, size=titles)
+    catalog = []
+    for i in range(titles):
+        genres = MOVIE_GENRES if is_movie[i] else TV_GENRES
+        genre_ids = sorted({genres[g] for g in rng.integers(0, len(genres), size=genre_count[i])})
+        date = f"{years[i]}-{months[i]:02d}-{days[i]:02d}" if i % 50 else ""
+        data = {
+            "tmdb_id": i,
+            "overview": f"Overview for title {i}. " * 8,
+            "poster_path": f"/poster{i}.jpg",
+            "backdrop_path": f"/backdrop{i}.jpg",
+            "vote_average": float(votes[i]),
+            "genre_ids": genre_ids,
+        }
+        if is_movie[i]:
+            data.update(title=f"Movie {i}", release_date=date, adult=i % 97 == 0)
+        else:
+            data.update(name=f"Show {i}", first_air_date=date)
+        catalog.append(("movie" if is_movie[i] else "tv", {"tmdb_id": i, "data": data, "popularity": float(popularity[i])}))
+    return catalog
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    catalog = build_catalog(args.titles, rng)
+    index = DiscoverIndex(max_titles=args.max_titles, rebuild_interval=0.0)
+
+    started = time.perf_counter()
+    for content_type in ("movie", "tv"):
+        index.upsert_items(content_type, [entry for t, entry in catalog if t == content_type])
+    load_seconds = time.perf_counter() - started
+
+    rebuilds = timed(index.rebuild, args.repeat)
+
+    queries = {}
+    for name, query in QUERIES.items():
+        results = {}
+        samples = timed(lambda: results.update(body=render_page(*index.discover(**query))), args.repeat)
+        body = json.loads(results["body"])
+        queries[name] = {
+            **_common.summarize(samples),
+            "total_results": body["total_results"],
+            "body_bytes": len(results["body"]),
+        }
+
+    # A search hit or read-through page adds one title; the next query rebuilds
+    upserts = []
+    for i in rng.choice(args.titles, size=args.repeat, replace=False).tolist():
+        content_type, entry = catalog[i]
+        started = time.perf_counter()
+        index.upsert(content_type, {**entry["data"], "vote_average": 9.9}, entry["popularity"])
+        render_page(*index.discover())
+        upserts.append(time.perf_counter() - started)
+
+    report = {
+        "titles": args.titles,
+        "load_seconds": round(load_seconds, 3),
+        "rebuild": _common.summarize(rebuilds),
+        "queries": queries,
+        "upsert_then_query": _common.summarize(upserts),
+        "index": index.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=100000)
+    parser.add_argument("--max-titles", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    run(parser.parse_args())
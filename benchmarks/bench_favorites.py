@@ -0,0 +1,91 @@
+"""Favorites write throughput: find+insert vs atomic upsert vs bulk_write.
+
+Needs a reachable MongoDB (``--mongo-url``, default ``$MONGO_URL`` or
+localhost). Uses a throwaway database that is dropped afterwards.
+
+    python benchmarks/bench_favorites.py --items 2000 --batch 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import _common  # noqa: F401
+from favorites import add_favorite, bulk_update_favorites
+
+
+def favorite_doc(user_id, tmdb_id):
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "content_type": "movie",
+        "tmdb_id": tmdb_id,
+        "title": f"Movie {tmdb_id}",
+        "poster_path": None,
+        "added_at": datetime.utcnow(),
+    }
+
+
+async def legacy_add(collection, doc):
+    # The pre-upsert handler: check, then insert
+    existing = await collection.find_one(
+        {"user_id": doc["user_id"], "content_type": doc["content_type"], "tmdb_id": doc["tmdb_id"]}
+    )
+    if not existing:
+        await collection.insert_one(doc)
+
+
+async def timed(label, coro_factory, items):
+    started = time.perf_counter()
+    await coro_factory()
+    elapsed = time.perf_counter() - started
+    return label, round(items / elapsed, 1)
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[f"popflix_bench_{uuid.uuid4().hex[:8]}"]
+    collection = db.favorites
+    await collection.create_index([("user_id", 1), ("content_type", 1), ("tmdb_id", 1)], unique=True)
+    results = {}
+    try:
+        async def legacy():
+            for i in range(args.items):
+                await legacy_add(collection, favorite_doc("legacy", i))
+
+        async def upsert():
+            for i in range(args.items):
+                await add_favorite(collection, favorite_doc("upsert", i))
+
+        async def bulk():
+            for start in range(0, args.items, args.batch):
+                adds = [{"content_type": "movie", "tmdb_id": i, "title": f"Movie {i}"}
+                        for i in range(start, min(start + args.batch, args.items))]
+                await bulk_update_favorites(collection, "bulk", adds, [],
+                                            lambda item: favorite_doc("bulk", item["tmdb_id"]))
+
+        for label, factory in (("find_then_insert", legacy), ("atomic_upsert", upsert), ("bulk_write", bulk)):
+            name, ops = await timed(label, factory, args.items)
+            results[f"{name}_ops_per_sec"] = ops
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+    print(json.dumps({"items": args.items, "batch": args.batch, **results}, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Google login throughput: blocking tokeninfo+userinfo vs local verification.
+
+Runs concurrent logins against the local Google stand-in (with an
+artificial delay standing in for Google's latency) and reports logins/sec
+and latency for the previous handler (two blocking ``requests.get`` calls,
+then ``find_one`` + ``insert_one``), for ID tokens verified locally with a
+cached JWKS, and for opaque access tokens that need one async userinfo
+call. Needs a reachable MongoDB (``--mongo-url``, default ``$MONGO_URL`` or
+localhost); uses a throwaway database.
+
+    python benchmarks/bench_google_login.py --logins 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+import requests
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import _common
+from google_auth import GoogleVerifier
+from stubs.google import issue_id_token, start_google_stub
+
+CLIENT_ID = "bench-client.apps.googleusercontent.com"
+
+
+def new_user(user_data):
+    return {
+        "id": str(uuid.uuid4()),
+        "email": user_data["email"],
+        "name": user_data["name"],
+        "picture": user_data.get("picture"),
+        "is_premium": False,
+        "created_at": datetime.utcnow(),
+        "premium_expires_at": None,
+    }
+
+
+async def upsert(users, user_data):
+    # Mirrors server.upsert_google_user
+    try:
+        return await users.find_one_and_update(
+            {"email": user_data["email"]},
+            {"$setOnInsert": new_user(user_data)},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        return await users.find_one({"email": user_data["email"]})
+
+
+async def run_logins(tokens, concurrency, login):
+    samples = []
+    pending = list(tokens)
+
+    async def worker():
+        while pending:
+            token = pending.pop()
+            started = time.perf_counter()
+            await login(token)
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"logins_per_sec": round(len(samples) / elapsed, 1), "latency": _common.summarize(samples)}
+
+
+async def run(args):
+    stub, base_url = start_google_stub(delay=args.google_delay)
+    verifier = GoogleVerifier(
+        CLIENT_ID,
+        jwks_url=f"{base_url}/oauth2/v3/certs",
+        userinfo_url=f"{base_url}/oauth2/v2/userinfo",
+    )
+    verifier.start()
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[f"popflix_bench_{uuid.uuid4().hex[:8]}"]
+    await db.users.create_index("email", unique=True)
+
+    # Half of the logins are returning users
+    people = [f"user{i % (args.logins // 2 or 1)}" for i in range(args.logins)]
+    session = requests.Session()
+
+    async def legacy(token):
+        # The previous handler, blocking the event loop for both calls
+        response = session.get(f"{base_url}/oauth2/v1/tokeninfo?access_token={token}")
+        assert response.status_code == 200
+        user_data = session.get(f"{base_url}/oauth2/v2/userinfo?access_token={token}").json()
+        if not await db.legacy_users.find_one({"email": user_data["email"]}):
+            await db.legacy_users.insert_one(new_user(user_data))
+
+    async def local(token):
+        await upsert(db.users, await verifier.verify(token))
+
+    report = {"logins": args.logins, "concurrency": args.concurrency, "google_delay_ms": args.google_delay * 1000}
+    try:
+        report["legacy_blocking"] = await run_logins([f"valid-{p}" for p in people], args.concurrency, legacy)
+        id_tokens = [issue_id_token(stub, CLIENT_ID, f"{p}@example.com", p) for p in people]
+        report["id_token_local"] = await run_logins(id_tokens, args.concurrency, local)
+        await db.users.delete_many({})
+        report["access_token_userinfo"] = await run_logins([f"valid-{p}" for p in people], args.concurrency, local)
+        report["google_requests"] = stub.hits
+        report["verifier"] = verifier.stats()
+    finally:
+        await client.drop_database(db.name)
+        await verifier.close()
+        stub.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--google-delay", type=float, default=0.03, help="stand-in Google latency (s)")
+    asyncio.run(run(parser.parse_args()))
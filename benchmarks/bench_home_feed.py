@@ -0,0 +1,133 @@
+"""Time to first render of the landing page: /api/home vs the old call waterfall.
+
+Boots the app like ``load_suite.py`` (uvicorn in a thread, stand-in
+upstreams, real or in-memory MongoDB) and signs users in, each with some
+watch history and favorites. Every visit then loads the landing page two
+ways:
+
+* ``multi_call`` - what ``App.js`` did before ``/api/home``: popular movies
+  and TV in parallel, then ``/api/profile`` once ``AuthProvider`` mounts,
+  then watch history and favorites in parallel;
+* ``home`` - one ``GET /api/home``.
+
+Each request first waits ``--rtt`` seconds to stand in for the browser's
+network round trip. ``catalog_paint`` is when the popular rows can render;
+``full_render`` is when every section, including the user's, can.
+
+    python benchmarks/bench_home_feed.py --mongo-url memory --visits 300 --rtt 0.04
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+import _common
+from load_suite import AppServer, login_users
+
+
+class Client:
+    def __init__(self, http, rtt):
+        self.http = http
+        self.rtt = rtt
+        self.requests = 0
+        self.bytes = 0
+
+    async def get(self, url, **kwargs):
+        await asyncio.sleep(self.rtt)
+        response = await self.http.get(url, **kwargs)
+        response.raise_for_status()
+        self.requests += 1
+        self.bytes += len(response.content)
+        return response
+
+
+async def multi_call(client, headers):
+    started = time.perf_counter()
+    await asyncio.gather(client.get("/api/movies/popular"), client.get("/api/tv/popular"))
+    painted = time.perf_counter()
+    await client.get("/api/profile", headers=headers)
+    await asyncio.gather(client.get("/api/watchhistory", headers=headers), client.get("/api/favorites", headers=headers))
+    return painted - started, time.perf_counter() - started
+
+
+async def home(client, headers):
+    started = time.perf_counter()
+    response = await client.get("/api/home", headers=headers)
+    statuses = {section["status"] for section in response.json()["sections"].values()}
+    if statuses != {"ok"}:
+        raise RuntimeError(f"Degraded home feed: {statuses}")
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+async def seed_activity(http, tokens, rng):
+    for token in tokens:
+        headers = {"Authorization": f"Bearer {token}"}
+        for tmdb_id in rng.sample(range(1, 101), 8):
+            await http.post("/api/watchhistory", headers=headers, json={
+                "content_type": "movie", "tmdb_id": tmdb_id, "title": f"Movie {tmdb_id}", "progress": rng.random(),
+            })
+        for tmdb_id in rng.sample(range(1, 101), 5):
+            await http.post("/api/favorites", headers=headers, json={
+                "content_type": "tv", "tmdb_id": tmdb_id, "title": f"Show {tmdb_id}",
+            })
+
+
+async def run(app, args):
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency * 4, max_keepalive_connections=args.concurrency * 4)
+    async with httpx.AsyncClient(base_url=app.base_url, limits=limits, timeout=30) as http:
+        tokens, _ = await login_users(app, http, args.users)
+        await seed_activity(http, tokens, rng)
+
+        report = {"visits": args.visits, "rtt_ms": args.rtt * 1000, "concurrency": args.concurrency}
+        for name, flow in (("multi_call", multi_call), ("home", home)):
+            client = Client(http, args.rtt)
+            paint, full = [], []
+            queue = list(range(args.visits))
+
+            async def worker():
+                while queue:
+                    visit = queue.pop()
+                    headers = {"Authorization": f"Bearer {tokens[visit % len(tokens)]}"}
+                    first, last = await flow(client, headers)
+                    paint.append(first)
+                    full.append(last)
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            report[name] = {
+                "catalog_paint": _common.summarize(paint),
+                "full_render": _common.summarize(full),
+                "requests_per_visit": client.requests / args.visits,
+                "bytes_per_visit": client.bytes // args.visits,
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                        help='MongoDB URL, or "memory" for mongomock-motor')
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--visits", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8, help="visits in flight")
+    parser.add_argument("--rtt", type=float, default=0.04, help="simulated browser round trip per request (s)")
+    parser.add_argument("--upstream-delay", type=float, default=0.02, help="stand-in TMDB/Google/Stripe latency (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    app = AppServer(args)
+    app.start()
+    try:
+        report = asyncio.run(run(app, args))
+    finally:
+        app.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Per-request cost of the metrics instrumentation, against its budget.
+
+Drives a minimal ASGI app (which sets ``scope["route"]`` like FastAPI's
+router) with and without ``MetricsMiddleware``, times PyMongo command events
+through ``MongoCommandMetrics`` and a ``/metrics`` render with a realistic
+number of series. The app is called directly so the numbers are the
+instrumentation's own CPU cost.
+
+    python benchmarks/bench_metrics.py --requests 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from pymongo import monitoring
+
+import _common  # noqa: F401
+from metrics import FAST_BUCKETS, MetricsMiddleware, MongoCommandMetrics, Registry
+
+BUDGET_US = 20.0
+ROUTES = ["/api/movies/popular", "/api/search", "/api/favorites", "/api/comments/{content_type}/{tmdb_id}"]
+
+
+class FakeRoute:
+    def __init__(self, path):
+        self.path = path
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = FakeRoute(ROUTES[hash(scope["path"]) % len(ROUTES)])
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def per_request_us(app, requests):
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    paths = [f"/api/path/{i}" for i in range(64)]
+    started = time.perf_counter()
+    for i in range(requests):
+        scope = {"type": "http", "method": "GET", "path": paths[i % 64], "headers": []}
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def mongo_listener_us(commands):
+    registry = Registry()
+    listener = MongoCommandMetrics(registry.histogram("mongo", "", ("command", "collection", "outcome"), buckets=FAST_BUCKETS))
+    address = ("localhost", 27017)
+    events = []
+    for i in range(commands):
+        command = {"find": "catalog", "filter": {}} if i % 2 else {"update": "users", "updates": []}
+        name = next(iter(command))
+        events.append((
+            monitoring.CommandStartedEvent(command, "popflix", i, address, i),
+            monitoring.CommandSucceededEvent(timedelta(microseconds=350), {"ok": 1}, name, i, address, i),
+        ))
+    started = time.perf_counter()
+    for started_event, succeeded_event in events:
+        listener.started(started_event)
+        listener.succeeded(succeeded_event)
+    return (time.perf_counter() - started) / commands * 1e6
+
+
+def render_ms(series):
+    registry = Registry()
+    histogram = registry.histogram("popflix_http_request_duration_seconds", "", ("route", "method", "status"))
+    for i in range(series):
+        histogram.observe(0.01, f"/api/route/{i}", "GET", "200")
+    started = time.perf_counter()
+    body = registry.render()
+    return (time.perf_counter() - started) * 1000, len(body)
+
+
+async def run(args):
+    baseline = await per_request_us(endpoint, args.requests)
+    registry = Registry()
+    histogram = registry.histogram("popflix_http_request_duration_seconds", "", ("route", "method", "status"))
+    instrumented = await per_request_us(MetricsMiddleware(endpoint, histogram), args.requests)
+    overhead = instrumented - baseline
+    mongo = mongo_listener_us(args.requests)
+    render, size = render_ms(args.series)
+    print(json.dumps({
+        "requests": args.requests,
+        "budget_us_per_request": BUDGET_US,
+        "request_baseline_us": round(baseline, 2),
+        "request_instrumented_us": round(instrumented, 2),
+        "middleware_overhead_us": round(overhead, 2),
+        "mongo_listener_us_per_command": round(mongo, 2),
+        "render_ms": round(render, 2),
+        "render_series": args.series,
+        "render_bytes": size,
+        "within_budget": overhead <= BUDGET_US and mongo <= BUDGET_US,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--series", type=int, default=200, help="histogram series in the render test")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,147 @@
+"""Recommendation latency at 100k titles and 1M users of watch history.
+
+Builds a synthetic catalog (one to three genres per title, log-normal
+popularity) and a watch history for every user, drawn mostly from one
+preferred genre. Titles are loaded in warmer-sized batches, then sampled
+users are served cold (profile built from their history, as on the first
+request), warm (cached profile) and after one incremental history event.
+The full similarity refresh is timed separately: it is what every request
+would pay if ``M`` were rebuilt instead of kept.
+
+    python benchmarks/bench_recommendations.py --items 100000 --users 1000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import _common
+from recommendations import GENRE_IDS, RecommendationEngine
+
+BATCH = 1000
+
+
+def build_catalog(items, rng):
+    genre_count = rng.integers(1, 4, size=items)
+    # Skewed so a few genres (drama, comedy, ...) dominate, as on TMDB
+    weights = 1 / np.arange(1, len(GENRE_IDS) + 1)
+    weights /= weights.sum()
+    genres = rng.choice(len(GENRE_IDS), size=(items, 3), p=weights)
+    popularity = rng.lognormal(mean=2.0, sigma=1.5, size=items)
+    is_movie = rng.random(items) < 0.7
+    catalog = []
+    for i in range(items):
+        content_type = "movie" if is_movie[i] else "tv"
+        genre_ids = sorted({GENRE_IDS[g] for g in genres[i, :genre_count[i]]})
+        catalog.append((content_type, {
+            "tmdb_id": i,
+            "data": {"tmdb_id": i, "title": f"Title {i}", "genre_ids": genre_ids},
+            "popularity": float(popularity[i]),
+        }))
+    return catalog, genres[:, 0]
+
+
+def build_history(users, per_user, primary_genre, rng):
+    """Return ``(items, progress)`` arrays of shape ``(users, per_user)``."""
+    order = np.argsort(primary_genre, kind="stable")
+    counts = np.bincount(primary_genre, minlength=len(GENRE_IDS))
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    taste = rng.choice(np.flatnonzero(counts), size=users)
+    # 80% of each user's titles come from their preferred genre
+    picks = offsets[taste][:, None] + (rng.random((users, per_user)) * counts[taste][:, None]).astype(np.int64)
+    items = order[picks]
+    wander = rng.random((users, per_user)) < 0.2
+    items[wander] = rng.integers(0, len(primary_genre), size=int(wander.sum()))
+    progress = rng.random((users, per_user)).astype(np.float32)
+    return items, progress
+
+
+def user_history(catalog, items, progress, user):
+    return [((catalog[i][0], int(i)), float(p)) for i, p in zip(items[user], progress[user])]
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    catalog, primary_genre = build_catalog(args.items, rng)
+    engine = RecommendationEngine(max_profiles=args.max_profiles)
+
+    started = time.perf_counter()
+    for start in range(0, len(catalog), BATCH):
+        for content_type in ("movie", "tv"):
+            engine.upsert_items(content_type, [entry for t, entry in catalog[start:start + BATCH] if t == content_type])
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    items, progress = build_history(args.users, args.history_per_user, primary_genre, rng)
+    history_seconds = time.perf_counter() - started
+
+    sample = rng.choice(args.users, size=args.samples, replace=False)
+    cold, warm, incremental, fallback = [], [], [], []
+    for user in sample.tolist():
+        user_id = f"user-{user}"
+        history = user_history(catalog, items, progress, user)
+        favorites = [key for key, _ in history[:args.favorites_per_user]]
+        t0 = time.perf_counter()
+        engine.build_profile(user_id, history, favorites)
+        engine.recommend(user_id, limit=args.limit)
+        t1 = time.perf_counter()
+        engine.recommend(user_id, limit=args.limit)
+        t2 = time.perf_counter()
+        item = int(rng.integers(args.items))
+        engine.record_history(user_id, (catalog[item][0], item), 0.5)
+        engine.recommend(user_id, limit=args.limit)
+        t3 = time.perf_counter()
+        cold.append(t1 - t0)
+        warm.append(t2 - t1)
+        incremental.append(t3 - t2)
+
+    for user in range(min(args.samples, 500)):
+        t0 = time.perf_counter()
+        engine.recommend(f"anonymous-{user}", limit=args.limit)
+        fallback.append(time.perf_counter() - t0)
+
+    # Retagging and adding titles touches only their rows of M
+    retag = [
+        (content_type, {**entry, "data": {**entry["data"], "genre_ids": [GENRE_IDS[0]]}})
+        for content_type, entry in (catalog[int(i)] for i in rng.choice(args.items, size=100, replace=False))
+    ]
+    started = time.perf_counter()
+    for content_type in ("movie", "tv"):
+        engine.upsert_items(content_type, [entry for t, entry in retag if t == content_type])
+    upsert_100_ms = (time.perf_counter() - started) * 1000
+
+    refreshes = []
+    for _ in range(20):
+        started = time.perf_counter()
+        engine.refresh()
+        refreshes.append(time.perf_counter() - started)
+
+    report = {
+        "items": args.items,
+        "users": args.users,
+        "history_rows": int(items.size),
+        "catalog_build_seconds": round(build_seconds, 3),
+        "history_generation_seconds": round(history_seconds, 3),
+        "recommend_cold_profile": _common.summarize(cold),
+        "recommend_warm_profile": _common.summarize(warm),
+        "record_history_then_recommend": _common.summarize(incremental),
+        "recommend_popularity_fallback": _common.summarize(fallback),
+        "upsert_100_changed_titles_ms": round(upsert_100_ms, 3),
+        "full_refresh": _common.summarize(refreshes),
+        "engine": engine.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--history-per-user", type=int, default=10)
+    parser.add_argument("--favorites-per-user", type=int, default=2)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--max-profiles", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=7)
+    run(parser.parse_args())
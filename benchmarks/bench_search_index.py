@@ -0,0 +1,105 @@
+"""Typeahead latency of the local search index at 100k titles.
+
+Builds a ``SearchIndex`` from synthetic titles, then replays keystroke-style
+prefix queries and reports build time, memory and per-query latency with the
+result memo cold (cleared before every query) and warm (every query seen
+once before).
+
+    python benchmarks/bench_search_index.py --titles 100000 --queries 5000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+import _common
+from search_index import SearchIndex
+
+WORDS = (
+    "the star wars return of king dark night rising lord rings fellowship two towers "
+    "avengers endgame infinity war iron man captain america black panther spider home "
+    "far from way no fast furious mission impossible fallout rogue nation ghost protocol "
+    "harry potter stone chamber secrets prisoner azkaban goblet fire order phoenix half blood "
+    "prince deathly hallows part breaking bad better call saul game thrones house dragon "
+    "stranger things crown office parks recreation friends simpsons family guy south park "
+    "love death robots lost last us mandalorian boys witcher peaky blinders narcos ozark"
+).split()
+
+
+def build_titles(count, rng):
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))) + f" {i}" for i in range(count)]
+
+
+def keystroke_queries(titles, count, rng):
+    queries = []
+    for _ in range(count):
+        words = rng.choice(titles).split()[:-1]
+        text = " ".join(words[: rng.randint(1, len(words))])
+        queries.append(text[: rng.randint(1, len(text))])
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--titles", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    titles = build_titles(args.titles, rng)
+
+    scores = [(rng.random() * 1000, rng.random() * 10) for _ in titles]
+
+    def build():
+        # One batch, as the catalog warmer loads it
+        index = SearchIndex()
+        index.add_many(
+            (("movie", i), title, {"type": "movie", "data": title}, scores[i][0], scores[i][1])
+            for i, title in enumerate(titles)
+        )
+        return index
+
+    # Time and memory are measured on separate builds; tracemalloc slows
+    # allocation-heavy code down severalfold.
+    tracemalloc.start()
+    traced = build()
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    del traced
+
+    started = time.perf_counter()
+    index = build()
+    build_seconds = time.perf_counter() - started
+
+    queries = keystroke_queries(titles, args.queries, rng)
+    index.search("warm up score order")
+
+    cold = []
+    for query in queries:
+        index._results.clear()
+        started = time.perf_counter()
+        index.search(query)
+        cold.append(time.perf_counter() - started)
+
+    for query in queries:
+        index.search(query)
+    warm = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query)
+        warm.append(time.perf_counter() - started)
+
+    print(json.dumps({
+        "titles": args.titles,
+        "queries": args.queries,
+        "build_seconds": round(build_seconds, 2),
+        "index_memory_mb": round(memory_mb, 1),
+        "cold": _common.summarize(cold),
+        "warm": _common.summarize(warm),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Per-item cost of building and encoding list responses.
+
+For catalog titles (TMDB shaped) and favorites (Mongo shaped), compares the
+default path (one model per item, then FastAPI's ``jsonable_encoder`` and
+stdlib JSON) with ``fast_json``: batch ``TypeAdapter`` validation plus
+orjson, and projected documents encoded as-is. Reports microseconds per item
+for 20, 100 and 1000-element responses.
+
+    python benchmarks/bench_serialization.py --sizes 20 100 1000
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+import _common
+from fast_json import FastJSONResponse, projection, validate_many
+
+
+class Movie(BaseModel):
+    tmdb_id: int
+    title: str
+    overview: Optional[str] = None
+    poster_path: Optional[str] = None
+    backdrop_path: Optional[str] = None
+    release_date: Optional[str] = None
+    vote_average: Optional[float] = None
+    genre_ids: List[int] = []
+    adult: bool = False
+
+
+class Favorite(BaseModel):
+    id: str
+    user_id: str
+    content_type: str
+    tmdb_id: int
+    title: str
+    poster_path: Optional[str] = None
+    added_at: datetime
+
+
+def movie_fields(item):
+    return dict(
+        tmdb_id=item["id"],
+        title=item["title"],
+        overview=item.get("overview"),
+        poster_path=item.get("poster_path"),
+        backdrop_path=item.get("backdrop_path"),
+        release_date=item.get("release_date"),
+        vote_average=item.get("vote_average"),
+        genre_ids=item.get("genre_ids", []),
+        adult=item.get("adult", False),
+    )
+
+
+def tmdb_items(count):
+    return [
+        {
+            "id": i,
+            "title": f"Movie {i}",
+            "overview": "An overview of the movie that runs for a sentence or two. " * 3,
+            "poster_path": f"/poster{i}.jpg",
+            "backdrop_path": f"/backdrop{i}.jpg",
+            "release_date": "2024-05-01",
+            "vote_average": 7.3,
+            "genre_ids": [28, 12, 878],
+            "adult": False,
+            "popularity": 1234.5,
+            "original_language": "en",
+        }
+        for i in range(count)
+    ]
+
+
+def favorite_docs(count):
+    # What Mongo returns after a projection of Favorite's fields
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": "user-1",
+            "content_type": "movie",
+            "tmdb_id": i,
+            "title": f"Movie {i}",
+            "poster_path": f"/poster{i}.jpg",
+            "added_at": start + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def default_render(content):
+    # What FastAPI does for a handler without a response_model
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_render(content):
+    return FastJSONResponse(content).body
+
+
+def per_item_us(fn, size, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(_common.percentile(samples, 50) / size * 1e6, 3)
+
+
+def bench_size(size, repeat):
+    items = tmdb_items(size)
+    docs = favorite_docs(size)
+    assert json.loads(default_render([Favorite(**d) for d in docs])) == json.loads(fast_render(docs))
+    assert set(projection(Favorite)) == {"_id", *Favorite.model_fields}
+
+    return {
+        "catalog": {
+            "default_us_per_item": per_item_us(
+                lambda: default_render({"results": [Movie(**movie_fields(i)) for i in items]}), size, repeat),
+            "batch_validate_orjson_us_per_item": per_item_us(
+                lambda: fast_render({"results": validate_many(Movie, [movie_fields(i) for i in items])}), size, repeat),
+        },
+        "favorites": {
+            "default_us_per_item": per_item_us(
+                lambda: default_render([Favorite(**d) for d in docs]), size, repeat),
+            "batch_validate_orjson_us_per_item": per_item_us(
+                lambda: fast_render(validate_many(Favorite, docs)), size, repeat),
+            "trusted_orjson_us_per_item": per_item_us(lambda: fast_render(docs), size, repeat),
+        },
+    }
+
+
+def main(args):
+    report = {}
+    for size in args.sizes:
+        repeat = max(20, args.items_per_size // size)
+        report[str(size)] = bench_size(size, repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--items-per-size", type=int, default=200_000, help="items encoded per size")
+    main(parser.parse_args())
@@ -0,0 +1,155 @@
+"""Cold start: import time and time to the first successful request.
+
+Each run starts a fresh ``python`` process serving ``server.app`` under
+uvicorn, against the stand-in TMDB and Google upstreams and a
+throwaway real MongoDB database, or mongomock with ``--mongo-url memory``.
+The parent measures from spawning the process:
+
+* ``import`` - how long ``import server`` took in the child;
+* ``first_success`` - until ``GET /api/movies/popular`` first answers 200,
+  polled every ``--poll`` seconds, and that request's own latency;
+* ``second_request`` - the same endpoint right after, for comparison;
+* ``ready`` - until ``/readyz`` answers 200.
+
+``--upstream-delay`` is paid by every cold TMDB round trip, so warm-up
+shows up in ``first_request``.
+
+    python benchmarks/bench_startup.py --mongo-url memory --runs 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+import _common
+from load_suite import free_port
+from stubs.google import start_google_stub
+from stubs.tmdb import start_tmdb_stub
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+
+def serve(port):
+    """Child process: import the app, report the import time, then serve it."""
+    if os.environ["MONGO_URL"] == "memory":
+        import mongomock_motor
+        import motor.motor_asyncio
+
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    started = time.perf_counter()
+    import server
+    import_seconds = time.perf_counter() - started
+    print(json.dumps({"import_seconds": import_seconds}), flush=True)
+
+    import uvicorn
+
+    uvicorn.run(server.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+async def wait_for(http, url, deadline, poll):
+    """Poll ``url`` until it answers 200; returns the latency of that request."""
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await http.get(url)
+            if response.status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(poll)
+    raise RuntimeError(f"{url} did not answer 200 in time")
+
+
+async def measure(base_url, args):
+    deadline = time.monotonic() + args.timeout
+    # A fresh client per run, so the app's pools are the only warm ones
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as http:
+        first_request = await wait_for(http, "/api/movies/popular", deadline, args.poll)
+        first_success = time.perf_counter()
+        started = time.perf_counter()
+        await wait_for(http, "/api/movies/popular?page=2", deadline, args.poll)
+        second_request = time.perf_counter() - started
+        await wait_for(http, "/readyz", deadline, args.poll)
+        ready = time.perf_counter()
+    return first_success, first_request, second_request, ready
+
+
+def run_once(env, args):
+    port = free_port()
+    env = {**env, "DB_NAME": f"popflix_bench_{uuid.uuid4().hex[:8]}"}
+    spawned = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--serve", str(port)],
+        cwd=BENCH_DIR, env=env, stdout=subprocess.PIPE, stderr=None if args.verbose else subprocess.DEVNULL, text=True,
+    )
+    try:
+        first_success, first_request, second_request, ready = asyncio.run(
+            measure(f"http://127.0.0.1:{port}", args)
+        )
+        import_seconds = json.loads(process.stdout.readline())["import_seconds"]
+    finally:
+        process.terminate()
+        process.wait(30)
+    if args.mongo_url != "memory":
+        drop_database(args.mongo_url, env["DB_NAME"])
+    return {
+        "import": import_seconds,
+        "first_success": first_success - spawned,
+        "first_request": first_request,
+        "second_request": second_request,
+        "ready": ready - spawned,
+    }
+
+
+def drop_database(mongo_url, name):
+    from pymongo import MongoClient
+
+    with MongoClient(mongo_url) as mongo:
+        mongo.drop_database(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                        help='MongoDB URL, or "memory" for mongomock-motor')
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--poll", type=float, default=0.005, help="interval between attempts (s)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-run limit (s)")
+    parser.add_argument("--upstream-delay", type=float, default=0.02, help="stand-in TMDB/Google latency (s)")
+    parser.add_argument("--verbose", action="store_true", help="show the app's log output")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+        return
+
+    tmdb, tmdb_url = start_tmdb_stub(delay=args.upstream_delay)
+    google, google_url = start_google_stub(delay=args.upstream_delay)
+    env = {
+        **os.environ,
+        "MONGO_URL": args.mongo_url,
+        "TMDB_BASE_URL": tmdb_url,
+        "GOOGLE_JWKS_URL": f"{google_url}/oauth2/v3/certs",
+        "GOOGLE_USERINFO_URL": f"{google_url}/oauth2/v2/userinfo",
+        "STRIPE_API_KEY": "sk_test_bench_startup",
+    }
+    try:
+        runs = [run_once(env, args) for _ in range(args.runs)]
+    finally:
+        for stub in (tmdb, google):
+            stub.shutdown()
+    report = {"runs": args.runs, "upstream_delay_ms": args.upstream_delay * 1000}
+    for name in runs[0]:
+        report[name] = _common.summarize([run[name] for run in runs])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Concurrent TMDB throughput: blocking ``requests.get`` vs the pooled async client.
+
+Runs ``--concurrency`` simulated catalog handlers against the local TMDB stub
+(with ``--delay`` seconds of upstream latency) and reports requests/second for
+the old pattern (synchronous ``requests.get`` inside an ``async def``) and for
+``TMDBClient``.
+
+    python benchmarks/bench_tmdb_client.py --requests 200 --concurrency 50 --delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import requests
+
+import _common  # noqa: F401
+from stubs.tmdb import start_tmdb_stub
+from tmdb_client import TMDBClient
+
+
+async def run_blocking(base_url, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handler():
+        async with semaphore:
+            # Same shape as the pre-client handlers: no session, no timeout.
+            response = requests.get(f"{base_url}/movie/popular?api_key=x&language=en-US&page=1")
+            return response.json()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(total)))
+    return time.perf_counter() - started
+
+
+async def run_async_client(base_url, total, concurrency):
+    # Shipped pool defaults: httpcore's pool bookkeeping grows with the number
+    # of live connections, so a moderate in-flight cap beats matching the
+    # caller concurrency. Every call is identical, so keep deduplication off
+    # to measure round trips.
+    client = TMDBClient(api_key="x", base_url=base_url, dedupe=False)
+    await client.start()
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(client.get("/movie/popular", page=1) for _ in range(total)))
+        return time.perf_counter() - started
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05, help="simulated TMDB latency in seconds")
+    args = parser.parse_args()
+
+    server, base_url = start_tmdb_stub(delay=args.delay)
+    try:
+        before = asyncio.run(run_blocking(base_url, args.requests, args.concurrency))
+        after = asyncio.run(run_async_client(base_url, args.requests, args.concurrency))
+    finally:
+        server.shutdown()
+
+    print(json.dumps({
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "upstream_delay_s": args.delay,
+        "blocking_requests_rps": round(args.requests / before, 1),
+        "async_client_rps": round(args.requests / after, 1),
+        "speedup": round(before / after, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""TMDB traffic spike against a rate-limited upstream, with and without the governor.
+
+Starts the TMDB stub with a per-second limit (``--upstream-limit``) and fires
+a background prefetch burst (distinct catalog pages), a wave of page loads
+where many users open the same pages, and interactive searches arriving
+during the spike. Reports failed requests, upstream round trips and latency
+per class for a client without governance (the previous behaviour) and for
+the shipped ``TMDBClient`` configuration (token bucket below the upstream
+limit, priority queueing, deduplication, 429 handling).
+
+    python benchmarks/bench_tmdb_governor.py --prefetch 150 --page-loads 300 --searches 40
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import _common
+from rate_governor import Priority
+from stubs.tmdb import start_tmdb_stub
+from tmdb_client import TMDBClient, TMDBError
+
+
+async def spike(client, args):
+    samples = {"search": [], "page": [], "prefetch": []}
+    failures = {"search": 0, "page": 0, "prefetch": 0}
+
+    async def call(kind, priority, path, delay=0.0, **params):
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        try:
+            await client.get(path, priority=priority, **params)
+        except TMDBError:
+            failures[kind] += 1
+            return
+        samples[kind].append(time.perf_counter() - started)
+
+    calls = [
+        call("prefetch", Priority.PREFETCH, "/movie/top_rated" if i % 2 else "/tv/top_rated", page=i + 1)
+        for i in range(args.prefetch)
+    ]
+    # Page loads cluster on the first few pages of the popular lists
+    calls += [
+        call("page", Priority.PAGE, "/movie/popular", delay=i * args.spread / args.page_loads, page=i % 5 + 1)
+        for i in range(args.page_loads)
+    ]
+    calls += [
+        call("search", Priority.SEARCH, "/search/multi", delay=i * args.spread / args.searches, query=f"query {i}", page=1)
+        for i in range(args.searches)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*calls)
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "failed": failures,
+        "latency": {kind: _common.summarize(values) for kind, values in samples.items()},
+    }
+
+
+async def run_one(base_url, stub, args, **options):
+    client = TMDBClient(api_key="x", base_url=base_url, **options)
+    await client.start()
+    # Start in a fresh upstream window
+    await asyncio.sleep(1 - time.monotonic() % 1)
+    hits, rejected = stub.hits, stub.rejected
+    try:
+        result = await spike(client, args)
+    finally:
+        await client.close()
+    result["upstream_ok"] = stub.hits - hits
+    result["upstream_429"] = stub.rejected - rejected
+    result["client"] = client.stats()
+    await asyncio.sleep(1.5)  # let the upstream window reset
+    return result
+
+
+async def run(args):
+    stub, base_url = start_tmdb_stub(delay=args.delay, rate_limit=args.upstream_limit)
+    try:
+        report = {
+            "upstream_limit_per_s": args.upstream_limit,
+            "ungoverned": await run_one(base_url, stub, args, dedupe=False, max_retries=0),
+            "governed": await run_one(base_url, stub, args, rate_limit=args.rate, burst=args.burst),
+        }
+    finally:
+        stub.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prefetch", type=int, default=150)
+    parser.add_argument("--page-loads", type=int, default=300)
+    parser.add_argument("--searches", type=int, default=40)
+    parser.add_argument("--spread", type=float, default=2.0, help="seconds over which page loads and searches arrive")
+    parser.add_argument("--upstream-limit", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=40.0)
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.02, help="simulated TMDB latency in seconds")
+    asyncio.run(run(parser.parse_args()))
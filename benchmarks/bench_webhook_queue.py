@@ -0,0 +1,152 @@
+"""Stripe webhook burst: inline processing vs the durable ``WebhookQueue``.
+
+Sends a burst of synthetic ``checkout.session.completed`` events (10% of
+them redeliveries) from many concurrent senders and reports the latency of
+acknowledging each one. The inline path does what the handler used to do
+before acknowledging: read the transaction, upgrade the user and mark the
+transaction paid. The queued path only persists the event; the report also
+includes how long the worker pool takes to drain the backlog. Needs a
+reachable MongoDB (``--mongo-url``, default ``$MONGO_URL`` or localhost);
+uses a throwaway database.
+
+    python benchmarks/bench_webhook_queue.py --events 10000 --senders 100 --workers 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import _common
+from db_indexes import INDEXES
+from webhook_queue import DONE, WebhookQueue
+
+
+async def seed(db, sessions):
+    await db.users.insert_many([
+        {"id": f"user-{i}", "email": f"user{i}@example.com", "name": f"User {i}", "is_premium": False}
+        for i in range(sessions)
+    ])
+    await db.payment_transactions.insert_many([
+        {"id": str(uuid.uuid4()), "user_id": f"user-{i}", "session_id": f"cs_{i}",
+         "amount": 200.0, "currency": "INR", "payment_status": "pending", "metadata": {}}
+        for i in range(sessions)
+    ])
+
+
+def make_upgrade(db):
+    # Mirrors server.apply_premium_upgrade
+    async def upgrade(session_id):
+        await db.payment_transactions.update_one(
+            {"session_id": session_id, "paid_at": None}, {"$set": {"paid_at": datetime.utcnow()}}
+        )
+        transaction = await db.payment_transactions.find_one(
+            {"session_id": session_id}, {"_id": 0, "user_id": 1, "paid_at": 1}
+        )
+        await db.users.update_one(
+            {"id": transaction["user_id"]},
+            {"$set": {"is_premium": True}, "$max": {"premium_expires_at": transaction["paid_at"] + timedelta(days=30)}},
+        )
+        await db.payment_transactions.update_one(
+            {"session_id": session_id}, {"$set": {"payment_status": "paid", "updated_at": datetime.utcnow()}}
+        )
+    return upgrade
+
+
+async def burst(events, senders, send):
+    samples = []
+    queue = list(events)
+
+    async def sender():
+        while queue:
+            event_id, session_id = queue.pop()
+            started = time.perf_counter()
+            await send(event_id, session_id)
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(senders)))
+    return samples, time.perf_counter() - started
+
+
+def synthetic_events(count, rng):
+    unique = [(f"evt_{i}", f"cs_{i}") for i in range(int(count * 0.9))]
+    return unique + [rng.choice(unique) for _ in range(count - len(unique))]
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    events = synthetic_events(args.events, rng)
+    rng.shuffle(events)
+    client = AsyncIOMotorClient(args.mongo_url)
+    report = {"events": args.events, "senders": args.senders, "workers": args.workers}
+    try:
+        # Inline: the pre-queue handler
+        db = client[f"popflix_bench_{uuid.uuid4().hex[:8]}"]
+        for collection, keys, options in INDEXES:
+            if collection in ("users", "payment_transactions"):
+                await db[collection].create_index(keys, **options)
+        await seed(db, args.events)
+        upgrade = make_upgrade(db)
+
+        async def inline(event_id, session_id):
+            transaction = await db.payment_transactions.find_one({"session_id": session_id})
+            if transaction and transaction["payment_status"] != "paid":
+                await upgrade(session_id)
+
+        samples, elapsed = await burst(events, args.senders, inline)
+        report["inline"] = {"ack_latency": _common.summarize(samples), "acks_per_sec": round(len(samples) / elapsed, 1)}
+        await client.drop_database(db.name)
+
+        # Queued: persist, acknowledge, process in the background
+        db = client[f"popflix_bench_{uuid.uuid4().hex[:8]}"]
+        for collection, keys, options in INDEXES:
+            if collection in ("users", "payment_transactions", "webhook_events"):
+                await db[collection].create_index(keys, **options)
+        await seed(db, args.events)
+        upgrade = make_upgrade(db)
+
+        async def handler(event):
+            await upgrade(event["payload"]["session_id"])
+
+        queue = WebhookQueue(db.webhook_events, db.webhook_events_dead, handler, workers=args.workers,
+                             poll_interval=0.1)
+
+        async def enqueue(event_id, session_id):
+            await queue.enqueue(event_id, "checkout.session.completed", {"session_id": session_id})
+
+        queue.start()
+        started = time.perf_counter()
+        samples, elapsed = await burst(events, args.senders, enqueue)
+        unique = len(set(events))
+        while await db.webhook_events.count_documents({"status": DONE}) < unique:
+            await asyncio.sleep(0.1)
+        drained = time.perf_counter() - started
+        await queue.stop()
+        report["queued"] = {
+            "ack_latency": _common.summarize(samples),
+            "acks_per_sec": round(len(samples) / elapsed, 1),
+            "drain_seconds": round(drained, 2),
+            "processed_per_sec": round(unique / drained, 1),
+            "stats": queue.stats(),
+            "premium_users": await db.users.count_documents({"is_premium": True}),
+        }
+        await client.drop_database(db.name)
+    finally:
+        client.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--senders", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,422 @@
+"""Offline load test and performance regression check for the backend.
+
+Boots ``server.app`` under uvicorn (in a background thread) against local
+stand-ins for TMDB, Google and Stripe, and either a real MongoDB
+(``--mongo-url``, default ``$MONGO_URL`` or localhost; a throwaway database
+is dropped afterwards) or an in-memory one (``--mongo-url memory``, needs
+``mongomock-motor``). Virtual users then drive a weighted mix of browse,
+search, watch-progress heartbeats, favorites, comments and checkout polling
+for ``--duration`` seconds after a ``--warmup``, and the run is reported as
+JSON: overall throughput plus requests, errors, rps and p50/p95/p99 for
+every endpoint.
+
+Stripe calls are redirected by pointing the ``stripe`` SDK's ``api_base``
+at the stub before ``server`` is imported. The load generator shares the
+process with the app, so treat the numbers as a regression signal on a
+fixed machine rather than as capacity.
+
+Record a baseline, then compare later runs against it; the exit status is
+1 when an endpoint's p95/p99 or the error rate or overall throughput
+regresses beyond the thresholds:
+
+    python benchmarks/load_suite.py --duration 60 --save-baseline benchmarks/load_baseline.json
+    python benchmarks/load_suite.py --duration 60 --baseline benchmarks/load_baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+
+import _common
+from stubs.google import issue_id_token, start_google_stub
+from stubs.stripe import start_stripe_stub
+from stubs.tmdb import start_tmdb_stub
+
+DEFAULT_MIX = "browse=35,search=20,heartbeat=20,favorites=10,comments=10,checkout=5"
+PREMIUM_EVERY = 4  # every 4th virtual user is premium and may post comments
+SEARCH_TERMS = ["mov", "movie 1", "movie 12", "show", "show 7", "sho", "trailer night", "xqzv"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class AppServer:
+    """Runs ``server.app`` under uvicorn in a daemon thread with its own loop."""
+
+    def __init__(self, args):
+        self.args = args
+        self.stubs = {}
+        self.loop = None
+        self.server = None
+        self.base_url = None
+
+    def start(self):
+        tmdb, tmdb_url = start_tmdb_stub(delay=self.args.upstream_delay)
+        google, google_url = start_google_stub(delay=self.args.upstream_delay)
+        stripe_stub, stripe_url = start_stripe_stub(delay=self.args.upstream_delay)
+        self.stubs = {"tmdb": tmdb, "google": google, "stripe": stripe_stub}
+
+        os.environ["TMDB_BASE_URL"] = tmdb_url
+        os.environ["GOOGLE_JWKS_URL"] = f"{google_url}/oauth2/v3/certs"
+        os.environ["GOOGLE_USERINFO_URL"] = f"{google_url}/oauth2/v2/userinfo"
+        os.environ["STRIPE_API_KEY"] = "sk_test_load_suite"
+        os.environ["DB_NAME"] = f"popflix_bench_{uuid.uuid4().hex[:8]}"
+        if self.args.mongo_url == "memory":
+            import mongomock_motor
+            import motor.motor_asyncio
+
+            motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+            os.environ["MONGO_URL"] = "mongodb://memory"
+        else:
+            os.environ["MONGO_URL"] = self.args.mongo_url
+        try:
+            import stripe
+
+            stripe.api_base = stripe_url
+        except ImportError:
+            print("stripe SDK not importable; checkout calls will not reach the stub", file=sys.stderr)
+
+        import server
+        import uvicorn
+
+        self.app_module = server
+
+        lifespan = server.app.router.lifespan_context
+
+        @contextlib.asynccontextmanager
+        async def remember_loop(app):
+            self.loop = asyncio.get_running_loop()
+            async with lifespan(app) as state:
+                yield state
+
+        server.app.router.lifespan_context = remember_loop
+        port = free_port()
+        self.base_url = f"http://127.0.0.1:{port}"
+        config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+        self.server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("App server did not start")
+            time.sleep(0.05)
+
+    def call(self, func, *args):
+        """Await ``func(*args)`` on the app's event loop, where Motor must run."""
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(func(*args), self.loop))
+
+    def stop(self):
+        if self.server is not None:
+            if self.args.mongo_url != "memory":
+                asyncio.run_coroutine_threadsafe(drop_database(self.app_module.db), self.loop).result(30)
+            self.server.should_exit = True
+            self._thread.join(30)
+        for stub in self.stubs.values():
+            stub.shutdown()
+
+    def upstream_hits(self):
+        return {
+            "tmdb": self.stubs["tmdb"].hits,
+            "google": sum(self.stubs["google"].hits.values()),
+            "stripe": self.stubs["stripe"].hits,
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, http, method, label, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await http.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        if self.recording:
+            key = f"{method} {label}"
+            self.samples[key].append(time.perf_counter() - started)
+            if not ok:
+                self.errors[key] += 1
+        return response
+
+
+class VirtualUser:
+    def __init__(self, index, token, session_id, recorder, http, rng):
+        self.index = index
+        self.premium = index % PREMIUM_EVERY == 0
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.session_id = session_id
+        self.recorder = recorder
+        self.http = http
+        self.rng = rng
+        self.progress = 0.0
+        self.watching = rng.randint(1, 100)
+        self.favorite_ids = set()
+
+    def title_id(self):
+        # Popular titles get most of the traffic
+        return min(int(self.rng.paretovariate(1.2)), 100)
+
+    async def get(self, label, url, **kwargs):
+        return await self.recorder.request(self.http, "GET", label, url, **kwargs)
+
+    async def send(self, method, label, url, **kwargs):
+        return await self.recorder.request(self.http, method, label, url, headers=self.headers, **kwargs)
+
+    async def browse(self):
+        kind = "movies" if self.rng.random() < 0.7 else "tv"
+        page = min(int(self.rng.paretovariate(1.5)), 10)
+        await self.get(f"/api/{kind}/popular", f"/api/{kind}/popular", params={"page": page})
+        tmdb_id = self.title_id()
+        if kind == "movies":
+            await self.get("/api/stream/{content_type}/{tmdb_id}", f"/api/stream/movie/{tmdb_id}")
+        else:
+            await self.get(
+                "/api/stream/{content_type}/{tmdb_id}", f"/api/stream/tv/{tmdb_id}", params={"season": 1, "episode": 1}
+            )
+
+    async def search(self):
+        term = self.rng.choice(SEARCH_TERMS)
+        await self.get("/api/search", "/api/search", params={"q": term})
+
+    async def heartbeat(self):
+        self.progress = min(1.0, self.progress + 0.02)
+        if self.progress >= 1.0:
+            self.watching, self.progress = self.title_id(), 0.0
+        await self.send("POST", "/api/watchhistory", "/api/watchhistory", json={
+            "content_type": "movie", "tmdb_id": self.watching, "title": f"Movie {self.watching}",
+            "poster_path": f"/poster{self.watching}.jpg", "progress": self.progress,
+        })
+        if self.rng.random() < 0.1:
+            await self.send("GET", "/api/watchhistory", "/api/watchhistory")
+
+    async def favorites(self):
+        roll = self.rng.random()
+        if roll < 0.4:
+            tmdb_id = self.title_id()
+            await self.send("POST", "/api/favorites", "/api/favorites", json={
+                "content_type": "movie", "tmdb_id": tmdb_id, "title": f"Movie {tmdb_id}",
+                "poster_path": f"/poster{tmdb_id}.jpg",
+            })
+            self.favorite_ids.add(tmdb_id)
+        elif roll < 0.5 and self.favorite_ids:
+            # Only titles this user added, so a 404 is a real error
+            tmdb_id = self.favorite_ids.pop()
+            await self.send("DELETE", "/api/favorites/{content_type}/{tmdb_id}", f"/api/favorites/movie/{tmdb_id}")
+        else:
+            await self.send("GET", "/api/favorites", "/api/favorites")
+
+    async def comments(self):
+        tmdb_id = self.title_id()
+        await self.get("/api/comments/{content_type}/{tmdb_id}", f"/api/comments/movie/{tmdb_id}")
+        if self.premium and self.rng.random() < 0.3:
+            await self.send("POST", "/api/comments", "/api/comments", json={
+                "content_type": "movie", "tmdb_id": tmdb_id, "text": f"Comment from user {self.index}",
+            })
+
+    async def checkout(self):
+        await self.get("/api/payments/status/{session_id}", f"/api/payments/status/{self.session_id}")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("browse", "search", "heartbeat", "favorites", "comments", "checkout"):
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+async def login_users(app, http, count):
+    """Sign every virtual user in through Google and seed premium status and checkouts."""
+    google = app.stubs["google"]
+    client_id = app.app_module.GOOGLE_CLIENT_ID
+    tokens = []
+    for start in range(0, count, 50):
+        batch = range(start, min(count, start + 50))
+        responses = await asyncio.gather(*(
+            http.post("/api/auth/google", json={
+                "token": issue_id_token(google, client_id, f"load{i}@example.com", f"Load User {i}")
+            })
+            for i in batch
+        ))
+        for response in responses:
+            response.raise_for_status()
+            tokens.append(response.json()["token"])
+
+    sessions = await app.call(seed_database, app.app_module.db, count)
+    return tokens, sessions
+
+
+async def drop_database(db):
+    await db.client.drop_database(db.name)
+
+
+async def seed_database(db, count):
+    now = datetime.utcnow()
+    await db.users.update_many(
+        {"email": {"$in": [f"load{i}@example.com" for i in range(0, count, PREMIUM_EVERY)]}},
+        {"$set": {"is_premium": True, "premium_expires_at": now + timedelta(days=30)}},
+    )
+    users = {doc["email"]: doc["id"] async for doc in db.users.find({}, {"_id": 0, "email": 1, "id": 1})}
+    # Premium users' checkouts are paid at the (stub) processor, the rest are
+    # still open. Paying users already have an expiry, which also keeps the
+    # upgrade's $max working on mongomock (it cannot compare a date to null).
+    sessions = [f"{'open' if i % PREMIUM_EVERY else 'paid'}_load_{i}" for i in range(count)]
+    await db.payment_transactions.insert_many([
+        {
+            "id": str(uuid.uuid4()), "user_id": users[f"load{i}@example.com"], "session_id": sessions[i],
+            "amount": 200.0, "currency": "INR", "payment_status": "pending",
+            "metadata": {"package_id": "premium_monthly"}, "created_at": now, "updated_at": now,
+        }
+        for i in range(count)
+    ])
+    return sessions
+
+
+async def drive(app, args):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app.base_url, limits=limits, timeout=30) as http:
+        tokens, sessions = await login_users(app, http, args.users)
+        rng = random.Random(args.seed)
+        users = [VirtualUser(i, tokens[i], sessions[i], recorder, http, random.Random(rng.random())) for i in range(args.users)]
+        scenarios, weights = zip(*args.mix.items())
+        deadline = time.monotonic() + args.warmup + args.duration
+
+        async def worker(worker_rng):
+            while time.monotonic() < deadline:
+                user = worker_rng.choice(users)
+                await getattr(user, worker_rng.choices(scenarios, weights)[0])()
+                if args.think:
+                    await asyncio.sleep(worker_rng.expovariate(1 / args.think))
+
+        async def measure():
+            await asyncio.sleep(args.warmup)
+            recorder.recording = True
+            hits = app.upstream_hits()
+            started = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            recorder.recording = False
+            return time.perf_counter() - started, hits
+
+        workers = [asyncio.ensure_future(worker(random.Random(rng.random()))) for _ in range(args.concurrency)]
+        elapsed, hits_before = await measure()
+        hits_after = app.upstream_hits()
+        await asyncio.gather(*workers)
+
+    endpoints = {}
+    for key in sorted(recorder.samples):
+        samples = recorder.samples[key]
+        endpoints[key] = {
+            "requests": len(samples),
+            "errors": recorder.errors[key],
+            "rps": round(len(samples) / elapsed, 1),
+            **_common.summarize(samples),
+        }
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        "config": {
+            "mongo": "memory" if args.mongo_url == "memory" else "mongodb",
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "upstream_delay_ms": args.upstream_delay * 1000,
+        },
+        "throughput_rps": round(total / elapsed, 1),
+        "requests": total,
+        "errors": sum(recorder.errors.values()),
+        "upstream_requests": {name: hits_after[name] - hits_before[name] for name in hits_after},
+        "endpoints": endpoints,
+    }
+
+
+def compare(report, baseline, args):
+    """Regressions of ``report`` against ``baseline``, as human-readable strings."""
+    failures = []
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - args.max_throughput_drop):
+        failures.append(
+            f"throughput {report['throughput_rps']} rps < baseline {baseline['throughput_rps']} rps "
+            f"- {args.max_throughput_drop:.0%}"
+        )
+    for key, base in baseline["endpoints"].items():
+        current = report["endpoints"].get(key)
+        if current is None:
+            failures.append(f"{key}: no requests recorded (baseline had {base['requests']})")
+            continue
+        error_rate = current["errors"] / current["requests"] if current["requests"] else 1.0
+        if error_rate > args.max_error_rate:
+            failures.append(f"{key}: error rate {error_rate:.1%} > {args.max_error_rate:.1%}")
+        for stat in ("p95_ms", "p99_ms"):
+            limit = base[stat] * (1 + args.max_latency_regression)
+            if current[stat] > limit and current[stat] - base[stat] > args.min_delta_ms:
+                failures.append(
+                    f"{key}: {stat} {current[stat]} > baseline {base[stat]} + {args.max_latency_regression:.0%}"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                        help='MongoDB URL, or "memory" for mongomock-motor')
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent virtual users in flight")
+    parser.add_argument("--users", type=int, default=200, help="distinct signed-in users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before measuring")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between actions (s)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"scenario weights ({DEFAULT_MIX})")
+    parser.add_argument("--upstream-delay", type=float, default=0.02, help="stand-in TMDB/Google/Stripe latency (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--save-baseline", help="write the report as the new baseline")
+    parser.add_argument("--baseline", help="fail when the run regresses against this baseline")
+    parser.add_argument("--max-latency-regression", type=float, default=0.25, help="allowed p95/p99 increase (fraction)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore latency increases smaller than this")
+    parser.add_argument("--max-throughput-drop", type=float, default=0.15, help="allowed throughput drop (fraction)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="allowed errors per endpoint (fraction)")
+    args = parser.parse_args()
+
+    app = AppServer(args)
+    app.start()
+    try:
+        report = asyncio.run(drive(app, args))
+    finally:
+        app.stop()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                f.write(output + "\n")
+    if report.get("regressions"):
+        print("\n".join(["Performance regressions:"] + report["regressions"]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Local stand-in for Google's sign-in endpoints.
+
+Serves a JWKS document at ``/oauth2/v3/certs`` (with a ``Cache-Control``
+max-age like Google's), plus ``/oauth2/v1/tokeninfo`` and
+``/oauth2/v2/userinfo`` for opaque access tokens. ``issue_id_token`` signs
+ID tokens with the stub's RSA key, so they verify against its JWKS, and
+``rotate_key`` replaces that key the way Google rotates its own.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from stubs.tmdb import StubHTTPServer
+
+KEY_ID = "stub-key-1"
+
+
+class GoogleStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        token = parse_qs(parsed.query).get("access_token", [""])[0]
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.server.hits[parsed.path] = self.server.hits.get(parsed.path, 0) + 1
+
+        headers = {}
+        if parsed.path == "/oauth2/v3/certs":
+            status, payload = 200, self.server.jwks
+            headers["Cache-Control"] = f"public, max-age={self.server.max_age}, must-revalidate"
+        elif parsed.path in ("/oauth2/v1/tokeninfo", "/oauth2/v2/userinfo"):
+            if token.startswith("valid-"):
+                user = token[len("valid-"):]
+                status, payload = 200, {
+                    "email": f"{user}@example.com", "name": user.title(), "picture": None, "verified_email": True,
+                }
+            else:
+                status, payload = 401, {"error": "invalid_token"}
+        else:
+            status, payload = 404, {}
+
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_google_stub(host="127.0.0.1", port=0, delay=0.0, max_age=21600):
+    """Start the stub in a daemon thread and return ``(server, base_url)``."""
+    server = StubHTTPServer((host, port), GoogleStubHandler)
+    server.delay = delay
+    server.max_age = max_age
+    server.hits = {}
+    rotate_key(server, KEY_ID)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def rotate_key(server, kid):
+    """Sign with a new key published as ``kid``; the JWKS drops the old one."""
+    server.key_id = kid
+    server.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(server.private_key.public_key()))
+    jwk.update(kid=kid, use="sig", alg="RS256")
+    server.jwks = {"keys": [jwk]}
+
+
+def issue_id_token(server, client_id, email, name="Stub User", lifetime=3600, **overrides):
+    """Signed ID token; ``overrides`` replace default claims (e.g. ``iss``)."""
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": client_id,
+        "sub": email,
+        "email": email,
+        "email_verified": True,
+        "name": name,
+        "iat": now,
+        "exp": now + lifetime,
+        **overrides,
+    }
+    return jwt.encode(claims, server.private_key, algorithm="RS256", headers={"kid": server.key_id})
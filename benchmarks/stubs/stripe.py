@@ -0,0 +1,85 @@
+"""Local stand-in for Stripe's Checkout Session endpoints.
+
+Answers ``GET /v1/checkout/sessions/{id}`` and ``POST /v1/checkout/sessions``
+after an optional artificial delay. Sessions whose id starts with ``paid_``
+are complete and paid; every other session (including created ones) is open
+and unpaid. ``server.hits`` counts requests served.
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from stubs.tmdb import StubHTTPServer
+
+SESSION_PATH = "/v1/checkout/sessions/"
+_session_ids = itertools.count(1)
+
+
+def session_payload(session_id):
+    paid = session_id.startswith("paid_")
+    return {
+        "id": session_id,
+        "object": "checkout.session",
+        "status": "complete" if paid else "open",
+        "payment_status": "paid" if paid else "unpaid",
+        "amount_total": 20000,
+        "currency": "inr",
+    }
+
+
+class StripeStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.server.hits += 1
+
+        if not self.path.startswith(SESSION_PATH):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self._send_json(session_payload(self.path[len(SESSION_PATH):]))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.server.hits += 1
+
+        if self.path.rstrip("/") != SESSION_PATH.rstrip("/"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        session_id = f"cs_stub_{next(_session_ids)}"
+        payload = session_payload(session_id)
+        payload["url"] = f"https://checkout.stripe.test/pay/{session_id}"
+        self._send_json(payload)
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stripe_stub(host="127.0.0.1", port=0, delay=0.0):
+    """Start the stub in a daemon thread and return ``(server, base_url)``."""
+    server = StubHTTPServer((host, port), StripeStubHandler)
+    server.delay = delay
+    server.hits = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -0,0 +1,155 @@
+"""Local stand-in for the TMDB v3 API used by the benchmarks.
+
+Serves deterministic ``/movie/popular``, ``/tv/popular``, ``/search/multi``
+and ``/configuration`` payloads from a threaded HTTP/1.1 server with an
+optional artificial delay, so the backend can be exercised without network
+access or an API key. With
+``rate_limit`` set it answers 429 with ``Retry-After`` once more than that
+many requests arrive within one second, like TMDB's per-IP limit.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_movie(i):
+    return {
+        "id": i,
+        "title": f"Movie {i}",
+        "overview": f"Overview for movie {i}",
+        "poster_path": f"/poster{i}.jpg",
+        "backdrop_path": f"/backdrop{i}.jpg",
+        "release_date": f"{1980 + i % 45}-01-01",
+        "vote_average": round((i * 7) % 100 / 10, 1),
+        "popularity": float(1000 - i % 1000),
+        "genre_ids": [28 + i % 5, 12],
+        "adult": False,
+        "media_type": "movie",
+    }
+
+
+def fake_tv(i):
+    return {
+        "id": i,
+        "name": f"Show {i}",
+        "overview": f"Overview for show {i}",
+        "poster_path": f"/tvposter{i}.jpg",
+        "backdrop_path": f"/tvbackdrop{i}.jpg",
+        "first_air_date": f"{1990 + i % 35}-06-01",
+        "vote_average": round((i * 3) % 100 / 10, 1),
+        "popularity": float(1000 - i % 1000),
+        "genre_ids": [18, 10759],
+        "media_type": "tv",
+    }
+
+
+def page_payload(kind, page, per_page=20, total_pages=500):
+    make = fake_movie if kind == "movie" else fake_tv
+    start = (page - 1) * per_page + 1
+    return {
+        "page": page,
+        "results": [make(i) for i in range(start, start + per_page)],
+        "total_pages": total_pages,
+        "total_results": total_pages * per_page,
+    }
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def over_limit(self):
+        if not self.rate_limit:
+            return False
+        with self._limit_lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._window_count = window, 0
+            self._window_count += 1
+            if self._window_count > self.rate_limit:
+                self.rejected += 1
+                return True
+            return False
+
+
+class TMDBStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        page = int(params.get("page", ["1"])[0])
+        path = parsed.path
+        if path.startswith("/3"):
+            path = path[2:]
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.server.over_limit():
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.server.hits += 1
+
+        if path in ("/movie/popular", "/movie/top_rated", "/trending/movie/week"):
+            payload = page_payload("movie", page)
+        elif path in ("/tv/popular", "/tv/top_rated", "/trending/tv/week"):
+            payload = page_payload("tv", page)
+        elif path == "/configuration":
+            payload = {"images": {"secure_base_url": "https://image.tmdb.org/t/p/"}}
+        elif path == "/search/multi":
+            query = params.get("query", [""])[0]
+            results = [fake_movie(i) for i in range(1, 11)] + [fake_tv(i) for i in range(1, 11)]
+            for item in results:
+                key = "title" if item["media_type"] == "movie" else "name"
+                item[key] = f"{query} {item[key]}"
+            payload = {"page": 1, "results": results}
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_tmdb_stub(host="127.0.0.1", port=0, delay=0.0, rate_limit=None):
+    """Start the stub in a daemon thread and return ``(server, base_url)``."""
+    server = StubHTTPServer((host, port), TMDBStubHandler)
+    server.delay = delay
+    server.hits = 0
+    server.rate_limit = rate_limit
+    server.rejected = 0
+    server._limit_lock = threading.Lock()
+    server._window, server._window_count = None, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/3"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start_tmdb_stub(port=args.port, delay=args.delay)
+    print(f"TMDB stub listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
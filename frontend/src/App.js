@@ -8,14 +8,14 @@ const API = `${BACKEND_URL}/api`;
 // Auth Context
 const AuthContext = createContext();
 
-const AuthProvider = ({ children }) => {
-  const [user, setUser] = useState(null);
+const AuthProvider = ({ children, initialUser }) => {
+  const [user, setUser] = useState(initialUser || null);
   const [loading, setLoading] = useState(true);
   const [token, setToken] = useState(localStorage.getItem('token'));
 
   useEffect(() => {
-    if (token) {
-      // Verify token and get user profile
+    if (token && !user) {
+      // Verify token and get user profile (skipped when /home already resolved it)
       fetchProfile();
     } else {
       setLoading(false);
@@ -260,13 +260,14 @@ const ContentSection = ({ title, data, type }) => {
 
     try {
       const tmdbId = item.tmdb_id;
-      const response = await axios.get(`${API}/stream/${type}/${tmdbId}`);
+      const contentType = item.content_type || type;
+      const response = await axios.get(`${API}/stream/${contentType}/${tmdbId}`);
       const streamData = response.data;
 
       // Add to watch history if user is logged in
       if (user && token) {
         await axios.post(`${API}/watchhistory`, {
-          content_type: type,
+          content_type: contentType,
           tmdb_id: tmdbId,
           title: item.title || item.name,
           poster_path: item.poster_path
@@ -291,7 +292,7 @@ const ContentSection = ({ title, data, type }) => {
 
     try {
       await axios.post(`${API}/favorites`, {
-        content_type: type,
+        content_type: item.content_type || type,
         tmdb_id: item.tmdb_id,
         title: item.title || item.name,
         poster_path: item.poster_path
@@ -513,18 +514,27 @@ const Footer = () => {
 const App = () => {
   const [popularMovies, setPopularMovies] = useState([]);
   const [popularTV, setPopularTV] = useState([]);
+  const [continueWatching, setContinueWatching] = useState([]);
+  const [favorites, setFavorites] = useState([]);
+  const [homeUser, setHomeUser] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     const fetchContent = async () => {
       try {
-        const [moviesResponse, tvResponse] = await Promise.all([
-          axios.get(`${API}/movies/popular`),
-          axios.get(`${API}/tv/popular`)
-        ]);
-
-        setPopularMovies(moviesResponse.data.results);
-        setPopularTV(tvResponse.data.results);
+        // One request for the whole landing page: the user and every
+        // section are resolved server-side in parallel.
+        const token = localStorage.getItem('token');
+        const response = await axios.get(`${API}/home`, token ? {
+          headers: { Authorization: `Bearer ${token}` }
+        } : {});
+        const { user, sections } = response.data;
+
+        setPopularMovies(sections.popular_movies.results);
+        setPopularTV(sections.popular_tv.results);
+        setContinueWatching(sections.continue_watching?.results || []);
+        setFavorites(sections.favorites?.results || []);
+        setHomeUser(user);
       } catch (error) {
         console.error('Failed to fetch content:', error);
       } finally {
@@ -547,10 +557,16 @@ const App = () => {
   }
 
   return (
-    <AuthProvider>
+    <AuthProvider initialUser={homeUser}>
       <div className="min-h-screen bg-black">
         <Navigation />
         <Hero />
+        {continueWatching.length > 0 && (
+          <ContentSection title="▶️ Continue Watching" data={continueWatching} type="movie" />
+        )}
+        {favorites.length > 0 && (
+          <ContentSection title="❤️ My List" data={favorites} type="movie" />
+        )}
         <ContentSection title="🔥 Popular Movies" data={popularMovies} type="movie" />
         <ContentSection title="📺 Popular TV Shows" data={popularTV} type="tv" />
         <PremiumSection />
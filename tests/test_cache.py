@@ -0,0 +1,71 @@
+import asyncio
+
+from cache import SWRCache
+from shared_cache import TwoLevelCache
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    async def scenario(cache):
+        release = asyncio.Event()
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "value"
+
+        leader = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await waiter == "value"
+        assert leader.cancelled()
+        assert calls == 1
+        assert await cache.get_or_load("key", loader) == "value"
+        assert calls == 1
+
+    asyncio.run(scenario(SWRCache()))
+    asyncio.run(scenario(TwoLevelCache("user")))
+
+
+def test_failed_load_reaches_every_waiter():
+    async def scenario():
+        cache = SWRCache()
+
+        async def loader():
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert cache.stats()["load_errors"] == 1
+        assert cache.stats()["coalesced"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_load_pending_across_a_clear_is_not_stored():
+    async def scenario():
+        cache = SWRCache()
+        release = asyncio.Event()
+
+        async def old_payload():
+            await release.wait()
+            return "before"
+
+        load = asyncio.create_task(cache.get_or_load("popular", old_payload))
+        await asyncio.sleep(0)
+        cache.clear()
+        # Callers after the clear do not join the load that predates it
+        assert await cache.get_or_load("popular", lambda: asyncio.sleep(0, "after")) == "after"
+        release.set()
+
+        assert await load == "before"
+        assert cache.stats()["discarded"] == 1
+        assert await cache.get_or_load("popular", old_payload) == "after"
+
+    asyncio.run(scenario())
@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import server
+
+WARMED = 100
+
+
+def movie(tmdb_id):
+    return {"id": tmdb_id, "title": f"Movie {tmdb_id}", "genre_ids": [], "popularity": 1000.0 - tmdb_id}
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        return self
+
+    def skip(self, count):
+        self.docs = self.docs[count:]
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class Catalog:
+    """The first WARMED titles of the popular list, ranked 0..WARMED-1."""
+
+    def find(self, query, projection):
+        return Cursor([{"data": server.movie_fields(movie(rank + 1))} for rank in range(WARMED)])
+
+
+def serve(monkeypatch, page, page_size):
+    fetched = []
+
+    async def tmdb_get(path, priority=None, page=1):
+        fetched.append(page)
+        return {"results": [movie((page - 1) * 20 + i + 1) for i in range(20)]}
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(catalog=Catalog()))
+    monkeypatch.setattr(server, "tmdb_get", tmdb_get)
+    monkeypatch.setattr(server, "index_title", lambda *args: None)
+    result = asyncio.run(server.load_catalog_page("movie", "popular", page, page_size))
+    return [content.tmdb_id for content in result["results"]], fetched
+
+
+def test_fully_warmed_page_comes_from_the_catalog(monkeypatch):
+    ids, fetched = serve(monkeypatch, page=3, page_size=30)
+
+    assert ids == list(range(61, 91))
+    assert fetched == []
+
+
+def test_page_crossing_the_end_of_the_warmed_range_is_filled_from_tmdb(monkeypatch):
+    ids, fetched = serve(monkeypatch, page=4, page_size=30)
+
+    assert ids == list(range(91, 121))
+    assert fetched == [5, 6]
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from pymongo.errors import DuplicateKeyError
+
+import catalog_warmer
+from catalog_warmer import CatalogWarmer, popularity_changed
+
+
+class Catalog:
+    """Just enough of a Motor collection for the warmer's writes."""
+
+    def __init__(self):
+        self.docs = {}
+        self.writes = 0
+
+    async def _iterate(self, docs):
+        for doc in docs:
+            yield doc
+
+    def find(self, query, projection):
+        if not query:
+            return self._iterate([{"content_type": key[0], **doc} for key, doc in self.docs.items()])
+        ids = set(query["tmdb_id"]["$in"])
+        return self._iterate([
+            dict(doc) for (content_type, tmdb_id), doc in self.docs.items()
+            if content_type == query["content_type"] and tmdb_id in ids
+        ])
+
+    async def bulk_write(self, operations, ordered):
+        for operation in operations:
+            key = (operation._filter["content_type"], operation._filter["tmdb_id"])
+            self.docs.setdefault(key, {"tmdb_id": key[1]}).update(operation._doc["$set"])
+            self.writes += 1
+
+    async def update_many(self, query, update):
+        modified = 0
+        for (content_type, tmdb_id), doc in self.docs.items():
+            if content_type == query["content_type"] and tmdb_id not in query["tmdb_id"]["$nin"] and doc["ranks"]:
+                doc.update(update["$set"])
+                modified += 1
+        return SimpleNamespace(modified_count=modified)
+
+
+class Leases:
+    """One lease document, with find_one_and_update's upsert collision."""
+
+    def __init__(self):
+        self.doc = None
+
+    async def find_one_and_update(self, query, update, upsert, return_document):
+        if self.doc is not None and self.doc["expires_at"] > query["expires_at"]["$lte"]:
+            raise DuplicateKeyError("lease is held")
+        self.doc = {**(self.doc or {}), **update["$set"]}
+        return dict(self.doc)
+
+    async def find_one(self, query, projection):
+        return dict(self.doc) if self.doc else None
+
+    async def update_one(self, query, update):
+        if self.doc and self.doc["owner"] == query["owner"]:
+            self.doc.update(update["$set"])
+
+
+class TMDB:
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    async def get(self, path, priority=None, page=1):
+        self.calls += 1
+        return {"results": self.results.get(path, []) if page == 1 else []}
+
+
+def build_content(content_type, item):
+    return SimpleNamespace(dict=lambda: {"tmdb_id": item["id"], "title": item["title"]})
+
+
+def run_warmer(monkeypatch, catalog, results):
+    monkeypatch.setattr(catalog_warmer, "CATALOG_LISTS", {("movie", "popular"): "/movie/popular"})
+    updates = []
+    warmer = CatalogWarmer(catalog, TMDB(results), build_content, pages=1,
+                           on_update=lambda content_type, entries, changed: updates.append(changed))
+    stats = asyncio.run(warmer.run_once())
+    return stats, updates[-1]
+
+
+def movie(tmdb_id, popularity):
+    return {"id": tmdb_id, "title": f"Movie {tmdb_id}", "popularity": popularity}
+
+
+def test_popularity_change_beyond_tolerance_rewrites_the_title(monkeypatch):
+    catalog = Catalog()
+    run_warmer(monkeypatch, catalog, {"/movie/popular": [movie(1, 100.0)]})
+
+    stats, changed = run_warmer(monkeypatch, catalog, {"/movie/popular": [movie(1, 101.0)]})
+    assert (stats["written"], stats["unchanged"], changed) == (0, 1, False)
+
+    stats, changed = run_warmer(monkeypatch, catalog, {"/movie/popular": [movie(1, 150.0)]})
+    assert (stats["written"], changed) == (1, True)
+    assert catalog.docs[("movie", 1)]["popularity"] == 150.0
+
+
+def test_titles_dropping_off_every_list_count_as_a_change(monkeypatch):
+    catalog = Catalog()
+    run_warmer(monkeypatch, catalog, {"/movie/popular": [movie(1, 10.0), movie(2, 20.0)]})
+
+    stats, changed = run_warmer(monkeypatch, catalog, {"/movie/popular": [movie(1, 10.0)]})
+
+    assert (stats["written"], stats["unranked"], changed) == (0, 1, True)
+    assert catalog.docs[("movie", 2)]["ranks"] == {}
+
+
+def test_popularity_changed():
+    assert not popularity_changed(100.0, 104.0)
+    assert popularity_changed(100.0, 106.0)
+    assert not popularity_changed(0.2, 0.21)
+    assert popularity_changed(None, 1.0)
+
+
+def test_one_worker_fetches_and_the_others_reload_the_stored_catalog(monkeypatch):
+    monkeypatch.setattr(catalog_warmer, "CATALOG_LISTS", {("movie", "popular"): "/movie/popular"})
+    catalog, leases, tmdb = Catalog(), Leases(), TMDB({"/movie/popular": [movie(1, 10.0)]})
+    updates = {worker: [] for worker in range(3)}
+    warmers = [
+        CatalogWarmer(catalog, tmdb, build_content, pages=1, leases=leases,
+                      on_update=lambda content_type, entries, changed, worker=worker: updates[worker].append(changed))
+        for worker in updates
+    ]
+
+    async def tick_all():
+        return [await warmer.tick() is not None for warmer in warmers]
+
+    assert asyncio.run(tick_all()) == [True, False, False]
+    assert asyncio.run(tick_all()) == [False, False, False]
+    assert tmdb.calls == 1
+    assert updates == {0: [True], 1: [False], 2: [False]}
+
+    # Once the lease is due again, whichever worker ticks first fetches
+    leases.doc["expires_at"] = datetime(2000, 1, 1)
+    assert asyncio.run(tick_all()) == [True, False, False]
+    assert tmdb.calls == 2
@@ -0,0 +1,47 @@
+import asyncio
+
+import server
+from comment_hub import CommentHub
+
+
+def test_sse_subscriber_is_released_when_the_client_disconnects(monkeypatch):
+    """Through the ASGI app, so Starlette's own disconnect handling is what
+    ends the stream."""
+    hub = CommentHub()
+    monkeypatch.setattr(server, "comment_hub", hub)
+
+    async def scenario():
+        gone = asyncio.Event()
+        chunks = asyncio.Queue()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                await chunks.put(message["body"])
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/api/comments/movie/1/stream", "raw_path": b"/api/comments/movie/1/stream",
+            "root_path": "", "query_string": b"", "headers": [(b"host", b"test")],
+            "client": ("127.0.0.1", 1234), "server": ("test", 80),
+        }
+        app = asyncio.create_task(server.app(scope, receive, send))
+        while not hub.stats()["subscribers"]:
+            await asyncio.sleep(0)
+        hub.publish(("movie", 1), '{"id": "c1"}')
+        assert b"c1" in await asyncio.wait_for(chunks.get(), 1)
+
+        gone.set()
+        # Well before the 15s keepalive would have noticed
+        await asyncio.wait_for(app, 1)
+        assert hub.stats()["subscribers"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from comments import decode_cursor, encode_cursor, fetch_comment_page, fetch_replies
+from cache import TTLCache
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+        elif field == "$and":
+            if not all(matches(doc, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(field)
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class Comments:
+    """Just enough of a Motor collection for comments.py and the count cache."""
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.counts = 0
+
+    def find(self, query, projection=None):
+        return Cursor([dict(doc) for doc in self.docs if matches(doc, query)])
+
+    async def distinct(self, field, query):
+        return list({doc.get(field) for doc in self.docs if matches(doc, query)})
+
+    async def count_documents(self, query):
+        self.counts += 1
+        return sum(1 for doc in self.docs if matches(doc, query))
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def find_one(self, query, projection=None):
+        return next((dict(doc) for doc in self.docs if matches(doc, query)), None)
+
+
+def comment(comment_id, minutes, parent_id=None, root_id=None):
+    return {
+        "id": comment_id, "content_type": "movie", "tmdb_id": 1, "text": comment_id,
+        "created_at": T0 + timedelta(minutes=minutes), "parent_id": parent_id, "root_id": root_id,
+    }
+
+
+def page(collection, **kwargs):
+    return asyncio.run(fetch_comment_page(collection, "movie", 1, **kwargs))
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    doc = comment("c1", 5)
+    assert decode_cursor(encode_cursor(doc)) == (doc["created_at"], "c1")
+    for bad in ("", "not-base64!", encode_cursor(doc)[:-3]):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_pages_newest_first_and_break_created_at_ties_by_id():
+    # Five comments share one timestamp, so only the id orders them
+    collection = Comments([comment(f"c{i}", 0) for i in range(5)] + [comment("newest", 1)])
+
+    first = page(collection, limit=3)
+    second = page(collection, limit=3, cursor=first["next_cursor"])
+
+    assert [c["id"] for c in first["comments"]] == ["newest", "c4", "c3"]
+    assert [c["id"] for c in second["comments"]] == ["c2", "c1", "c0"]
+    assert second["next_cursor"] is None
+
+
+def test_replies_are_nested_under_their_parents_oldest_first():
+    collection = Comments([
+        comment("top", 0),
+        comment("r2", 2, parent_id="top", root_id="top"),
+        comment("r1", 1, parent_id="top", root_id="top"),
+        comment("r1a", 3, parent_id="r1", root_id="top"),
+        # Written before root_id existed
+        comment("legacy", 4, parent_id="top"),
+    ])
+
+    [top] = page(collection)["comments"]
+
+    assert [r["id"] for r in top["replies"]] == ["r1", "r2", "legacy"]
+    assert [r["id"] for r in top["replies"][0]["replies"]] == ["r1a"]
+    assert top["has_more_replies"] is False
+
+
+def test_capped_replies_flag_the_threads_that_have_more_and_can_be_continued():
+    collection = Comments(
+        [comment("busy", 0), comment("quiet", 1), comment("q1", 2, parent_id="quiet", root_id="quiet")]
+        + [comment(f"b{i}", 10 + i, parent_id="busy", root_id="busy") for i in range(5)]
+    )
+
+    result = page(collection, max_replies=3)
+    by_id = {c["id"]: c for c in result["comments"]}
+
+    assert result["has_more_replies"] is True
+    assert by_id["busy"]["has_more_replies"] is True
+    assert by_id["quiet"]["has_more_replies"] is False
+    assert [r["id"] for r in by_id["busy"]["replies"]] == ["b0", "b1"]
+
+    rest, next_cursor = asyncio.run(fetch_replies(collection, ["busy"], limit=10, cursor=result["replies_cursor"]))
+    assert [r["id"] for r in rest] == ["b2", "b3", "b4"]
+    assert next_cursor is None
+
+
+def test_comment_count_is_cached_and_kept_current_by_new_comments(monkeypatch):
+    collection = Comments([comment("c1", 0), comment("c2", 1)])
+    monkeypatch.setattr(server, "db", SimpleNamespace(comments=collection))
+    monkeypatch.setattr(server, "comment_counts", TTLCache(ttl=300))
+    monkeypatch.setattr(server, "COMMENT_PUSH_BACKEND", "changestream")
+    user = server.User(email="a@example.com", name="A", is_premium=True)
+
+    async def scenario():
+        assert await server.get_comment_count("movie", 1) == 2
+        await server.add_comment({"content_type": "movie", "tmdb_id": 1, "text": "hi"}, user=user)
+        return await server.get_comment_count("movie", 1)
+
+    assert asyncio.run(scenario()) == 3
+    assert collection.counts == 1
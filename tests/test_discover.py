@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+import server
+from discover import DiscoverIndex
+from recommendations import RecommendationEngine
+
+
+class Catalog:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.scans = 0
+
+    async def _cursor(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+    def find(self, query, projection=None):
+        self.scans += 1
+        return self._cursor()
+
+
+def discover():
+    return server.discover(
+        content_type=None, with_genres=None, year_gte=None, year_lte=None,
+        vote_average_gte=None, vote_average_lte=None, page=1, page_size=20,
+    )
+
+
+def use_fresh_indexes(monkeypatch, catalog):
+    monkeypatch.setattr(server, "db", SimpleNamespace(catalog=catalog))
+    monkeypatch.setattr(server, "discover_index", DiscoverIndex(rebuild_interval=0))
+    monkeypatch.setattr(server, "recommender", RecommendationEngine())
+    monkeypatch.setattr(server, "catalog_load_lock", asyncio.Lock())
+    monkeypatch.setattr(server, "stored_catalog_loaded", asyncio.Event())
+
+
+def test_empty_stored_catalog_is_scanned_once(monkeypatch):
+    catalog = Catalog()
+    use_fresh_indexes(monkeypatch, catalog)
+
+    async def scenario():
+        return await asyncio.gather(*(discover() for _ in range(5)))
+
+    responses = asyncio.run(scenario())
+
+    assert catalog.scans == 1
+    assert all(b'"total_results":0' in response.body for response in responses)
+
+
+def test_titles_seen_before_the_catalog_load_do_not_block_it(monkeypatch):
+    stored = {"content_type": "movie", "tmdb_id": 1, "popularity": 10.0,
+              "data": {"tmdb_id": 1, "title": "Stored", "genre_ids": [28], "vote_average": 7.0}}
+    catalog = Catalog([stored])
+    use_fresh_indexes(monkeypatch, catalog)
+    server.index_title("tv", server.TVShow(tmdb_id=2, name="Searched", genre_ids=[18]), 5.0)
+
+    response = asyncio.run(discover())
+
+    assert b'"total_results":2' in response.body
+    assert response.body.index(b'"Stored"') < response.body.index(b'"Searched"')
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+from favorites import bulk_update_favorites
+
+
+class Favorites:
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+        self.deleting = self.max_deleting = 0
+
+    async def bulk_write(self, operations, ordered):
+        upserted = {}
+        for index, operation in enumerate(operations):
+            query = operation._filter
+            key = (query["content_type"], query["tmdb_id"])
+            if key not in self.keys:
+                self.keys.add(key)
+                upserted[index] = key
+        return SimpleNamespace(upserted_ids=upserted)
+
+    async def delete_one(self, query):
+        self.deleting += 1
+        self.max_deleting = max(self.max_deleting, self.deleting)
+        key = (query["content_type"], query["tmdb_id"])
+        # Let concurrent deletes interleave like separate round trips
+        await asyncio.sleep(0)
+        deleted = key in self.keys
+        self.keys.discard(key)
+        self.deleting -= 1
+        return SimpleNamespace(deleted_count=int(deleted))
+
+
+def item(tmdb_id, content_type="movie"):
+    return {"content_type": content_type, "tmdb_id": tmdb_id, "title": f"Title {tmdb_id}"}
+
+
+def bulk(collection, adds, removes):
+    return asyncio.run(bulk_update_favorites(collection, "u1", adds, removes, dict))
+
+
+def test_statuses_follow_each_write():
+    collection = Favorites({("movie", 1), ("movie", 2)})
+
+    results = bulk(collection, [item(1), item(3), item(3)], [item(2), item(4), {"content_type": "book", "tmdb_id": 5}])
+
+    assert [r["status"] for r in results] == ["exists", "added", "duplicate", "removed", "not_found", "invalid"]
+    assert collection.keys == {("movie", 1), ("movie", 3)}
+
+
+def test_adding_and_removing_the_same_title_is_rejected():
+    collection = Favorites({("movie", 1)})
+
+    results = bulk(collection, [item(1), item(2)], [item(1)])
+
+    assert [r["status"] for r in results] == ["invalid", "added", "invalid"]
+    assert collection.keys == {("movie", 1), ("movie", 2)}
+
+
+def test_concurrent_removes_of_one_title_report_one_removal():
+    async def scenario():
+        collection = Favorites({("tv", 7)})
+        first, second = await asyncio.gather(
+            bulk_update_favorites(collection, "u1", [], [item(7, "tv")], dict),
+            bulk_update_favorites(collection, "u1", [], [item(7, "tv")], dict),
+        )
+        return sorted([first[0]["status"], second[0]["status"]])
+
+    assert asyncio.run(scenario()) == ["not_found", "removed"]
+
+
+def test_removes_run_a_bounded_number_at_a_time():
+    collection = Favorites({("movie", i) for i in range(50)})
+
+    results = asyncio.run(bulk_update_favorites(
+        collection, "u1", [], [item(i) for i in range(60)], dict, remove_concurrency=4,
+    ))
+
+    assert [r["status"] for r in results].count("removed") == 50
+    assert collection.max_deleting == 4
+
+
+def test_malformed_adds_are_invalid_not_errors():
+    def build_favorite(item):
+        if item["title"] == "bad":
+            raise ValueError("rejected by the model")
+        return dict(item)
+
+    collection = Favorites()
+    adds = [
+        {"content_type": "movie", "tmdb_id": 1, "title": 42},
+        {"content_type": "movie", "tmdb_id": 2, "title": "Ok", "poster_path": ["x"]},
+        {"content_type": "movie", "tmdb_id": 3, "title": "bad"},
+        "not an object",
+        item(4),
+    ]
+
+    results = asyncio.run(bulk_update_favorites(collection, "u1", adds, [], build_favorite))
+
+    assert [r["status"] for r in results] == ["invalid"] * 4 + ["added"]
+    assert collection.keys == {("movie", 4)}
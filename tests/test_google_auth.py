@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+from google_auth import GoogleAuthError, GoogleVerifier
+from stubs.google import issue_id_token, rotate_key, start_google_stub
+
+CLIENT_ID = "popflix-test.apps.googleusercontent.com"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def google():
+    server, url = start_google_stub()
+    yield server, url
+    server.shutdown()
+
+
+def make_verifier(url, clock):
+    verifier = GoogleVerifier(CLIENT_ID, jwks_url=f"{url}/oauth2/v3/certs", userinfo_url=f"{url}/oauth2/v2/userinfo")
+    verifier.jwks.clock = clock
+    return verifier
+
+
+def verify_all(verifier, tokens):
+    """Verify each token in turn; returns the profile or the error for each."""
+    async def run():
+        verifier.start()
+        results = []
+        try:
+            for token in tokens:
+                try:
+                    results.append(await verifier.verify(token() if callable(token) else token))
+                except GoogleAuthError as e:
+                    results.append(e)
+        finally:
+            await verifier.close()
+        return results
+
+    return asyncio.run(run())
+
+
+def test_valid_id_token_is_verified_locally(google):
+    server, url = google
+    verifier = make_verifier(url, Clock())
+
+    [profile] = verify_all(verifier, [issue_id_token(server, CLIENT_ID, "ada@example.com", "Ada")])
+
+    assert profile == {"email": "ada@example.com", "name": "Ada", "picture": None}
+    assert verifier.local_verifications == 1
+    assert server.hits["/oauth2/v3/certs"] == 1
+
+
+def test_rotated_key_triggers_one_rate_limited_refresh(google):
+    server, url = google
+    clock = Clock()
+    verifier = make_verifier(url, clock)
+    first = issue_id_token(server, CLIENT_ID, "ada@example.com")
+
+    def rotated(kid):
+        def issue():
+            rotate_key(server, kid)
+            return issue_id_token(server, CLIENT_ID, "ada@example.com")
+        return issue
+
+    def later(seconds, token):
+        def issue():
+            clock.now += seconds
+            return token() if callable(token) else token
+        return issue
+
+    results = verify_all(verifier, [
+        first,
+        # Rotated before the cached key set expired: refetched at once
+        later(verifier.jwks.min_refresh_interval, rotated("stub-key-2")),
+        # Another rotation right after: refreshes are rate limited
+        rotated("stub-key-3"),
+        later(verifier.jwks.min_refresh_interval, lambda: issue_id_token(server, CLIENT_ID, "ada@example.com")),
+    ])
+
+    assert [isinstance(result, dict) for result in results] == [True, True, False, True]
+    assert "Unknown signing key" in str(results[2])
+    assert server.hits["/oauth2/v3/certs"] == 3
+
+
+@pytest.mark.parametrize("claims, error", [
+    ({"aud": "someone-else.apps.googleusercontent.com"}, "Audience doesn't match"),
+    ({"iss": "https://accounts.example.com"}, "issuer"),
+    ({"exp": int(time.time()) - 3600}, "expired"),
+    ({"email_verified": False}, "not verified"),
+])
+def test_rejected_id_tokens(google, claims, error):
+    server, url = google
+    verifier = make_verifier(url, Clock())
+
+    [result] = verify_all(verifier, [issue_id_token(server, CLIENT_ID, "ada@example.com", **claims)])
+
+    assert isinstance(result, GoogleAuthError)
+    assert error in str(result)
+    assert verifier.local_verifications == 0
+
+
+def test_token_signed_by_an_unpublished_key_is_rejected(google):
+    server, url = google
+    token = issue_id_token(server, CLIENT_ID, "ada@example.com")
+    # Same kid, different key: the signature does not verify
+    rotate_key(server, server.key_id)
+
+    [result] = verify_all(make_verifier(url, Clock()), [token])
+
+    assert isinstance(result, GoogleAuthError)
+    assert "Signature verification failed" in str(result)
+
+
+def test_opaque_access_tokens_go_to_userinfo(google):
+    server, url = google
+    verifier = make_verifier(url, Clock())
+
+    ok, rejected = verify_all(verifier, ["valid-grace", "revoked-token"])
+
+    assert ok["email"] == "grace@example.com"
+    assert isinstance(rejected, GoogleAuthError)
+    assert verifier.remote_verifications == 1
@@ -0,0 +1,22 @@
+import asyncio
+
+from health import run_shutdown
+
+
+def test_shutdown_steps_after_a_failing_one_still_run():
+    stopped = []
+
+    async def flush_while_mongo_is_down():
+        raise ConnectionError("mongo is down")
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    outcomes = asyncio.run(run_shutdown({
+        "watch_buffer": flush_while_mongo_is_down,
+        "comment_bridge": hang,
+        "mongo": lambda: stopped.append("mongo"),
+    }, timeout=0.05))
+
+    assert outcomes == {"watch_buffer": "error", "comment_bridge": "timeout", "mongo": "ok"}
+    assert stopped == ["mongo"]
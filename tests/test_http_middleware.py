@@ -0,0 +1,201 @@
+"""HTTPCacheMiddleware and CompressionMiddleware stacked as in server.py,
+driven through ASGI."""
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from compression import CompressedStore, CompressionMiddleware
+from http_cache import CachePolicy, HTTPCacheMiddleware
+
+LARGE = b'{"results": [' + b",".join(b'{"id": %d}' % i for i in range(400)) + b"]}"
+
+
+async def large(request):
+    return Response(LARGE, media_type="application/json")
+
+
+async def small(request):
+    return Response(b'{"count": 3}', media_type="application/json")
+
+
+async def versioned(request):
+    return Response(LARGE, media_type="application/json", headers={"etag": 'W/"v1"'})
+
+
+async def encoded(request):
+    return Response(b"already-compressed" * 100, media_type="application/json", headers={"content-encoding": "br"})
+
+
+async def missing(request):
+    return Response(b'{"detail": "Not found"}', status_code=404, media_type="application/json")
+
+
+async def events(request):
+    async def stream():
+        for i in range(3):
+            yield f"event: comment\ndata: {i}\n\n"
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+async def profile(request):
+    return Response(LARGE, media_type="application/json")
+
+
+def build_app():
+    app = Starlette(routes=[
+        Route("/large", large), Route("/small", small), Route("/versioned", versioned),
+        Route("/encoded", encoded), Route("/missing", missing), Route("/events", events),
+        Route("/profile", profile), Route("/uncached", small),
+    ])
+    app.add_middleware(HTTPCacheMiddleware, policies=[
+        CachePolicy(r"^/profile$", "private, no-cache", vary="Authorization"),
+        CachePolicy(r"^/(large|small|versioned|encoded|missing|events)$", "public, max-age=60"),
+    ])
+    store = CompressedStore()
+    app.add_middleware(CompressionMiddleware, store=store, minimum_size=1024)
+    return app, store
+
+
+def get(path, **headers):
+    async def request():
+        app, _ = build_app()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(request())
+
+
+def vary(response):
+    return [part.strip().lower() for part in response.headers.get("vary", "").split(",") if part.strip()]
+
+
+def test_cached_route_gets_a_strong_etag_and_its_policy():
+    response = get("/large", **{"accept-encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert response.headers["etag"].startswith('"') and not response.headers["etag"].startswith("W/")
+    assert response.content == LARGE
+
+
+def test_matching_if_none_match_returns_a_bodyless_304_with_validators():
+    etag = get("/large", **{"accept-encoding": "identity"}).headers["etag"]
+
+    for if_none_match in (etag, f'"other", {etag}', f"W/{etag}", "*"):
+        response = get("/large", **{"accept-encoding": "identity", "if-none-match": if_none_match})
+        assert response.status_code == 304, if_none_match
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert response.headers["cache-control"] == "public, max-age=60"
+        assert "accept-encoding" in vary(response)
+
+    assert get("/large", **{"accept-encoding": "identity", "if-none-match": '"other"'}).status_code == 200
+
+
+def test_handler_weak_etag_is_kept_and_compared_weakly():
+    response = get("/versioned", **{"accept-encoding": "identity"})
+    assert response.headers["etag"] == 'W/"v1"'
+
+    assert get("/versioned", **{"accept-encoding": "identity", "if-none-match": '"v1"'}).status_code == 304
+
+
+def test_compressed_variant_has_its_own_etag_and_still_validates():
+    identity = get("/large", **{"accept-encoding": "identity"}).headers["etag"]
+
+    response = get("/large", **{"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == identity[:-1] + '-gzip"'
+    assert "accept-encoding" in vary(response)
+    assert response.content == LARGE
+
+    revalidated = get("/large", **{"accept-encoding": "gzip", "if-none-match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == response.headers["etag"]
+
+
+def test_identity_responses_still_vary_on_accept_encoding():
+    response = get("/large", **{"accept-encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert "accept-encoding" in vary(response)
+
+
+def test_policy_vary_is_merged_with_accept_encoding():
+    response = get("/profile", **{"accept-encoding": "gzip"})
+
+    assert response.headers["cache-control"] == "private, no-cache"
+    assert vary(response) == ["authorization", "accept-encoding"]
+
+
+def test_small_bodies_are_not_compressed():
+    response = get("/small", **{"accept-encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.content == b'{"count": 3}'
+    assert "accept-encoding" in vary(response)
+
+
+def test_already_encoded_bodies_are_not_compressed_again():
+    async def request():
+        app, store = build_app()
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http", "method": "GET", "path": "/encoded", "raw_path": b"/encoded", "root_path": "",
+            "query_string": b"", "headers": [(b"accept-encoding", b"gzip")], "scheme": "http",
+            "server": ("test", 80), "client": ("127.0.0.1", 1), "asgi": {"version": "3.0"}, "http_version": "1.1",
+        }
+        await app(scope, receive, send)
+        return sent, store
+
+    sent, store = asyncio.run(request())
+    start = dict(sent[0]["headers"])
+    assert start[b"content-encoding"] == b"br"
+    assert b"".join(m.get("body", b"") for m in sent[1:]) == b"already-compressed" * 100
+    assert store.stats()["misses"] == 0
+
+
+def test_errors_are_not_given_validators_or_a_public_max_age():
+    response = get("/missing", **{"accept-encoding": "identity"})
+
+    assert response.status_code == 404
+    assert "etag" not in response.headers
+    assert "cache-control" not in response.headers
+
+
+def test_uncached_routes_get_no_validators():
+    response = get("/uncached", **{"accept-encoding": "identity"})
+
+    assert "etag" not in response.headers
+    assert "cache-control" not in response.headers
+
+
+def test_event_streams_pass_through_untouched():
+    response = get("/events", **{"accept-encoding": "gzip"})
+
+    assert response.text == "".join(f"event: comment\ndata: {i}\n\n" for i in range(3))
+    for header in ("etag", "cache-control", "content-encoding"):
+        assert header not in response.headers
+
+
+def test_stored_variants_are_compressed_once_per_etag():
+    async def requests():
+        app, store = build_app()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            bodies = [(await client.get("/large", headers={"accept-encoding": "gzip"})).content for _ in range(3)]
+        return bodies, store.stats()
+
+    bodies, stats = asyncio.run(requests())
+
+    assert bodies == [LARGE] * 3
+    assert (stats["misses"], stats["hits"]) == (1, 2)
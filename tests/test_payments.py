@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+from payments import CheckoutStatusPoller
+
+
+class Transactions:
+    def __init__(self, **transaction):
+        self.transaction = {
+            "session_id": "cs_1", "user_id": "u1", "amount": 200.0, "currency": "INR", "payment_status": "pending",
+            **transaction,
+        }
+        self.updates = []
+
+    async def find_one(self, query, projection):
+        return dict(self.transaction) if query["session_id"] == self.transaction["session_id"] else None
+
+    async def update_one(self, query, update):
+        self.updates.append(update)
+        self.transaction.update(update["$set"])
+
+
+def make_poller(transactions, status="open", payment_status="unpaid"):
+    calls = []
+
+    async def fetch_status(session_id):
+        calls.append(session_id)
+        return SimpleNamespace(status=status, payment_status=payment_status, amount_total=20000, currency="inr")
+
+    async def on_paid(transaction):
+        transactions.transaction["payment_status"] = "paid"
+
+    return CheckoutStatusPoller(transactions, fetch_status, on_paid, ttl=0), calls
+
+
+def test_transaction_paid_by_the_webhook_is_answered_from_mongo():
+    transactions = Transactions(payment_status="paid")
+    poller, calls = make_poller(transactions)
+
+    status = asyncio.run(poller.status("cs_1"))
+
+    assert status == {"status": "complete", "payment_status": "paid", "amount": 20000, "currency": "inr"}
+    assert calls == []
+
+
+def test_complete_but_unpaid_session_keeps_polling_stripe():
+    transactions = Transactions()
+    poller, calls = make_poller(transactions, status="complete", payment_status="unpaid")
+
+    async def poll_twice():
+        await poller.status("cs_1")
+        return await poller.status("cs_1")
+
+    assert asyncio.run(poll_twice())["payment_status"] == "unpaid"
+    assert len(calls) == 2
+    assert transactions.updates == []
+
+
+def test_paid_session_is_stored_and_not_fetched_again():
+    transactions = Transactions()
+    poller, calls = make_poller(transactions, status="complete", payment_status="paid")
+
+    async def poll_twice():
+        await poller.status("cs_1")
+        return await poller.status("cs_1")
+
+    assert asyncio.run(poll_twice())["payment_status"] == "paid"
+    assert len(calls) == 1
+    assert transactions.transaction["checkout_status"]["status"] == "complete"
+
+
+def test_unknown_session_is_none():
+    poller, _ = make_poller(Transactions())
+    assert asyncio.run(poller.status("cs_missing")) is None
@@ -0,0 +1,144 @@
+"""Premium expiry under a fake clock, through the real request path.
+
+Premium users expire at staggered times while authenticated requests go
+through ``server.get_current_user`` and ``PremiumSweeper`` runs on a virtual
+timer. The request path must never write and must hide premium from the
+moment it expires; the sweeper must persist every demotion within one
+interval, with one ``update_many`` per sweep.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+from premium_sweeper import PremiumSweeper
+from shared_cache import TwoLevelCache
+
+USERS = 200
+INTERVAL = 60.0
+STEP = 5.0
+DURATION = 1800.0
+REQUESTS_PER_STEP = 20
+
+
+class FakeClock:
+    def __init__(self, start: datetime):
+        self.now = start
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += timedelta(seconds=seconds)
+
+
+class RecordingUsers:
+    """Just enough of a Motor collection for the sweeper, counting every call."""
+
+    def __init__(self, docs):
+        self.docs = {doc["id"]: doc for doc in docs}
+        self.writes = []
+
+    @staticmethod
+    def _matches(doc, query):
+        for field, condition in query.items():
+            value = doc.get(field)
+            if isinstance(condition, dict):
+                if not (value is not None and value <= condition["$lte"]):
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    async def find_one(self, query, projection=None):
+        return next((dict(doc) for doc in self.docs.values() if self._matches(doc, query)), None)
+
+    async def update_many(self, query, update):
+        self.writes.append("update_many")
+        matched = [doc for doc in self.docs.values() if self._matches(doc, query)]
+        for doc in matched:
+            doc.update(update["$set"])
+        return SimpleNamespace(modified_count=len(matched))
+
+    async def update_one(self, query, update):
+        self.writes.append("update_one")
+        return await self.update_many(query, update)
+
+
+def credentials(user_id: str) -> HTTPAuthorizationCredentials:
+    token = jwt.encode({"user_id": user_id}, server.JWT_SECRET, algorithm="HS256")
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.fixture
+def app_state(monkeypatch):
+    rng = random.Random(1)
+    clock = FakeClock(datetime(2025, 1, 1))
+    expiries = {f"user-{i}": clock.now + timedelta(seconds=rng.uniform(0, DURATION)) for i in range(USERS)}
+    users = RecordingUsers([
+        {"id": user_id, "email": f"{user_id}@example.com", "name": user_id,
+         "is_premium": True, "premium_expires_at": expires}
+        for user_id, expires in expiries.items()
+    ])
+    sweeper = PremiumSweeper(users, interval=INTERVAL, clock=clock)
+    monkeypatch.setattr(server, "db", SimpleNamespace(users=users))
+    monkeypatch.setattr(server, "premium_sweeper", sweeper)
+    # In-process only, so the test never reaches for a shared L2
+    monkeypatch.setattr(server, "user_cache", TwoLevelCache(
+        "user", ttl=INTERVAL, encode=lambda user: user.dict(), decode=lambda doc: server.User(**doc),
+    ))
+    return SimpleNamespace(rng=rng, clock=clock, expiries=expiries, users=users, sweeper=sweeper)
+
+
+def test_requests_hide_expiry_without_writing_and_sweeps_persist_it(app_state):
+    clock, expiries, users = app_state.clock, app_state.expiries, app_state.users
+    tokens = {user_id: credentials(user_id) for user_id in expiries}
+
+    async def simulate():
+        request_writes = stale_views = 0
+        demoted_at = {}
+        elapsed, next_sweep = 0.0, INTERVAL
+        while elapsed <= DURATION + INTERVAL:
+            clock.advance(STEP)
+            elapsed += STEP
+
+            writes_before = len(users.writes)
+            for user_id in app_state.rng.sample(list(expiries), k=REQUESTS_PER_STEP):
+                user = await server.get_current_user(tokens[user_id])
+                if user.is_premium and expiries[user_id] <= clock():
+                    stale_views += 1
+            request_writes += len(users.writes) - writes_before
+
+            if elapsed >= next_sweep:
+                await app_state.sweeper.sweep()
+                next_sweep += INTERVAL
+                for user_id, doc in users.docs.items():
+                    if not doc["is_premium"]:
+                        demoted_at.setdefault(user_id, clock())
+        return request_writes, stale_views, demoted_at
+
+    request_writes, stale_views, demoted_at = asyncio.run(simulate())
+
+    assert request_writes == 0
+    assert stale_views == 0
+    assert set(demoted_at) == set(expiries)
+    latencies = [(demoted_at[user_id] - expiries[user_id]).total_seconds() for user_id in expiries]
+    assert max(latencies) <= INTERVAL + STEP
+    assert users.writes == ["update_many"] * len(users.writes)
+
+
+def test_request_after_expiry_sees_a_free_user(app_state):
+    user_id, expires = next(iter(app_state.expiries.items()))
+    app_state.clock.now = expires - timedelta(seconds=1)
+    assert asyncio.run(server.get_current_user(credentials(user_id))).is_premium
+
+    app_state.clock.now = expires
+    user = asyncio.run(server.get_current_user(credentials(user_id)))
+
+    assert not user.is_premium and user.premium_expires_at is None
+    assert app_state.users.writes == []
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from metrics import RateGovernorCollector
+from rate_governor import GovernorQueueFull, Priority, RateGovernor
+from tmdb_client import TMDBClient, TMDBError
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_queued_requests_are_released_by_priority_then_arrival():
+    async def scenario():
+        governor = RateGovernor(rate=50, burst=1)
+        await governor.acquire(Priority.PAGE)
+        granted = []
+
+        async def request(name, priority):
+            await governor.acquire(priority)
+            granted.append(name)
+
+        tasks = [
+            asyncio.create_task(request(name, priority)) for name, priority in (
+                ("prefetch", Priority.PREFETCH), ("page 1", Priority.PAGE),
+                ("search", Priority.SEARCH), ("page 2", Priority.PAGE),
+            )
+        ]
+        await settle()
+        assert governor.queue_depth() == {"search": 1, "page": 2, "prefetch": 1}
+        await asyncio.gather(*tasks)
+        return granted, governor.stats()
+
+    granted, stats = asyncio.run(scenario())
+
+    assert granted == ["search", "page 1", "page 2", "prefetch"]
+    assert stats["priorities"]["page"]["granted"] == 3
+    assert stats["priorities"]["page"]["queued"] == 2
+
+
+def test_tokens_refill_at_the_sustained_rate_after_the_burst():
+    async def scenario():
+        governor = RateGovernor(rate=20, burst=2)
+        started = time.monotonic()
+        for _ in range(4):
+            await governor.acquire()
+        return time.monotonic() - started
+
+    # Two from the burst, then one token every 50ms
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_throttle_pauses_releases_and_empties_the_bucket():
+    async def scenario():
+        governor = RateGovernor(rate=100, burst=5)
+        governor.throttle(0.1)
+        started = time.monotonic()
+        await governor.acquire()
+        waited = time.monotonic() - started
+        return waited, governor.stats()
+
+    waited, stats = asyncio.run(scenario())
+
+    assert waited >= 0.1
+    assert stats["throttled"] == 1
+    assert stats["tokens"] < 1
+
+
+def test_full_queue_sheds_the_newest_lower_priority_waiter():
+    async def scenario():
+        governor = RateGovernor(rate=1, burst=1, max_queue=2)
+        await governor.acquire()
+        older = asyncio.create_task(governor.acquire(Priority.PREFETCH))
+        newer = asyncio.create_task(governor.acquire(Priority.PREFETCH))
+        await settle()
+
+        search = asyncio.create_task(governor.acquire(Priority.SEARCH))
+        await settle()
+        with pytest.raises(GovernorQueueFull):
+            await newer
+        # Nothing queued has a lower priority than another prefetch
+        with pytest.raises(GovernorQueueFull):
+            await governor.acquire(Priority.PREFETCH)
+
+        stats = governor.stats()
+        assert governor.queue_depth() == {"search": 1, "page": 0, "prefetch": 1}
+        assert stats["priorities"]["prefetch"]["shed"] == 2
+        for task in (older, search):
+            task.cancel()
+        await asyncio.gather(older, search, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_shed_tmdb_calls_fail_fast_as_rate_limited():
+    async def scenario():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"path": request.url.path}))
+        client = TMDBClient("key", rate_limit=1, burst=1, max_queue=0, transport=transport)
+        try:
+            results = await asyncio.gather(
+                client.get("/movie/popular"), client.get("/tv/popular"), return_exceptions=True,
+            )
+        finally:
+            await client.close()
+        return results
+
+    first, second = asyncio.run(scenario())
+
+    assert first["path"].endswith("/movie/popular")
+    assert isinstance(second, TMDBError) and second.status_code == 429
+
+
+def test_governor_metrics_are_exported_per_priority():
+    async def scenario():
+        governor = RateGovernor(rate=1, burst=1)
+        await governor.acquire()
+        waiting = asyncio.create_task(governor.acquire(Priority.SEARCH))
+        await settle()
+        text = "\n".join(RateGovernorCollector(governor.stats).render())
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        return text
+
+    text = asyncio.run(scenario())
+
+    assert "# TYPE popflix_tmdb_governor_queue_depth gauge" in text
+    assert 'popflix_tmdb_governor_queue_depth{priority="search"} 1' in text
+    assert 'popflix_tmdb_governor_granted_total{priority="page"} 1' in text
+    assert "popflix_tmdb_governor_throttled_total 0" in text
+    assert RateGovernorCollector(lambda: None).render() == []
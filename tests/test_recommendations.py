@@ -0,0 +1,113 @@
+import numpy as np
+
+from recommendations import RecommendationEngine
+
+ACTION, ADVENTURE, ROMANCE, DRAMA = 28, 12, 10749, 18
+
+
+def entry(tmdb_id, genre_ids, popularity):
+    return {"tmdb_id": tmdb_id, "popularity": popularity, "data": {"tmdb_id": tmdb_id, "genre_ids": genre_ids}}
+
+
+def engine():
+    recommender = RecommendationEngine(popularity_weight=0.05)
+    recommender.upsert_items("movie", [
+        entry(1, [ACTION], 50.0),
+        entry(2, [ACTION, ADVENTURE], 10.0),
+        entry(3, [ROMANCE], 500.0),
+        entry(4, [ROMANCE, DRAMA], 300.0),
+        entry(5, [DRAMA], 100.0),
+    ])
+    # TV "Action & Adventure" maps onto the movie genres
+    recommender.upsert_items("tv", [entry(6, [10759], 20.0)])
+    return recommender
+
+
+def ids(recommendations):
+    return [data["tmdb_id"] for _, data in recommendations]
+
+
+def test_users_without_a_profile_get_the_most_popular_titles():
+    assert ids(engine().recommend("nobody", limit=3)) == [3, 4, 5]
+
+
+def test_users_with_no_history_or_only_unknown_titles_get_popular_titles():
+    recommender = engine()
+    recommender.build_profile("empty", [], [])
+    recommender.build_profile("unknown", [(("movie", 999), 1.0)], [("tv", 999)])
+
+    assert ids(recommender.recommend("empty", limit=3)) == [3, 4, 5]
+    assert ids(recommender.recommend("unknown", limit=3)) == [3, 4, 5]
+
+
+def test_history_steers_towards_similar_genres_and_excludes_seen_titles():
+    recommender = engine()
+    recommender.build_profile("u1", [(("movie", 1), 1.0)], [])
+
+    recommended = ids(recommender.recommend("u1", limit=5))
+
+    assert 1 not in recommended
+    assert set(recommended[:2]) == {2, 6}
+
+
+def test_content_type_filter():
+    recommender = engine()
+    recommender.build_profile("u1", [(("movie", 1), 1.0)], [])
+
+    assert recommender.recommend("u1", content_type="tv") == [("tv", {"tmdb_id": 6, "genre_ids": [10759]})]
+    assert all(content_type == "movie" for content_type, _ in recommender.recommend("u1", content_type="movie"))
+
+
+def test_incremental_updates_match_a_rebuilt_profile():
+    recommender = engine()
+    recommender.build_profile("u1", [(("movie", 1), 0.2)], [])
+    recommender.recommend("u1")  # sum the vector so later events adjust it in place
+
+    recommender.record_history("u1", ("movie", 1), 0.9)
+    recommender.record_history("u1", ("movie", 4), 0.5)
+    recommender.record_favorite("u1", ("tv", 6), True)
+    recommender.record_favorite("u1", ("movie", 4), True)
+    recommender.record_favorite("u1", ("movie", 4), False)
+
+    recommender.build_profile("rebuilt", [(("movie", 1), 0.9), (("movie", 4), 0.5)], [("tv", 6)])
+    incremental = recommender._vector(recommender._profiles.get("u1"))
+    rebuilt = recommender._vector(recommender._profiles.get("rebuilt"))
+    np.testing.assert_allclose(incremental, rebuilt, rtol=1e-6)
+    assert ids(recommender.recommend("u1")) == ids(recommender.recommend("rebuilt"))
+
+
+def test_events_for_users_without_a_profile_are_ignored():
+    recommender = engine()
+    recommender.record_history("nobody", ("movie", 1), 1.0)
+    recommender.record_favorite("nobody", ("movie", 1), True)
+
+    assert not recommender.has_profile("nobody")
+
+
+def test_profile_follows_catalog_changes_after_events():
+    recommender = engine()
+    recommender.build_profile("u1", [(("movie", 5), 1.0)], [])
+    recommender.recommend("u1")
+    recommender.record_favorite("u1", ("movie", 1), True)
+
+    # Re-tagging a seen title invalidates the summed vector
+    recommender.upsert_items("movie", [entry(5, [ROMANCE], 100.0)])
+
+    recommended = ids(recommender.recommend("u1"))
+    assert 5 not in recommended and 1 not in recommended
+    recommender.build_profile("rebuilt", [(("movie", 5), 1.0)], [("movie", 1)])
+    np.testing.assert_allclose(
+        recommender._vector(recommender._profiles.get("u1")),
+        recommender._vector(recommender._profiles.get("rebuilt")),
+        rtol=1e-6,
+    )
+
+
+def test_removing_a_favorite_makes_the_title_recommendable_again():
+    recommender = engine()
+    recommender.build_profile("u1", [], [("movie", 3)])
+    assert 3 not in ids(recommender.recommend("u1"))
+
+    recommender.record_favorite("u1", ("movie", 3), False)
+
+    assert 3 in ids(recommender.recommend("u1"))
@@ -0,0 +1,47 @@
+from search_index import SearchIndex
+
+TITLES = [
+    (("movie", 1), "The Dark Knight", 90.0, 8.5),
+    (("movie", 2), "The Dark Knight Rises", 70.0, 7.8),
+    (("tv", 3), "Dark", 50.0, 8.7),
+    (("movie", 4), "Knightfall of an Extraordinarily Long Title", 5.0, None),
+]
+
+
+def entries():
+    return [(key, title, {"title": title}, popularity, vote) for key, title, popularity, vote in TITLES]
+
+
+def test_add_many_matches_adding_one_at_a_time():
+    one_by_one, batched = SearchIndex(), SearchIndex()
+    for entry in entries():
+        one_by_one.add(*entry)
+    batched.add_many(entries())
+
+    for query in ("dark", "the dark k", "knight", "extraordinarily", "extraordinarilylong"):
+        assert batched.search(query) == one_by_one.search(query)
+    assert [item["title"] for item in batched.search("dark")] == ["The Dark Knight", "The Dark Knight Rises", "Dark"]
+
+
+def test_re_adding_unchanged_titles_keeps_memoized_results():
+    index = SearchIndex()
+    index.add_many(entries())
+    index.search("dark")
+    version = index.version
+
+    index.add_many(entries())
+    index.add(*entries()[0])
+
+    assert index.version == version
+    assert index.stats()["cached_queries"] == 1
+
+
+def test_changed_score_reorders_and_clears_memoized_results():
+    index = SearchIndex()
+    index.add_many(entries())
+    index.search("dark")
+
+    index.add(("tv", 3), "Dark", {"title": "Dark"}, 500.0, 8.7)
+
+    assert index.stats()["cached_queries"] == 0
+    assert index.search("dark")[0] == {"title": "Dark"}
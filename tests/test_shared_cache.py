@@ -0,0 +1,166 @@
+import asyncio
+
+from bson import ObjectId
+
+from shared_cache import MongoInvalidationBus, TwoLevelCache
+
+
+class CappedCollection:
+    """Documents in insertion order; a find() cursor ends at the last one."""
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    async def find_one(self, query, projection=None, sort=None):
+        if sort:
+            return dict(self.docs[-1]) if self.docs else None
+        return next((dict(doc) for doc in self.docs if doc["_id"] == query["_id"]), None)
+
+    async def _cursor(self):
+        for doc in list(self.docs):
+            yield dict(doc)
+
+    def find(self, query, cursor_type=None):
+        assert query == {}
+        return self._cursor()
+
+
+class Database:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def create_collection(self, name, capped, size):
+        pass
+
+    def __getitem__(self, name):
+        return self.collection
+
+
+class Cache:
+    namespace = "user"
+
+    def __init__(self):
+        self.applied = []
+
+    def apply(self, message):
+        self.applied.append(message["key"])
+
+
+class VersionedL2:
+    """In-memory L2 with the versioned write-back of MongoL2 and RedisL2."""
+
+    def __init__(self):
+        self.values = {}
+        self.versions = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def get_versioned(self, key):
+        return self.values.get(key), self.versions.get(key, 0)
+
+    async def set_if_version(self, key, value, ttl, version):
+        if self.versions.get(key, 0) != version:
+            return False
+        self.values[key] = value
+        return True
+
+    async def invalidate(self, key, ttl):
+        self.values.pop(key, None)
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+
+def invalidation(object_id, key):
+    return {"_id": ObjectId(object_id), "namespace": "user", "op": "invalidate", "key": key, "origin": "other"}
+
+
+def test_messages_with_smaller_object_ids_from_other_workers_are_delivered():
+    # Same second, but the second worker's random part sorts lower
+    collection = CappedCollection([invalidation("65f000000000000000000009", "seen")])
+    bus = MongoInvalidationBus(Database(collection))
+    cache = Cache()
+    bus.register(cache)
+
+    asyncio.run(bus._listen())
+    collection.docs.append(invalidation("65f000000000000000000001", "u1"))
+    collection.docs.append(invalidation("65f000000000000000000005", "u2"))
+    asyncio.run(bus._listen())
+    asyncio.run(bus._listen())
+
+    assert cache.applied == ["u1", "u2"]
+
+
+def test_load_that_overlaps_an_invalidation_on_another_worker_is_not_written_back():
+    async def scenario():
+        l2 = VersionedL2()
+        reader, writer = TwoLevelCache("user", l2), TwoLevelCache("user", l2)
+        reading, read_done = asyncio.Event(), asyncio.Event()
+
+        async def read_before_upgrade():
+            reading.set()
+            await read_done.wait()
+            return {"is_premium": False}
+
+        load = asyncio.create_task(reader.get_or_load("u1", read_before_upgrade))
+        await reading.wait()
+        await writer.invalidate("u1")
+        read_done.set()
+
+        assert await load == {"is_premium": False}
+        assert reader.skipped_writes == 1
+        assert await writer.get_or_load("u1", lambda: asyncio.sleep(0, {"is_premium": True})) == {"is_premium": True}
+        assert await reader.get_or_load("u1", lambda: asyncio.sleep(0, None)) == {"is_premium": True}
+
+    asyncio.run(scenario())
+
+
+def test_load_that_overlaps_a_local_invalidation_is_not_cached():
+    async def scenario():
+        cache = TwoLevelCache("user")
+        reading, read_done = asyncio.Event(), asyncio.Event()
+
+        async def read_before_upgrade():
+            reading.set()
+            await read_done.wait()
+            return "old"
+
+        load = asyncio.create_task(cache.get_or_load("u1", read_before_upgrade))
+        await asyncio.sleep(0)
+        await cache.invalidate("u1")
+        read_done.set()
+
+        assert await load == "old"
+        assert await cache.get_or_load("u1", lambda: asyncio.sleep(0, "new")) == "new"
+
+    asyncio.run(scenario())
+
+
+class SlowWriteL2(VersionedL2):
+    """Holds set_if_version open after writing, like a slow round trip."""
+
+    def __init__(self):
+        super().__init__()
+        self.writing, self.release = asyncio.Event(), asyncio.Event()
+
+    async def set_if_version(self, key, value, ttl, version):
+        written = await super().set_if_version(key, value, ttl, version)
+        self.writing.set()
+        await self.release.wait()
+        return written
+
+
+def test_invalidation_during_the_l2_write_keeps_the_load_out_of_l1():
+    async def scenario():
+        l2 = SlowWriteL2()
+        cache = TwoLevelCache("user", l2)
+
+        load = asyncio.create_task(cache.get_or_load("u1", lambda: asyncio.sleep(0, {"is_premium": False})))
+        await l2.writing.wait()
+        await cache.invalidate("u1")
+        l2.release.set()
+
+        assert await load == {"is_premium": False}
+        assert cache.skipped_writes == 1
+        assert await cache.get_or_load("u1", lambda: asyncio.sleep(0, {"is_premium": True})) == {"is_premium": True}
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from watch_buffer import WatchHistoryBuffer
+
+
+class GatedCollection:
+    """``bulk_write`` blocks until released, then succeeds or fails."""
+
+    def __init__(self):
+        self.released = asyncio.Event()
+        self.fail = False
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered):
+        await self.released.wait()
+        if self.fail:
+            raise RuntimeError("mongo is down")
+        self.batches.append(operations)
+
+
+def heartbeat(tmdb_id, progress, id):
+    return {"user_id": "u1", "content_type": "movie", "tmdb_id": tmdb_id, "progress": progress, "id": id}
+
+
+def progress_by_title(buffer):
+    return {doc["tmdb_id"]: doc["progress"] for doc in buffer.pending_for_user("u1")}
+
+
+def test_entries_stay_visible_while_their_flush_is_in_flight():
+    async def scenario():
+        collection = GatedCollection()
+        buffer = WatchHistoryBuffer(collection)
+        buffer.add(heartbeat(1, 0.1, "a"))
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+
+        assert progress_by_title(buffer) == {1: 0.1}
+        buffer.add(heartbeat(1, 0.2, "b"))
+        assert progress_by_title(buffer) == {1: 0.2}
+
+        collection.released.set()
+        assert await flush == 1
+        assert progress_by_title(buffer) == {1: 0.2}
+        # The newer heartbeat keeps the id the in-flight write inserted with
+        assert buffer.pending_for_user("u1")[0]["id"] == "a"
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_requeues_without_overwriting_newer_heartbeats():
+    async def scenario():
+        collection = GatedCollection()
+        buffer = WatchHistoryBuffer(collection)
+        buffer.add(heartbeat(1, 0.1, "a"))
+        buffer.add(heartbeat(2, 0.5, "b"))
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        buffer.add(heartbeat(1, 0.3, "c"))
+
+        collection.fail = True
+        collection.released.set()
+        with pytest.raises(RuntimeError):
+            await flush
+        assert progress_by_title(buffer) == {1: 0.3, 2: 0.5}
+        assert len(buffer) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,199 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import webhook_queue
+from webhook_queue import DEAD, DONE, PENDING, PROCESSING, WebhookQueue
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+class Clock:
+    def __init__(self):
+        self.now = T0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+class Events:
+    """Just enough of a Motor collection for WebhookQueue, keyed by _id."""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_one(self, doc):
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("E11000 duplicate key")
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def find_one_and_update(self, query, update, sort, return_document):
+        due = [
+            doc for doc in self.docs.values()
+            if doc["status"] in query["status"]["$in"] and doc["available_at"] <= query["available_at"]["$lte"]
+        ]
+        if not due:
+            return None
+        doc = min(due, key=lambda doc: doc["available_at"])
+        self._apply(doc, update)
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        self._apply(self.docs[query["_id"]], update)
+
+    async def replace_one(self, query, doc, upsert):
+        self.docs[query["_id"]] = dict(doc)
+
+    @staticmethod
+    def _apply(doc, update):
+        doc.update(update.get("$set", {}))
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+        for field in update.get("$unset", {}):
+            doc.pop(field, None)
+
+
+def queue(handler=None, **kwargs):
+    clock = Clock()
+
+    async def succeed(event):
+        pass
+
+    return WebhookQueue(Events(), Events(), handler or succeed, clock=clock, **kwargs), clock
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(webhook_queue.random, "uniform", lambda low, high: high)
+
+
+async def failing(event):
+    raise RuntimeError("stripe down")
+
+
+def test_redelivered_event_ids_are_stored_once():
+    events, _ = queue()
+
+    async def scenario():
+        first = await events.enqueue("evt_1", "checkout.session.completed", {"session_id": "s1"})
+        again = await events.enqueue("evt_1", "checkout.session.completed", {"session_id": "s1"})
+        return first, again
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert list(events.events.docs) == ["evt_1"]
+    assert events.stats()["duplicates"] == 1
+
+
+def test_processed_events_are_marked_done():
+    handled = []
+
+    async def handler(event):
+        handled.append(event["payload"])
+
+    events, clock = queue(handler)
+
+    async def scenario():
+        await events.enqueue("evt_1", "checkout.session.completed", {"session_id": "s1"})
+        await events.process(await events.claim())
+        return await events.claim()
+
+    assert asyncio.run(scenario()) is None
+    doc = events.events.docs["evt_1"]
+    assert handled == [{"session_id": "s1"}]
+    assert (doc["status"], doc["processed_at"], doc["attempts"]) == (DONE, clock.now, 1)
+
+
+def test_leased_event_is_reclaimed_only_after_the_lease_expires():
+    events, clock = queue(lease=60.0)
+
+    async def scenario():
+        await events.enqueue("evt_1", "checkout.session.completed", {})
+        leased = await events.claim()
+        assert leased["status"] == PROCESSING
+        assert leased["available_at"] == clock.now + timedelta(seconds=60)
+        # The worker holding it dies; nobody else may take it yet
+        clock.advance(59)
+        assert await events.claim() is None
+        clock.advance(1)
+        return await events.claim()
+
+    reclaimed = asyncio.run(scenario())
+    assert reclaimed["_id"] == "evt_1"
+    assert reclaimed["attempts"] == 2
+
+
+def test_failures_back_off_exponentially_up_to_max_delay():
+    events, clock = queue(failing, base_delay=1.0, max_delay=5.0, max_attempts=10)
+    delays = []
+
+    async def scenario():
+        await events.enqueue("evt_1", "checkout.session.completed", {})
+        for _ in range(5):
+            event = await events.claim()
+            await events.process(event)
+            doc = events.events.docs["evt_1"]
+            assert doc["status"] == PENDING
+            assert doc["last_error"] == "RuntimeError: stripe down"
+            delay = (doc["available_at"] - clock.now).total_seconds()
+            delays.append(delay)
+            assert await events.claim() is None
+            clock.advance(delay)
+
+    asyncio.run(scenario())
+    assert delays == [1.0, 2.0, 4.0, 5.0, 5.0]
+    assert events.stats()["retried"] == 5
+
+
+def test_backoff_jitter_stays_within_half_to_full_delay(monkeypatch):
+    events, _ = queue(base_delay=2.0)
+    monkeypatch.setattr(webhook_queue.random, "uniform", lambda low, high: low)
+
+    assert events.backoff(3) == 4.0
+
+
+def test_event_is_dead_lettered_after_max_attempts_and_stays_deduplicated():
+    events, clock = queue(failing, max_attempts=3)
+
+    async def scenario():
+        await events.enqueue("evt_1", "checkout.session.completed", {"session_id": "s1"})
+        for _ in range(3):
+            await events.process(await events.claim())
+            clock.advance(3600)
+        assert await events.claim() is None
+        return await events.enqueue("evt_1", "checkout.session.completed", {"session_id": "s1"})
+
+    assert asyncio.run(scenario()) is False
+    dead = events.dead_letters.docs["evt_1"]
+    assert dead["status"] == DEAD
+    assert dead["attempts"] == 3
+    assert dead["payload"] == {"session_id": "s1"}
+    assert dead["last_error"] == "RuntimeError: stripe down"
+    assert events.events.docs["evt_1"]["status"] == DEAD
+    assert events.stats()["dead"] == 1
+
+
+def test_workers_drain_the_queue():
+    handled = []
+
+    async def handler(event):
+        handled.append(event["_id"])
+
+    events, _ = queue(handler, workers=2, poll_interval=0.01)
+
+    async def scenario():
+        events.start()
+        for i in range(5):
+            await events.enqueue(f"evt_{i}", "checkout.session.completed", {})
+        for _ in range(100):
+            if len(handled) == 5:
+                break
+            await asyncio.sleep(0.01)
+        await events.stop()
+
+    asyncio.run(scenario())
+    assert sorted(handled) == [f"evt_{i}" for i in range(5)]